@@ -1,20 +1,28 @@
 import streamlit as st
 
-from kakeibo.db import connect_db, get_categories
+from kakeibo.db import ensure_aikotoba_schema
+from kakeibo.st_cache import get_categories
 from kakeibo.views.sidebar import render_sidebar
-from kakeibo.pages import add_page, edit_page, categories_page, graphs_page, dev_page
+from kakeibo.pages import add_page, edit_page, categories_page, graphs_page, dev_page, import_page
 from kakeibo.auth import ensure_authenticated
 
 
+@st.cache_resource
+def _ensure_schema():
+    # インデックス・集計テーブル等のスキーマ整備はプロセスごとに一度だけ
+    ensure_aikotoba_schema()
+
+
 def main():
+    _ensure_schema()
+
     # 認証（有効な場合のみ遮断）
     _user = ensure_authenticated()
 
     view_category = render_sidebar()
     st.write("DEBUG view_category =", repr(view_category))  # ← 一時確認
 
-    engine = connect_db()
-    main_categories, sub_categories = get_categories(engine)
+    main_categories, sub_categories = get_categories()
     main_category = st.selectbox("カテゴリ", [cat[1] for cat in main_categories])
     main_category_id = next(cat[0] for cat in main_categories if cat[1] == main_category)
 
@@ -24,6 +32,8 @@ def main():
         edit_page.render(main_category_id, sub_categories)
     elif view_category == "カテゴリー追加・編集":
         categories_page.render(main_category_id, sub_categories)
+    elif view_category == "インポート":
+        import_page.render(main_category_id, sub_categories)
     elif view_category == "グラフ":
         graphs_page.render()
     elif view_category == "開発者オプション":
@@ -1,10 +1,16 @@
+import base64
+import csv
+import hashlib
+import io
 import os
 import secrets
 import urllib.parse
-import requests
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify
+import threading
+import zlib
+from flask import Flask, Response, render_template, request, redirect, url_for, session, jsonify, g
 from datetime import date
-from sqlalchemy import text
+from sqlalchemy import bindparam, text
+from sqlalchemy.exc import OperationalError
 from kakeibo.db import (
     connect_db,
     get_categories,
@@ -13,43 +19,99 @@ from kakeibo.db import (
     rename_sub_category,
     delete_sub_category,
     get_sub_category_by_id,
-    get_monthly_summary,
-    DB_FILENAME,
-    get_gifts_summary,
+    get_monthly_balance,
+    get_gift_return_summary,
     get_unentered_recurring_transactions,
     get_budget_and_spent_of_month,
     ensure_aikotoba_schema,
     get_aikotoba_id,
+    lookup_aikotoba_id,
+    get_data_version,
+    get_data_version_stamp,
+    ENGINE,
+    READ_ENGINE,
+    WRITER,
 )
+from kakeibo import metrics
+from kakeibo.cache import VersionedCache
 import json
 from flask import send_file
 from datetime import datetime, date
 from dateutil.relativedelta import relativedelta
 import pytz
-# Note: Heavy libs (pandas, altair) are imported lazily in routes that need them
+# Cold start: this module must only pull in Flask, SQLAlchemy and the stdlib
+# (see tests/test_import_budget.py); import anything heavier inside the route.
 
 app = Flask(__name__)
 # Minimal secret key for session (override via env in production)
 app.secret_key = os.environ.get('FLASK_SECRET_KEY', 'dev-secret')
 
-# Ensure aikotoba schema at startup
-try:
-    ensure_aikotoba_schema()
-except Exception:
-    pass
+# Per-route latency / SQL counters, scraped from /metrics
+metrics.instrument_app(app)
+for _engine in (ENGINE, READ_ENGINE):
+    metrics.instrument_engine(_engine)
+
+# Schema upkeep (seed copy, migrations, indexes) runs on the first request, not
+# at import, so a cold worker can bind and answer as soon as the module loads.
+_DB_BOOTSTRAPPED = False
+_DB_BOOTSTRAP_LOCK = threading.Lock()
+
+
+@app.before_request
+def _bootstrap_db():
+    global _DB_BOOTSTRAPPED
+    if _DB_BOOTSTRAPPED:
+        return None
+    with _DB_BOOTSTRAP_LOCK:
+        if not _DB_BOOTSTRAPPED:
+            try:
+                ensure_aikotoba_schema()
+            except Exception:
+                app.logger.exception('ensure_aikotoba_schema failed')
+            _DB_BOOTSTRAPPED = True
+    return None
+
+# Resolved once per process; the 'public' row is seeded by ensure_aikotoba_schema
+_PUBLIC_AIKOTOBA_ID = None
+
+
+def _public_aikotoba_id() -> int:
+    global _PUBLIC_AIKOTOBA_ID
+    if _PUBLIC_AIKOTOBA_ID is None:
+        # Read first; only fall back to the inserting variant if the seed is missing
+        _PUBLIC_AIKOTOBA_ID = lookup_aikotoba_id("public") or get_aikotoba_id("public")
+    return _PUBLIC_AIKOTOBA_ID
+
 
 def _get_current_user_aikotoba_id() -> int:
-    engine = connect_db()
-    public_id = get_aikotoba_id("public")
+    """Return the user's aikotoba id without writing to the DB.
+
+    Memoized per request in flask.g and per login in the signed session
+    ('aikotoba_id'); /aikotoba/join and /aikotoba/leave refresh the session value.
+    """
+    if 'aikotoba_id' in g:
+        return g.aikotoba_id
     username = session.get('auth_user')
     if not username:
-        return public_id
-    try:
-        with engine.connect() as conn:
-            aid = conn.execute(text("SELECT aikotoba_id FROM users WHERE username = :u"), {"u": username}).scalar()
-            return aid if aid is not None else public_id
-    except Exception:
-        return public_id
+        aid = _public_aikotoba_id()
+    else:
+        aid = session.get('aikotoba_id')
+        if aid is None:
+            try:
+                with connect_db(readonly=True).connect() as conn:
+                    aid = conn.execute(text("SELECT aikotoba_id FROM users WHERE username = :u"), {"u": username}).scalar()
+            except Exception:
+                aid = None
+            if aid is None:
+                aid = _public_aikotoba_id()
+            session['aikotoba_id'] = aid
+    g.aikotoba_id = aid
+    return aid
+
+
+def _set_current_user_aikotoba_id(aid: int) -> None:
+    session['aikotoba_id'] = aid
+    g.aikotoba_id = aid
 
 def _is_api_request() -> bool:
     try:
@@ -67,8 +129,8 @@ def require_login_guard():
     path = request.path
     if any(path.startswith(prefix) for prefix in exempt_prefixes) or path in exempt_paths:
         return None
-    # Allow health checks if any
-    if path.startswith('/health'):
+    # Allow health checks and metrics scrapes
+    if path.startswith('/health') or path == '/metrics':
         return None
     # Require session
     if not session.get('auth_user'):
@@ -82,22 +144,19 @@ def require_login_guard():
         else:
             return jsonify({"error": "Unauthorized"}), 401
 
-def get_sidebar_data(selected_month=None):
-    # Month selection for budget progress
-    months = [
-        (datetime.now(pytz.timezone('Asia/Tokyo')) - relativedelta(months=i)).strftime("%Y-%m")
-        for i in range(12)
-    ]
-    if selected_month is None:
-        selected_month = months[0]
+# Sidebar data only changes on writes; keyed by (aikotoba, month, data version, day)
+_SIDEBAR_CACHE = VersionedCache(maxsize=128)
 
-    # Budget progress
-    aid = _get_current_user_aikotoba_id()
-    spent, budget, _ = get_budget_and_spent_of_month(selected_month, aid)
+
+def _build_sidebar_data(aid, selected_month, today):
+    # Budget progress (an unparseable ?month= shows no progress, as before)
+    try:
+        spent, budget, _ = get_budget_and_spent_of_month(selected_month, aid)
+    except ValueError:
+        spent, budget = {}, {}
     budget_progress = []
-    for category in budget.index:
+    for category, budget_amount in budget.items():
         spent_amount = spent.get(category, 0)
-        budget_amount = budget[category]
         percentage = (spent_amount / budget_amount) * 100 if budget_amount > 0 else 0
         percentage = percentage if percentage <= 100 else 100
         budget_progress.append({
@@ -108,27 +167,11 @@ def get_sidebar_data(selected_month=None):
         })
 
     # Gift visualization
-    gifts_df = get_gifts_summary(aid)
-    gift_summary = []
-    if not gifts_df.empty:
-        gifts = gifts_df[gifts_df['type'] == '収入'].set_index('detail')['total']
-        returns = gifts_df[gifts_df['type'] == '支出'].set_index('detail')['total']
-        for gift_detail in gifts.index:
-            gift_amount = gifts[gift_detail]
-            return_amount = sum(amount for detail, amount in returns.items() if gift_detail in detail)
-            percentage = (return_amount / gift_amount) * 100 if gift_amount > 0 else 0
-            percentage = percentage if percentage <= 100 else 100
-            gift_summary.append({
-                'detail': gift_detail,
-                'gift_amount': gift_amount,
-                'return_amount': return_amount,
-                'percentage': percentage
-            })
+    gift_summary = get_gift_return_summary(aid)
 
     # Unentered monthly amounts
     recurring_transactions = get_unentered_recurring_transactions(aid)
     unentered_amounts = []
-    today = date.today()
     for transaction in recurring_transactions:
         transaction_date = datetime.strptime(transaction.date, "%Y-%m-%d").date()
         if today >= (transaction_date + relativedelta(months=1)) and today < (transaction_date + relativedelta(months=2)) and transaction.amount > 0:
@@ -138,13 +181,84 @@ def get_sidebar_data(selected_month=None):
             })
 
     return {
-        'months': months,
-        'selected_month': selected_month,
         'budget_progress': budget_progress,
         'gift_summary': gift_summary,
         'unentered_amounts': unentered_amounts
     }
 
+
+def get_sidebar_data(selected_month=None):
+    # Month selection for budget progress
+    months = [
+        (datetime.now(pytz.timezone('Asia/Tokyo')) - relativedelta(months=i)).strftime("%Y-%m")
+        for i in range(12)
+    ]
+    if selected_month is None:
+        selected_month = months[0]
+
+    aid = _get_current_user_aikotoba_id()
+    # "today" is part of the key because the unentered-recurring check depends on it
+    today = date.today()
+    key = (aid, selected_month, get_data_version(aid), today)
+    data = _SIDEBAR_CACHE.get_or_set(key, lambda: _build_sidebar_data(aid, selected_month, today))
+    return {
+        'months': months,
+        'selected_month': selected_month,
+        **data
+    }
+
+
+@app.get('/api/cache/stats')
+def api_cache_stats():
+    """Hit rate of the sidebar cache (per process)."""
+    return jsonify({"sidebar": _SIDEBAR_CACHE.stats()})
+
+@app.errorhandler(OperationalError)
+def database_busy(e):
+    """Answer 503 + Retry-After when SQLite gave up waiting for a lock.
+
+    busy_timeout (see SQLITE_PROFILES) already waited; the client should retry
+    instead of seeing a 500. Any other OperationalError stays a 500.
+    """
+    if 'database is locked' not in str(e.orig):
+        raise e
+    metrics.LOCKED_ERRORS.inc(metrics.current_route.get() or metrics.NO_ROUTE)
+    app.logger.warning('database is locked: %s %s', request.method, request.path)
+    message = 'Database is busy, please retry'
+    if _is_api_request():
+        resp = jsonify({"error": message})
+    else:
+        resp = Response(message, mimetype='text/plain')
+    resp.status_code = 503
+    resp.headers['Retry-After'] = '1'
+    return resp
+
+@app.get('/metrics')
+def metrics_endpoint():
+    """Prometheus text exposition of this worker's request and SQL metrics."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+def _versioned_response(aid, build):
+    """Serve ``build()`` with an ETag/Last-Modified tied to ``aid``'s data version.
+
+    A matching If-None-Match is answered with 304 before ``build`` runs, after a
+    single primary-key read of data_versions. The ETag covers the tenant, the
+    full path and the query string, so each parameter set validates alone.
+    """
+    version, updated_at = get_data_version_stamp(aid)
+    tag = hashlib.sha1(f"{aid}|{request.full_path}|{version}".encode()).hexdigest()[:20]
+    if request.if_none_match.contains(tag):
+        response = Response(status=304)
+    else:
+        response = build()
+    response.set_etag(tag)
+    response.last_modified = datetime.fromtimestamp(updated_at, tz=pytz.utc)
+    # private: per-user data; no-cache: always revalidate (cheap thanks to the 304)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
 @app.route('/')
 def index():
     month = request.args.get('month')
@@ -154,9 +268,8 @@ def index():
 
 @app.route('/add', methods=['GET', 'POST'])
 def add():
-    engine = connect_db()
     aid = _get_current_user_aikotoba_id()
-    main_categories, sub_categories = get_categories(engine, aikotoba_id=aid)
+    main_categories, sub_categories = get_categories(aikotoba_id=aid)
 
     if request.method == 'POST':
         sub_category_id = request.form['sub_category_id']
@@ -165,11 +278,9 @@ def add():
         detail = request.form['detail']
         amount = request.form['amount']
 
-        with engine.begin() as conn:
+        def _insert(conn):
             # derive aikotoba from sub_category
             sub_aid = conn.execute(text("SELECT aikotoba_id FROM sub_categories WHERE id = :sid"), {"sid": sub_category_id}).scalar()
-            if sub_aid is None:
-                sub_aid = _get_current_user_aikotoba_id()
             conn.execute(
                 text(
                     """
@@ -183,9 +294,11 @@ def add():
                     "type": transaction_type,
                     "date": transaction_date,
                     "detail": detail,
-                    "aid": sub_aid,
+                    "aid": aid if sub_aid is None else sub_aid,
                 },
             )
+
+        WRITER.run(_insert)
         return redirect(url_for('index'))
 
     return render_template(
@@ -205,9 +318,8 @@ def login():
 
 @app.route('/edit')
 def edit():
-    engine = connect_db()
     aid = _get_current_user_aikotoba_id()
-    main_categories, sub_categories = get_categories(engine, aikotoba_id=aid)
+    main_categories, sub_categories = get_categories(aikotoba_id=aid)
 
     # Get filter criteria from query parameters
     main_category_id = request.args.get('main_category_id')
@@ -251,59 +363,223 @@ def edit():
     )
 
 
+# Sortable columns for /api/transactions. All NOT NULL, so (column, id) row
+# values give a total order for keyset pagination.
+_TRANSACTION_SORT_COLUMNS = {'date': 't.date', 'amount': 't.amount', 'type': 't.type', 'id': 't.id'}
+_TRANSACTIONS_MAX_LIMIT = 500
+
+_TRANSACTIONS_FROM = """
+        FROM transactions t
+        JOIN sub_categories sc ON t.sub_category_id = sc.id
+        JOIN main_categories mc ON sc.main_category_id = mc.id
+"""
+
+
+def _transaction_filters(args, aid):
+    """Return (WHERE clause, params) for the transaction list/export filters."""
+    clauses = ["t.aikotoba_id = :aid"]
+    params = {'aid': aid}
+    if args.get('main_category_id'):
+        clauses.append("sc.main_category_id = :main_category_id")
+        params['main_category_id'] = args.get('main_category_id')
+    if args.get('sub_category_id'):
+        clauses.append("t.sub_category_id = :sub_category_id")
+        params['sub_category_id'] = args.get('sub_category_id')
+    if args.get('start_date'):
+        clauses.append("t.date >= :start_date")
+        params['start_date'] = args.get('start_date')
+    if args.get('end_date'):
+        clauses.append("t.date <= :end_date")
+        params['end_date'] = args.get('end_date')
+    if args.get('type'):
+        clauses.append("t.type = :type")
+        params['type'] = args.get('type')
+    q = (args.get('q') or '').strip()
+    if q:
+        # Same fields the grid's live search used to match client-side
+        clauses.append("(t.detail LIKE :q OR t.type LIKE :q OR CAST(t.amount AS TEXT) LIKE :q)")
+        params['q'] = f"%{q}%"
+    return " AND ".join(clauses), params
+
+
+def _encode_cursor(sort, direction, value, row_id) -> str:
+    raw = json.dumps([sort, direction, value, row_id], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(token: str):
+    raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+    sort, direction, value, row_id = json.loads(raw)
+    return sort, direction, value, int(row_id)
+
+
 @app.get('/api/transactions')
 def api_get_transactions():
-    engine = connect_db()
-    main_category_id = request.args.get('main_category_id')
-    sub_category_id = request.args.get('sub_category_id')
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
+    """List the current aikotoba's transactions.
 
-    query = """
+    Without ``limit`` every matching row is returned. With ``limit`` the list is
+    keyset-paginated on (``sort``, id): ``X-Next-Cursor`` carries the token for
+    the following page (pass it back as ``cursor``) and the first page reports
+    ``X-Total-Count``. Filters: main_category_id, sub_category_id, start_date,
+    end_date, type, q. Conditional GET: ETag / If-None-Match (see _versioned_response).
+    """
+    engine = connect_db(readonly=True)
+    aid = _get_current_user_aikotoba_id()
+    where, params = _transaction_filters(request.args, aid)
+
+    sort = request.args.get('sort', 'date')
+    direction = request.args.get('dir', 'desc').lower()
+    if sort not in _TRANSACTION_SORT_COLUMNS or direction not in ('asc', 'desc'):
+        return jsonify({"error": "Unsupported sort"}), 400
+    column = _TRANSACTION_SORT_COLUMNS[sort]
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        limit = max(1, min(limit, _TRANSACTIONS_MAX_LIMIT))
+
+    count_params = dict(params)
+    keyset = ""
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            c_sort, c_dir, c_value, c_id = _decode_cursor(cursor)
+        except Exception:
+            return jsonify({"error": "Invalid cursor"}), 400
+        if (c_sort, c_dir) != (sort, direction):
+            return jsonify({"error": "Cursor does not match sort"}), 400
+        op = '<' if direction == 'desc' else '>'
+        if sort == 'id':
+            keyset = f" AND t.id {op} :cursor_id"
+        else:
+            keyset = f" AND ({column}, t.id) {op} (:cursor_value, :cursor_id)"
+            params['cursor_value'] = c_value
+        params['cursor_id'] = c_id
+
+    order = f"{column} {direction.upper()}"
+    if sort != 'id':
+        order += f", t.id {direction.upper()}"
+    query = f"""
         SELECT
             t.id, t.date, t.detail, t.type, t.amount,
             t.sub_category_id,
             sc.name as sub_category_name, mc.id as main_category_id, mc.name as main_category_name
-        FROM transactions t
-        JOIN sub_categories sc ON t.sub_category_id = sc.id
-        JOIN main_categories mc ON sc.main_category_id = mc.id
-        WHERE 1=1
+        {_TRANSACTIONS_FROM}
+        WHERE {where}{keyset}
+        ORDER BY {order}
     """
-    params = {}
-    if main_category_id:
-        query += " AND mc.id = :main_category_id"
-        params['main_category_id'] = main_category_id
-    if sub_category_id:
-        query += " AND t.sub_category_id = :sub_category_id"
-        params['sub_category_id'] = sub_category_id
-    if start_date:
-        query += " AND t.date >= :start_date"
-        params['start_date'] = start_date
-    if end_date:
-        query += " AND t.date <= :end_date"
-        params['end_date'] = end_date
-    aid = _get_current_user_aikotoba_id()
-    query += " AND t.aikotoba_id = :aid ORDER BY t.date DESC, t.id DESC"
+    if limit is not None:
+        # One extra row tells us whether another page exists
+        query += " LIMIT :limit"
+        params['limit'] = limit + 1
 
-    params['aid'] = aid
+    def build():
+        total = None
+        with engine.connect() as conn:
+            rows = conn.execute(text(query), params).mappings().all()
+            data = [dict(r) for r in rows]
+            if limit is not None and not cursor:
+                total = conn.execute(text(f"SELECT COUNT(*) {_TRANSACTIONS_FROM} WHERE {where}"), count_params).scalar()
+
+        resp_headers = {}
+        if limit is None:
+            total = len(data)
+        elif len(data) > limit:
+            data = data[:limit]
+            last = data[-1]
+            resp_headers['X-Next-Cursor'] = _encode_cursor(sort, direction, last[sort], last['id'])
+        if total is not None:
+            resp_headers['X-Total-Count'] = str(total)
+        resp = jsonify(data)
+        resp.headers.update(resp_headers)
+        return resp
+
+    return _versioned_response(aid, build)
+
+
+_EXPORT_COLUMNS = (
+    'id', 'date', 'main_category_name', 'sub_category_name', 'sub_category_id', 'type', 'amount', 'detail',
+)
+_EXPORT_BATCH_ROWS = 500
+
+
+def _export_chunks(where, params, fmt):
+    """Yield encoded CSV/NDJSON chunks, fetching rows in batches from a streaming cursor."""
+    query = f"""
+        SELECT t.id, t.date, mc.name as main_category_name, sc.name as sub_category_name,
+               t.sub_category_id, t.type, t.amount, t.detail
+        {_TRANSACTIONS_FROM}
+        WHERE {where}
+        ORDER BY t.date DESC, t.id DESC
+    """
+    engine = connect_db(readonly=True)
     with engine.connect() as conn:
-        rows = conn.execute(text(query), params).mappings().all()
-        data = [dict(r) for r in rows]
-    return jsonify(data)
+        result = conn.execution_options(stream_results=True, yield_per=_EXPORT_BATCH_ROWS).execute(text(query), params)
+        if fmt == 'csv':
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            # BOM so Excel opens the UTF-8 CSV with the right encoding
+            buf.write('\ufeff')
+            writer.writerow(_EXPORT_COLUMNS)
+            for batch in result.partitions():
+                writer.writerows(batch)
+                yield buf.getvalue().encode('utf-8')
+                buf.seek(0)
+                buf.truncate()
+            if buf.tell():
+                yield buf.getvalue().encode('utf-8')
+        else:
+            for batch in result.partitions():
+                yield ''.join(
+                    json.dumps(dict(zip(_EXPORT_COLUMNS, row)), ensure_ascii=False) + '\n' for row in batch
+                ).encode('utf-8')
+
+
+def _gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 => gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+@app.get('/api/transactions/export')
+def api_export_transactions():
+    """Stream the filtered transactions as CSV or NDJSON (``format``), optionally gzipped.
+
+    Accepts the same filters as GET /api/transactions; memory use is bounded by
+    one fetch batch regardless of how many rows match.
+    """
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({"error": "format must be csv or ndjson"}), 400
+    use_gzip = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+    where, params = _transaction_filters(request.args, _get_current_user_aikotoba_id())
+
+    chunks = _export_chunks(where, params, fmt)
+    filename = f"transactions-{date.today():%Y%m%d}.{fmt}"
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    if use_gzip:
+        chunks = _gzip_chunks(chunks)
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    return Response(
+        chunks,
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+    )
 
 
 @app.post('/api/transactions')
 def api_create_transaction():
-    engine = connect_db()
     payload = request.get_json(force=True, silent=True) or {}
     required = ['sub_category_id', 'date', 'type', 'amount']
     if not all(k in payload and payload[k] not in (None, '') for k in required):
         return jsonify({"error": "Missing required fields"}), 400
-    with engine.begin() as conn:
+    user_aid = _get_current_user_aikotoba_id()
+
+    def _insert(conn):
         # derive aikotoba_id from sub_category; fallback to user's
         sub_aid = conn.execute(text("SELECT aikotoba_id FROM sub_categories WHERE id = :sid"), {"sid": payload['sub_category_id']}).scalar()
-        if sub_aid is None:
-            sub_aid = _get_current_user_aikotoba_id()
         result = conn.execute(
             text(
                 """
@@ -317,16 +593,177 @@ def api_create_transaction():
                 "type": payload['type'],
                 "date": payload['date'],
                 "detail": payload.get('detail', ''),
-                "aid": sub_aid,
+                "aid": user_aid if sub_aid is None else sub_aid,
             },
         )
-        new_id = result.lastrowid
+        return result.lastrowid
+
+    new_id = WRITER.run(_insert)
     return jsonify({"id": new_id}), 201
 
 
+@app.post('/api/transactions/import')
+def api_import_transactions():
+    """Bulk-import a CSV upload (multipart ``file``) into the current aikotoba.
+
+    Optional form fields: ``mapping`` (JSON, field -> CSV header),
+    ``default_type``, ``default_sub_category`` and ``encoding`` (default utf-8-sig;
+    use cp932 for Shift_JIS bank statements).
+    """
+    from kakeibo.importer import import_transactions_csv
+
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({"error": "file は必須です"}), 400
+    try:
+        mapping = json.loads(request.form.get('mapping') or '{}')
+    except ValueError:
+        return jsonify({"error": "mapping は JSON で指定してください"}), 400
+    aid = _get_current_user_aikotoba_id()
+    try:
+        stream = io.TextIOWrapper(upload.stream, encoding=request.form.get('encoding') or 'utf-8-sig', newline='')
+        result = import_transactions_csv(
+            stream,
+            aikotoba_id=aid,
+            mapping=mapping,
+            default_type=request.form.get('default_type') or '支出',
+            default_sub_category=request.form.get('default_sub_category') or None,
+        )
+    except (ValueError, UnicodeDecodeError, LookupError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result)
+
+
+_BATCH_MAX_OPS = 1000
+_TRANSACTION_FIELDS = ('sub_category_id', 'amount', 'type', 'date', 'detail')
+_TRANSACTION_TYPES = ('支出', '収入', '予算')
+
+
+def _coerce_transaction_fields(fields, where):
+    try:
+        for k in ('sub_category_id', 'amount'):
+            if k in fields:
+                fields[k] = int(fields[k])
+    except (TypeError, ValueError):
+        raise ValueError(f"{where}: sub_category_id and amount must be integers")
+    if 'type' in fields and fields['type'] not in _TRANSACTION_TYPES:
+        raise ValueError(f"{where}: type must be one of {', '.join(_TRANSACTION_TYPES)}")
+    if 'date' in fields:
+        try:
+            fields['date'] = datetime.strptime(str(fields['date']), "%Y-%m-%d").strftime("%Y-%m-%d")
+        except ValueError:
+            raise ValueError(f"{where}: date must be YYYY-MM-DD")
+    return fields
+
+
+def _parse_batch_ops(ops):
+    """Validate batch ops; return (creates, updates, deletes) or raise ValueError."""
+    if not isinstance(ops, list) or not ops:
+        raise ValueError("ops must be a non-empty list")
+    if len(ops) > _BATCH_MAX_OPS:
+        raise ValueError(f"at most {_BATCH_MAX_OPS} ops per batch")
+    creates, updates, deletes = [], [], []
+    for i, op in enumerate(ops):
+        if not isinstance(op, dict):
+            raise ValueError(f"ops[{i}] must be an object")
+        kind = op.get('op')
+        data = op.get('data') or {}
+        if not isinstance(data, dict):
+            raise ValueError(f"ops[{i}]: data must be an object")
+        if kind == 'create':
+            if not all(data.get(k) not in (None, '') for k in ('sub_category_id', 'date', 'type', 'amount')):
+                raise ValueError(f"ops[{i}]: missing required fields")
+            fields = {k: data.get(k, '') for k in _TRANSACTION_FIELDS}
+            creates.append((op.get('ref'), _coerce_transaction_fields(fields, f"ops[{i}]")))
+        elif kind in ('update', 'delete'):
+            # bool is an int subclass: true/false must not address rows 1/0
+            if not isinstance(op.get('id'), int) or isinstance(op['id'], bool):
+                raise ValueError(f"ops[{i}]: id must be an integer")
+            if kind == 'delete':
+                deletes.append(op['id'])
+                continue
+            fields = {k: data[k] for k in _TRANSACTION_FIELDS if k in data}
+            if not fields:
+                raise ValueError(f"ops[{i}]: no fields to update")
+            updates.append((op['id'], _coerce_transaction_fields(fields, f"ops[{i}]")))
+        else:
+            raise ValueError(f"ops[{i}]: op must be create, update or delete")
+    return creates, updates, deletes
+
+
+@app.post('/api/transactions/batch')
+def api_batch_transactions():
+    """Apply ``{"ops": [...]}`` create/update/delete ops atomically as one writer job.
+
+    create: ``{"op": "create", "ref": <client key>, "data": {...}}``;
+    update: ``{"op": "update", "id": n, "data": {field: value}}``;
+    delete: ``{"op": "delete", "id": n}``. Statements of the same shape go through
+    one executemany. Returns the new ids by ``ref`` plus update/delete counts.
+    """
+    payload = request.get_json(force=True, silent=True) or {}
+    try:
+        creates, updates, deletes = _parse_batch_ops(payload.get('ops'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    aid = _get_current_user_aikotoba_id()
+
+    sub_ids = {d['sub_category_id'] for _, d in creates}
+    sub_ids |= {f['sub_category_id'] for _, f in updates if 'sub_category_id' in f}
+
+    def _apply(conn):
+        if sub_ids:
+            owned = set(conn.execute(
+                text("SELECT id FROM sub_categories WHERE id IN :ids AND aikotoba_id = :aid")
+                .bindparams(bindparam('ids', expanding=True)),
+                {"ids": sorted(sub_ids), "aid": aid},
+            ).scalars())
+            unknown = sub_ids - owned
+            if unknown:
+                return {"error": f"unknown sub_category_id: {sorted(unknown)}"}
+
+        created = []
+        if creates:
+            conn.execute(
+                text(
+                    """
+                    INSERT INTO transactions (sub_category_id, amount, type, date, detail, aikotoba_id)
+                    VALUES (:sub_category_id, :amount, :type, :date, :detail, :aid)
+                    """
+                ),
+                [{**d, "aid": aid} for _, d in creates],
+            )
+            # The write lock is held for the whole transaction, so AUTOINCREMENT
+            # handed out a contiguous id range ending at last_insert_rowid().
+            last_id = conn.execute(text("SELECT last_insert_rowid()")).scalar_one()
+            first_id = last_id - len(creates) + 1
+            created = [{"ref": ref, "id": first_id + i} for i, (ref, _) in enumerate(creates)]
+
+        updated = 0
+        by_shape = {}
+        for tid, fields in updates:
+            by_shape.setdefault(tuple(sorted(fields)), []).append({**fields, "id": tid, "aid": aid})
+        for shape, rows in by_shape.items():
+            set_clause = ", ".join(f"{k} = :{k}" for k in shape)
+            res = conn.execute(text(f"UPDATE transactions SET {set_clause} WHERE id = :id AND aikotoba_id = :aid"), rows)
+            updated += res.rowcount
+
+        deleted = 0
+        if deletes:
+            res = conn.execute(
+                text("DELETE FROM transactions WHERE id = :id AND aikotoba_id = :aid"),
+                [{"id": tid, "aid": aid} for tid in deletes],
+            )
+            deleted = res.rowcount
+        return {"created": created, "updated": updated, "deleted": deleted}
+
+    result = WRITER.run(_apply)
+    if "error" in result:
+        return jsonify(result), 400
+    return jsonify(result)
+
+
 @app.patch('/api/transactions/<int:transaction_id>')
 def api_update_transaction(transaction_id: int):
-    engine = connect_db()
     payload = request.get_json(force=True, silent=True) or {}
     allowed = {'sub_category_id', 'amount', 'type', 'date', 'detail'}
     fields = {k: payload[k] for k in allowed if k in payload}
@@ -335,66 +772,84 @@ def api_update_transaction(transaction_id: int):
     set_clause = ", ".join([f"{k} = :{k}" for k in fields.keys()])
     fields['id'] = transaction_id
     fields['aid'] = _get_current_user_aikotoba_id()
-    with engine.begin() as conn:
-        res = conn.execute(text(f"UPDATE transactions SET {set_clause} WHERE id = :id AND aikotoba_id = :aid"), fields)
-    return jsonify({"updated": res.rowcount})
+    updated = WRITER.run(
+        lambda conn: conn.execute(text(f"UPDATE transactions SET {set_clause} WHERE id = :id AND aikotoba_id = :aid"), fields).rowcount
+    )
+    return jsonify({"updated": updated})
 
 
 @app.delete('/api/transactions/<int:transaction_id>')
 def api_delete_transaction(transaction_id: int):
-    engine = connect_db()
-    with engine.begin() as conn:
-        res = conn.execute(text("DELETE FROM transactions WHERE id = :id AND aikotoba_id = :aid"), {"id": transaction_id, "aid": _get_current_user_aikotoba_id()})
-    return jsonify({"deleted": res.rowcount})
+    aid = _get_current_user_aikotoba_id()
+    deleted = WRITER.run(
+        lambda conn: conn.execute(
+            text("DELETE FROM transactions WHERE id = :id AND aikotoba_id = :aid"), {"id": transaction_id, "aid": aid}
+        ).rowcount
+    )
+    return jsonify({"deleted": deleted})
 
 @app.route('/dev', methods=['GET', 'POST'])
 def dev_options():
+    from kakeibo import sql_console
+
+    console = {'query': '', 'page': 1, 'row_limit': sql_console.DEFAULT_ROW_LIMIT}
     sql_result = None
     if request.method == 'POST':
         sql_query = request.form['sql_query']
-        engine = connect_db()
+        page = request.form.get('page', type=int) or 1
+        row_limit = sql_console.clamp_row_limit(request.form.get('row_limit'))
+        console.update(query=sql_query, page=page, row_limit=row_limit)
         try:
-            with engine.connect() as conn:
-                # For SELECT statements
-                if sql_query.strip().upper().startswith('SELECT'):
-                    result = conn.execute(text(sql_query)).fetchall()
-                    sql_result = "\n".join([str(row) for row in result])
-                # For DML/DDL statements
-                else:
-                    with conn.begin(): # Use begin() for transactions
-                        result = conn.execute(text(sql_query))
-                        sql_result = f"Rows affected: {result.rowcount}"
+            if sql_console.is_read(sql_query):
+                console['result'] = sql_console.run_read(sql_query, page=page, row_limit=row_limit)
+            # For DML/DDL statements
+            else:
+                result = sql_console.run_write(sql_query)
+                sql_result = f"Rows affected: {result['rowcount']} ({result['elapsed_ms']} ms)"
         except Exception as e:
             sql_result = f"Error: {str(e)}"
 
-    return render_template('dev_options.html', sql_result=sql_result, **get_sidebar_data(selected_month=request.args.get('month')))
+    from kakeibo import slowlog
+
+    return render_template(
+        'dev_options.html', sql_result=sql_result, console=console,
+        slow_query_ms=slowlog.threshold_ms, slow_queries=slowlog.aggregate(),
+        **get_sidebar_data(selected_month=request.args.get('month')),
+    )
 
 @app.route('/download_db')
 def download_db():
-    """Download the current SQLite database file.
+    """Download a consistent, compressed snapshot of the SQLite database.
 
-    This endpoint is linked from the developer options page.
+    Built with the SQLite online backup API (see kakeibo.backup) and reused until
+    the data changes, so Range requests and resumed downloads see one file.
+    ``?codec=zstd`` is honoured when the zstandard package is installed.
     """
+    from kakeibo.backup import CODECS, MIMETYPES, available_codecs, compressed_backup
+
+    codec = request.args.get('codec', 'gzip')
+    if codec not in available_codecs():
+        return f"Unsupported codec: {codec}", 400
     try:
-        # DB_FILENAME is a pathlib.Path
-        if not DB_FILENAME.exists():
-            return "Database file not found.", 404
-        return send_file(
-            DB_FILENAME,
-            as_attachment=True,
-            download_name='kakeibo.db',
-            mimetype='application/octet-stream',
-        )
+        path = compressed_backup(codec)
     except Exception as e:
         # Keep it simple; in production we would log this.
         return f"Failed to prepare download: {str(e)}", 500
+    return send_file(
+        path,
+        as_attachment=True,
+        download_name='kakeibo' + CODECS[codec],
+        mimetype=MIMETYPES[codec],
+        conditional=True,
+        max_age=0,
+    )
 
 
 @app.route('/logout', methods=['GET', 'POST'])
 def logout():
     """Clear auth-related session keys and redirect to home."""
     for key in [
-        'auth_user', 'user_id', 'username', 'role'
+        'auth_user', 'user_id', 'username', 'role', 'aikotoba_id'
     ]:
         session.pop(key, None)
     return redirect(url_for('index'))
@@ -406,7 +861,7 @@ def logout():
 
 @app.route('/aikotoba', methods=['GET'])
 def aikotoba_settings():
-    engine = connect_db()
+    engine = connect_db(readonly=True)
     aid = _get_current_user_aikotoba_id()
     with engine.connect() as conn:
         row = conn.execute(text("SELECT code, label FROM aikotoba WHERE id = :id"), {"id": aid}).fetchone()
@@ -419,24 +874,32 @@ def join_aikotoba():
     code = request.form.get('code', '').strip()
     if not code:
         return redirect(url_for('aikotoba_settings'))
-    engine = connect_db()
     username = session.get('auth_user')
-    with engine.begin() as conn:
+
+    def _join(conn):
         aid = conn.execute(text("SELECT id FROM aikotoba WHERE code = :c AND active = 1"), {"c": code}).scalar()
-        if not aid:
-            session['aikotoba_error'] = '合言葉が見つかりません。'
-            return redirect(url_for('aikotoba_settings'))
-        conn.execute(text("UPDATE users SET aikotoba_id = :aid WHERE username = :u"), {"aid": aid, "u": username})
+        if aid:
+            conn.execute(text("UPDATE users SET aikotoba_id = :aid WHERE username = :u"), {"aid": aid, "u": username})
+        return aid
+
+    aid = WRITER.run(_join)
+    if not aid:
+        session['aikotoba_error'] = '合言葉が見つかりません。'
+        return redirect(url_for('aikotoba_settings'))
+    _set_current_user_aikotoba_id(aid)
     return redirect(url_for('aikotoba_settings'))
 
 
 @app.post('/aikotoba/leave')
 def leave_aikotoba():
-    engine = connect_db()
     username = session.get('auth_user')
-    public_id = get_aikotoba_id("public")
-    with engine.begin() as conn:
-        conn.execute(text("UPDATE users SET aikotoba_id = :aid WHERE username = :u"), {"aid": public_id, "u": username})
+    public_id = _public_aikotoba_id()
+    WRITER.run(
+        lambda conn: conn.execute(
+            text("UPDATE users SET aikotoba_id = :aid WHERE username = :u"), {"aid": public_id, "u": username}
+        )
+    )
+    _set_current_user_aikotoba_id(public_id)
     return redirect(url_for('aikotoba_settings'))
 
 
@@ -467,22 +930,18 @@ def _line_cfg():
 
 
 def _ensure_oauth_state_table():
-    engine = connect_db()
-    with engine.begin() as conn:
-        conn.execute(text(
-            """
-            CREATE TABLE IF NOT EXISTS oauth_states (
-                state TEXT PRIMARY KEY,
-                created_at TEXT NOT NULL DEFAULT (datetime('now'))
-            )
-            """
-        ))
+    WRITER.run(lambda conn: conn.execute(text(
+        """
+        CREATE TABLE IF NOT EXISTS oauth_states (
+            state TEXT PRIMARY KEY,
+            created_at TEXT NOT NULL DEFAULT (datetime('now'))
+        )
+        """
+    )))
 
 
 def _save_state(state: str):
-    engine = connect_db()
-    with engine.begin() as conn:
-        conn.execute(text("INSERT INTO oauth_states (state) VALUES (:s)"), {"s": state})
+    WRITER.run(lambda conn: conn.execute(text("INSERT INTO oauth_states (state) VALUES (:s)"), {"s": state}))
 
 
 def _is_valid_state(state: str) -> bool:
@@ -499,31 +958,27 @@ def _is_valid_state(state: str) -> bool:
 
 
 def _remove_state(state: str):
-    engine = connect_db()
-    with engine.begin() as conn:
-        conn.execute(text("DELETE FROM oauth_states WHERE state = :s"), {"s": state})
+    WRITER.run(lambda conn: conn.execute(text("DELETE FROM oauth_states WHERE state = :s"), {"s": state}))
 
 
 def _cleanup_old_states():
-    engine = connect_db()
-    with engine.begin() as conn:
-        conn.execute(text("DELETE FROM oauth_states WHERE datetime(created_at) < datetime('now','-1 day')"))
+    WRITER.run(lambda conn: conn.execute(
+        text("DELETE FROM oauth_states WHERE datetime(created_at) < datetime('now','-1 day')")
+    ))
 
 
 def _ensure_users_table():
-    engine = connect_db()
-    with engine.begin() as conn:
-        conn.execute(text(
-            """
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT NOT NULL UNIQUE,
-                password TEXT NOT NULL,
-                role TEXT NOT NULL DEFAULT 'user',
-                created_at TEXT NOT NULL DEFAULT (datetime('now'))
-            )
-            """
-        ))
+    WRITER.run(lambda conn: conn.execute(text(
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL UNIQUE,
+            password TEXT NOT NULL,
+            role TEXT NOT NULL DEFAULT 'user',
+            created_at TEXT NOT NULL DEFAULT (datetime('now'))
+        )
+        """
+    )))
 
 
 def _user_exists(username: str) -> bool:
@@ -534,9 +989,9 @@ def _user_exists(username: str) -> bool:
 
 
 def _create_user(username: str):
-    engine = connect_db()
-    with engine.begin() as conn:
-        conn.execute(text("INSERT INTO users (username, password) VALUES (:u, :p)"), {"u": username, "p": "external"})
+    WRITER.run(lambda conn: conn.execute(
+        text("INSERT INTO users (username, password) VALUES (:u, :p)"), {"u": username, "p": "external"}
+    ))
 
 
 @app.route('/login/line')
@@ -569,6 +1024,7 @@ def callback_line():
     if not code or not state or not _is_valid_state(state):
         return "不正なリクエストです（state/code）", 400
     _remove_state(state)
+    import requests  # only needed for the LINE round trip; keeps cold start light
 
     # Exchange token
     try:
@@ -605,11 +1061,14 @@ def callback_line():
     _ensure_users_table()
     username = f"line:{user_id}"
     if not _user_exists(username):
-        public_id = get_aikotoba_id("public")
-        engine = connect_db()
-        with engine.begin() as conn:
-            conn.execute(text("INSERT INTO users (username, password, aikotoba_id) VALUES (:u, :p, :aid)"), {"u": username, "p": "external", "aid": public_id})
+        public_id = _public_aikotoba_id()
+        WRITER.run(lambda conn: conn.execute(
+            text("INSERT INTO users (username, password, aikotoba_id) VALUES (:u, :p, :aid)"),
+            {"u": username, "p": "external", "aid": public_id},
+        ))
     session['auth_user'] = username
+    # Resolve the aikotoba afresh for the new login
+    session.pop('aikotoba_id', None)
     # Redirect back to the original page if available
     next_url = session.pop('post_login_redirect', None)
     if next_url and isinstance(next_url, str) and next_url.startswith('/'):
@@ -618,14 +1077,13 @@ def callback_line():
 
 @app.route('/edit/<int:transaction_id>', methods=['GET', 'POST'])
 def edit_transaction(transaction_id):
-    engine = connect_db()
     transaction = get_transaction_by_id(transaction_id)
 
     if not transaction:
         return "Transaction not found", 404
 
     aid = _get_current_user_aikotoba_id()
-    main_categories, all_sub_categories = get_categories(engine, aikotoba_id=aid)
+    main_categories, all_sub_categories = get_categories(aikotoba_id=aid)
 
     if request.method == 'POST':
         sub_category_id = request.form['sub_category_id']
@@ -634,8 +1092,8 @@ def edit_transaction(transaction_id):
         detail = request.form['detail']
         amount = request.form['amount']
 
-        with engine.begin() as conn:
-            conn.execute(
+        WRITER.run(
+            lambda conn: conn.execute(
                 text(
                     """
                     UPDATE transactions
@@ -654,9 +1112,10 @@ def edit_transaction(transaction_id):
                     "type": transaction_type,
                     "date": transaction_date,
                     "detail": detail,
-                    "aid": _get_current_user_aikotoba_id(),
+                    "aid": aid,
                 },
             )
+        )
         return redirect(url_for('edit'))
 
     return render_template(
@@ -670,9 +1129,8 @@ def edit_transaction(transaction_id):
 
 @app.route('/categories', methods=['GET', 'POST'])
 def categories():
-    engine = connect_db()
     aid = _get_current_user_aikotoba_id()
-    main_categories, sub_categories = get_categories(engine, aikotoba_id=aid)
+    main_categories, sub_categories = get_categories(aikotoba_id=aid)
 
     if request.method == 'POST':
         main_category_id = request.form['main_category_id']
@@ -689,7 +1147,6 @@ def categories():
 
 @app.route('/categories/edit/<int:sub_category_id>', methods=['GET', 'POST'])
 def edit_category(sub_category_id):
-    engine = connect_db()
     sub_category = get_sub_category_by_id(sub_category_id)
 
     if not sub_category:
@@ -716,92 +1173,64 @@ def edit_category(sub_category_id):
 
 @app.route('/categories/delete/<int:sub_category_id>', methods=['POST'])
 def delete_category(sub_category_id):
-    # First, delete related transactions to maintain referential integrity
-    engine = connect_db()
-    with engine.begin() as conn:
+    def _delete(conn):
+        # First, delete related transactions to maintain referential integrity
         conn.execute(
             text("DELETE FROM transactions WHERE sub_category_id = :sid"),
             {"sid": sub_category_id}
         )
-    # Then delete the sub-category itself
-    delete_sub_category(sub_category_id)
+        # Then delete the sub-category itself (runs inline in this job)
+        delete_sub_category(sub_category_id)
+
+    WRITER.run(_delete)
     return redirect(url_for('categories'))
 
 @app.route('/delete/<int:transaction_id>', methods=['POST'])
 def delete_transaction(transaction_id):
-    engine = connect_db()
-    with engine.begin() as conn:
-        conn.execute(
+    WRITER.run(
+        lambda conn: conn.execute(
             text("DELETE FROM transactions WHERE id = :id"),
             {"id": transaction_id}
         )
+    )
     return redirect(url_for('edit'))
 
 @app.route('/graphs')
 def graphs():
-    import pandas as pd
-    import altair as alt
-    aid = _get_current_user_aikotoba_id()
-    monthly_summary_df = get_monthly_summary(aikotoba_id=aid)
-
-    # Month options from data
-    if not monthly_summary_df.empty:
-        month_options = sorted(monthly_summary_df['month'].dt.strftime('%Y-%m').unique())
-    else:
-        month_options = []
-
-    # Query params for range filtering
-    start_month_q = request.args.get('start_month')
-    end_month_q = request.args.get('end_month')
-    if month_options:
-        selected_start = start_month_q if start_month_q in month_options else month_options[0]
-        selected_end = end_month_q if end_month_q in month_options else month_options[-1]
-        # Normalize order if reversed
-        if month_options.index(selected_start) > month_options.index(selected_end):
-            selected_start, selected_end = selected_end, selected_start
-        start_dt = pd.to_datetime(selected_start + '-01')
-        end_dt = pd.to_datetime(selected_end + '-01')
-        monthly_summary_df = monthly_summary_df[(monthly_summary_df['month'] >= start_dt) & (monthly_summary_df['month'] <= end_dt)]
-    else:
-        selected_start = None
-        selected_end = None
-
-    # Monthly Income/Expense Chart
-    monthly_chart = alt.Chart(monthly_summary_df).mark_line().encode(
-        x=alt.X('month:T', axis=alt.Axis(title='月')),
-        y=alt.Y('当月収支:Q', axis=alt.Axis(title='当月収支')),
-        tooltip=['month:T', '当月収支:Q']
-    ).properties(
-        title='月次収支'
-    ).interactive()
-
-    # Cumulative Assets Chart
-    cumulative_chart = alt.Chart(monthly_summary_df).mark_line().encode(
-        x=alt.X('month:T', axis=alt.Axis(title='月')),
-        y=alt.Y('累計資産:Q', axis=alt.Axis(title='累計資産')),
-        tooltip=['month:T', '累計資産:Q']
-    ).properties(
-        title='累計資産推移'
-    ).interactive()
-
-    monthly_chart_json = json.dumps(monthly_chart.to_dict())
-    cumulative_chart_json = json.dumps(cumulative_chart.to_dict())
-
+    # Chart specs live in static/js/graphs.js and data comes from /api/graphs/monthly
     return render_template(
         'graphs.html',
-        monthly_chart_json=monthly_chart_json,
-        cumulative_chart_json=cumulative_chart_json,
-        month_options=month_options,
-        selected_start_month=selected_start,
-        selected_end_month=selected_end,
+        selected_start_month=request.args.get('start_month', ''),
+        selected_end_month=request.args.get('end_month', ''),
         **get_sidebar_data(selected_month=request.args.get('month'))
     )
 
+
+@app.get('/api/graphs/monthly')
+def api_graphs_monthly():
+    """Monthly income/expense/net/cumulative as compact rows (``start``/``end`` optional, YYYY-MM).
+
+    The cumulative balance always runs from the first month, also for a sub-range.
+    """
+    aid = _get_current_user_aikotoba_id()
+    start = request.args.get('start') or ''
+    end = request.args.get('end') or '9999-99'
+
+    def build():
+        rows = [row for row in get_monthly_balance(aid) if start <= row[0] <= end]
+        return jsonify({
+            "columns": ["month", "income", "expense", "net", "cumulative"],
+            "rows": rows,
+        })
+
+    return _versioned_response(aid, build)
+
+
 # ===== Sub-category JSON API (for categories UX) =====
 
 @app.get('/api/sub_categories')
 def api_get_sub_categories():
-    engine = connect_db()
+    engine = connect_db(readonly=True)
     main_category_id = request.args.get('main_category_id')
     q = request.args.get('q')
     query = """
@@ -823,41 +1252,44 @@ def api_get_sub_categories():
         query += " AND (sc.name LIKE :q OR mc.name LIKE :q)"
         params['q'] = f"%{q}%"
     query += " ORDER BY mc.id ASC, sc.id ASC"
-    with engine.connect() as conn:
-        rows = conn.execute(text(query), params).mappings().all()
-        data = [
-            {
-                'id': r['id'],
-                'name': r['sub_name'],
-                'main_category_id': r['main_category_id'],
-                'main_category_name': r['main_name'],
-            }
-            for r in rows
-        ]
-    return jsonify(data)
+
+    def build():
+        with engine.connect() as conn:
+            rows = conn.execute(text(query), params).mappings().all()
+            data = [
+                {
+                    'id': r['id'],
+                    'name': r['sub_name'],
+                    'main_category_id': r['main_category_id'],
+                    'main_category_name': r['main_name'],
+                }
+                for r in rows
+            ]
+        return jsonify(data)
+
+    return _versioned_response(aid, build)
 
 
 @app.post('/api/sub_categories')
 def api_create_sub_category():
-    engine = connect_db()
     payload = request.get_json(force=True, silent=True) or {}
     mid = payload.get('main_category_id')
     name = payload.get('name')
     if not mid or not name:
         return jsonify({"error": "main_category_id と name は必須です"}), 400
-    with engine.begin() as conn:
+    def _insert(conn):
         # Inherit aikotoba from main category
         aid = conn.execute(text("SELECT aikotoba_id FROM main_categories WHERE id = :mid"), {"mid": mid}).scalar()
-        res = conn.execute(text(
+        return conn.execute(text(
             "INSERT INTO sub_categories (main_category_id, name, aikotoba_id) VALUES (:mid, :name, :aid)"
-        ), {"mid": mid, "name": name, "aid": aid})
-        new_id = res.lastrowid
+        ), {"mid": mid, "name": name, "aid": aid}).lastrowid
+
+    new_id = WRITER.run(_insert)
     return jsonify({"id": new_id}), 201
 
 
 @app.patch('/api/sub_categories/<int:sub_id>')
 def api_update_sub_category(sub_id: int):
-    engine = connect_db()
     payload = request.get_json(force=True, silent=True) or {}
     allowed = {'name', 'main_category_id'}
     fields = {k: payload[k] for k in allowed if k in payload}
@@ -871,18 +1303,18 @@ def api_update_sub_category(sub_id: int):
         set_parts.append("aikotoba_id = (SELECT aikotoba_id FROM main_categories WHERE id = :main_category_id)")
     set_clause = ", ".join(set_parts)
     fields['id'] = sub_id
-    with engine.begin() as conn:
-        r = conn.execute(text(f"UPDATE sub_categories SET {set_clause} WHERE id = :id"), fields)
-    return jsonify({"updated": r.rowcount})
+    updated = WRITER.run(lambda conn: conn.execute(text(f"UPDATE sub_categories SET {set_clause} WHERE id = :id"), fields).rowcount)
+    return jsonify({"updated": updated})
 
 
 @app.delete('/api/sub_categories/<int:sub_id>')
 def api_delete_sub_category(sub_id: int):
-    engine = connect_db()
-    with engine.begin() as conn:
+    def _delete(conn):
         conn.execute(text("DELETE FROM transactions WHERE sub_category_id = :sid"), {"sid": sub_id})
-        r = conn.execute(text("DELETE FROM sub_categories WHERE id = :sid"), {"sid": sub_id})
-    return jsonify({"deleted": r.rowcount})
+        return conn.execute(text("DELETE FROM sub_categories WHERE id = :sid"), {"sid": sub_id}).rowcount
+
+    deleted = WRITER.run(_delete)
+    return jsonify({"deleted": deleted})
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -5,7 +5,7 @@ from typing import Optional
 
 import streamlit as st
 from sqlalchemy import text
-from kakeibo.db import connect_db
+from kakeibo.db import WRITER, connect_db
 from .line_auth import line_login_flow, _get_line_config
 
 
@@ -35,7 +35,6 @@ def _verify_password(stored: str, provided: str, salt: str = "") -> bool:
 
 
 def _ensure_users_table():
-    engine = connect_db()
     sql = text("""
         CREATE TABLE IF NOT EXISTS users (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -45,8 +44,7 @@ def _ensure_users_table():
             created_at TEXT NOT NULL DEFAULT (datetime('now'))
         )
     """)
-    with engine.begin() as conn:
-        conn.execute(sql)
+    WRITER.run(lambda conn: conn.execute(sql))
 
 
 def _db_get_user_password(username: str) -> Optional[str]:
@@ -64,12 +62,10 @@ def _db_user_exists(username: str) -> bool:
 
 
 def _db_create_user(username: str, stored_password: str) -> None:
-    engine = connect_db()
-    with engine.begin() as conn:
-        conn.execute(
-            text("INSERT INTO users (username, password) VALUES (:u, :p)"),
-            {"u": username, "p": stored_password},
-        )
+    WRITER.run(lambda conn: conn.execute(
+        text("INSERT INTO users (username, password) VALUES (:u, :p)"),
+        {"u": username, "p": stored_password},
+    ))
 
 
 def _db_has_any_user() -> bool:
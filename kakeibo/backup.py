@@ -0,0 +1,108 @@
+"""Consistent, compressed snapshots of the live database for download.
+
+Copying kakeibo.db byte by byte can catch a half-written page (or miss what is
+still in the WAL). Instead the file is copied with the SQLite online backup
+API in steps of BACKUP_STEP_PAGES pages. If another connection writes in
+between, SQLite restarts the copy, so the result is always one consistent
+snapshot. Writers are only held up for one step at a time.
+
+The snapshot is compressed (gzip, or zstd when the ``zstandard`` package is
+installed) into RUNTIME_DB_DIR/backups and reused until the data version
+changes or it is older than BACKUP_MAX_AGE_SECONDS. Reusing the same file
+keeps Range requests and resumed downloads consistent. Superseded snapshots
+are only deleted once they are BACKUP_GRACE_SECONDS past that window, so a
+download that started just before a newer snapshot appeared keeps its file.
+"""
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from kakeibo.db import DB_FILENAME, ensure_db_file, get_data_version
+
+BACKUP_DIR = DB_FILENAME.parent / "backups"
+BACKUP_STEP_PAGES = 1024
+BACKUP_MAX_AGE_SECONDS = 300
+BACKUP_GRACE_SECONDS = 600  # how long a handed-out snapshot may still be streaming
+COPY_CHUNK_BYTES = 1 << 20
+
+try:  # optional dependency
+    import zstandard
+except ImportError:  # pragma: no cover - depends on the environment
+    zstandard = None
+
+CODECS = {"gzip": ".db.gz", "zstd": ".db.zst"}
+MIMETYPES = {"gzip": "application/gzip", "zstd": "application/zstd"}
+
+
+def available_codecs() -> list[str]:
+    return ["gzip", "zstd"] if zstandard is not None else ["gzip"]
+
+
+def backup_to(dest: Path, step_pages: int = BACKUP_STEP_PAGES) -> None:
+    """Write a consistent copy of the live DB to ``dest`` with the online backup API."""
+    ensure_db_file()
+    src = sqlite3.connect(f"file:{DB_FILENAME}?mode=ro", uri=True)
+    dst = sqlite3.connect(dest)
+    try:
+        # sleep between steps so writers can get the lock
+        src.backup(dst, pages=step_pages, sleep=0.005)
+    finally:
+        dst.close()
+        src.close()
+
+
+def _compress(raw: Path, out, codec: str) -> None:
+    with open(raw, "rb") as fin:
+        if codec == "zstd":
+            with zstandard.ZstdCompressor(level=10).stream_writer(out, closefd=False) as fout:
+                shutil.copyfileobj(fin, fout, COPY_CHUNK_BYTES)
+        else:
+            # mtime=0: identical snapshots compress to identical bytes
+            with gzip.GzipFile(filename="kakeibo.db", mode="wb", fileobj=out, compresslevel=6, mtime=0) as fout:
+                shutil.copyfileobj(fin, fout, COPY_CHUNK_BYTES)
+
+
+def compressed_backup(codec: str = "gzip") -> Path:
+    """Return the path of a compressed snapshot for the current data version.
+
+    The snapshot is built on first use and then reused. Files are written under
+    a temporary name and renamed into place, so concurrent workers never serve a
+    partial file.
+    """
+    if codec not in available_codecs():
+        raise ValueError(f"unsupported codec: {codec!r} (available: {', '.join(available_codecs())})")
+    BACKUP_DIR.mkdir(parents=True, exist_ok=True)
+    suffix = CODECS[codec]
+    target = BACKUP_DIR / f"kakeibo-v{get_data_version()}{suffix}"
+    try:
+        if time.time() - target.stat().st_mtime < BACKUP_MAX_AGE_SECONDS:
+            return target
+    except FileNotFoundError:
+        pass
+
+    fd, raw_name = tempfile.mkstemp(dir=BACKUP_DIR, suffix=".db.tmp")
+    os.close(fd)
+    raw = Path(raw_name)
+    packed = raw.with_suffix(suffix + ".tmp")
+    try:
+        backup_to(raw)
+        with open(packed, "wb") as out:
+            _compress(raw, out, codec)
+        os.replace(packed, target)
+    finally:
+        raw.unlink(missing_ok=True)
+        packed.unlink(missing_ok=True)
+
+    # drop superseded snapshots nobody can still be downloading
+    expired = time.time() - BACKUP_MAX_AGE_SECONDS - BACKUP_GRACE_SECONDS
+    for old in BACKUP_DIR.glob(f"kakeibo-v*{suffix}"):
+        try:
+            if old != target and old.stat().st_mtime < expired:
+                old.unlink()
+        except OSError:
+            pass  # already removed by another worker, or still open (Windows)
+    return target
@@ -0,0 +1,50 @@
+"""Small in-process caches keyed by per-tenant data versions.
+
+Readers fold ``kakeibo.db.get_data_version(aikotoba_id)`` into their cache
+keys so stale entries are simply never looked up again (and age out of the
+LRU). The version is bumped by DB triggers, so every worker sees every write.
+"""
+import threading
+from collections import OrderedDict
+
+
+class VersionedCache:
+    """Thread-safe LRU that records its hit rate."""
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._data: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_set(self, key, factory):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+        # Build outside the lock; a concurrent miss on the same key just recomputes.
+        value = factory()
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+            }
@@ -1,10 +1,11 @@
 import os
+from datetime import datetime
 from pathlib import Path
 import shutil
-import pandas as pd
-import streamlit as st
-from sqlalchemy import create_engine, text
-import os
+from sqlalchemy import create_engine, event, text
+
+from kakeibo import slowlog
+from kakeibo.writer import WriteCoordinator
 
 # Runtime DB settings
 # Prefer /data in Docker/Fly. Allow override via env var and fallback in restricted envs.
@@ -18,23 +19,209 @@ except PermissionError:
     RUNTIME_DB_DIR.mkdir(parents=True, exist_ok=True)
 DB_FILENAME = RUNTIME_DB_DIR / "kakeibo.db"
 
-# Seed copy on first run (fallback for non-Docker runs)
+# Seed copy on first run (fallback for non-Docker runs); see ensure_db_file()
 SEED_DB = Path(__file__).resolve().parent.parent / "data" / "kakeibo.db"
-if not DB_FILENAME.exists() and SEED_DB.exists():
-    shutil.copy2(SEED_DB, DB_FILENAME)
 
 
-# Global SQLAlchemy engine
-ENGINE = create_engine(f"sqlite:///{DB_FILENAME}", future=True)
+# SQLite connection profiles, selected with KAKEIBO_SQLITE_PROFILE and applied
+# to every new DBAPI connection via a connect event. "legacy" keeps SQLite's
+# defaults (rollback journal); "balanced" is tuned for gunicorn threads plus
+# the Streamlit process sharing one file.
+SQLITE_PROFILES = {
+    "legacy": {},
+    "balanced": {
+        "journal_mode": "WAL",
+        "busy_timeout": 5000,  # ms to wait on a locked DB before raising
+        "synchronous": "NORMAL",  # safe with WAL; fsync only at checkpoints
+        "cache_size": -16000,  # KiB (negative value) => ~16 MiB page cache
+        "mmap_size": 64 * 1024 * 1024,
+        "temp_store": "MEMORY",
+    },
+    "low-memory": {
+        "journal_mode": "WAL",
+        "busy_timeout": 5000,
+        "synchronous": "NORMAL",
+        "cache_size": -2000,
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+    },
+}
+DEFAULT_SQLITE_PROFILE = "balanced"
+SQLITE_PROFILE = os.environ.get("KAKEIBO_SQLITE_PROFILE", DEFAULT_SQLITE_PROFILE)
+if SQLITE_PROFILE not in SQLITE_PROFILES:
+    SQLITE_PROFILE = DEFAULT_SQLITE_PROFILE
+
+
+def create_sqlite_engine(path, profile: str = SQLITE_PROFILE, readonly: bool = False):
+    """Create an engine for ``path`` with the PRAGMAs of ``profile`` applied.
+
+    ``readonly`` opens the file with ``mode=ro`` and skips journal_mode, which a
+    read-only connection cannot change (WAL is persistent in the file anyway).
+    """
+    pragmas = dict(SQLITE_PROFILES[profile])
+    if readonly:
+        pragmas.pop("journal_mode", None)
+        pragmas["query_only"] = 1
+        engine = create_engine(f"sqlite:///file:{path}?mode=ro&uri=true", future=True)
+    else:
+        engine = create_engine(f"sqlite:///{path}", future=True)
+
+    if pragmas:
+        @event.listens_for(engine, "connect")
+        def _apply_pragmas(dbapi_conn, _record):
+            cur = dbapi_conn.cursor()
+            try:
+                for name, value in pragmas.items():
+                    cur.execute(f"PRAGMA {name} = {value}")
+            finally:
+                cur.close()
+
+    return engine
+
+
+# Global SQLAlchemy engines: ENGINE for writes, READ_ENGINE for GET/read paths
+ENGINE = create_sqlite_engine(DB_FILENAME)
+READ_ENGINE = create_sqlite_engine(DB_FILENAME, readonly=True)
+# Opt-in slow-query log (KAKEIBO_SLOW_QUERY_MS); covers Flask and Streamlit alike
+slowlog.instrument_engine(ENGINE)
+slowlog.instrument_engine(READ_ENGINE)
+# Every mutation goes through WRITER (kakeibo.writer): one thread, one
+# connection, queued writes group-committed. Only the schema bootstrap below
+# writes on ENGINE directly.
+WRITER = WriteCoordinator(ENGINE)
 
 
 def exists_db_file() -> bool:
     return DB_FILENAME.exists()
 
 
-def connect_db():
-    """Return SQLAlchemy engine for compatibility with existing callers."""
-    return ENGINE
+_DB_FILE_READY = False
+
+
+def ensure_db_file() -> None:
+    """Copy the seed DB into place if the runtime DB does not exist yet.
+
+    Runs on first use rather than at import, so importing this module does no I/O
+    beyond resolving the data directory.
+    """
+    global _DB_FILE_READY
+    if not DB_FILENAME.exists() and SEED_DB.exists():
+        shutil.copy2(SEED_DB, DB_FILENAME)
+    _DB_FILE_READY = True
+
+
+def connect_db(readonly: bool = False):
+    """Return the shared SQLAlchemy engine (the read-only one if ``readonly``)."""
+    if not _DB_FILE_READY:
+        ensure_db_file()
+    return READ_ENGINE if readonly else ENGINE
+
+
+# pandas/Streamlit functions live in kakeibo.frames; resolved on first access
+# (PEP 562) so `from kakeibo.db import load_data` keeps working without making
+# every importer of this module pay for pandas and streamlit.
+_FRAME_FUNCTIONS = frozenset({"load_data", "update_data", "get_monthly_summary", "get_gifts_summary"})
+
+
+def __getattr__(name):
+    if name in _FRAME_FUNCTIONS:
+        from kakeibo import frames
+
+        return getattr(frames, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Composite indexes backing the hot read paths (/api/transactions, sidebar
+# budget progress, monthly summary, category lookups). Created idempotently by
+# ensure_aikotoba_schema() so existing volumes pick them up on next boot.
+_INDEXES = (
+    ("idx_transactions_aikotoba_date", "transactions", "aikotoba_id, date"),
+    ("idx_transactions_sub_category_date", "transactions", "sub_category_id, date"),
+    ("idx_transactions_aikotoba_type_date", "transactions", "aikotoba_id, type, date"),
+    ("idx_transactions_aikotoba_detail_date", "transactions", "aikotoba_id, detail, date"),
+    ("idx_sub_categories_main_aikotoba", "sub_categories", "main_category_id, aikotoba_id"),
+    ("idx_sub_categories_aikotoba", "sub_categories", "aikotoba_id"),
+    ("idx_main_categories_aikotoba_name", "main_categories", "aikotoba_id, name"),
+)
+
+
+# Monthly rollup of transactions per (tenant, month, type), kept current by
+# triggers so the graph/summary reads are O(months) instead of O(transactions).
+# Rows without a tenant (legacy Streamlit inserts) roll up under aikotoba_id 0.
+_MONTHLY_TOTALS_DDL = (
+    """
+    CREATE TABLE IF NOT EXISTS monthly_totals (
+        aikotoba_id INTEGER NOT NULL,
+        month TEXT NOT NULL,
+        type TEXT NOT NULL,
+        total INTEGER NOT NULL DEFAULT 0,
+        row_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (aikotoba_id, month, type)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_monthly_totals_insert AFTER INSERT ON transactions
+    BEGIN
+        INSERT INTO monthly_totals (aikotoba_id, month, type, total, row_count)
+        SELECT COALESCE(NEW.aikotoba_id, 0), strftime('%Y-%m', NEW.date), NEW.type, COALESCE(NEW.amount, 0), 1
+         WHERE strftime('%Y-%m', NEW.date) IS NOT NULL
+        ON CONFLICT (aikotoba_id, month, type)
+        DO UPDATE SET total = total + excluded.total, row_count = row_count + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_monthly_totals_delete AFTER DELETE ON transactions
+    BEGIN
+        UPDATE monthly_totals
+           SET total = total - COALESCE(OLD.amount, 0), row_count = row_count - 1
+         WHERE aikotoba_id = COALESCE(OLD.aikotoba_id, 0)
+           AND month = strftime('%Y-%m', OLD.date)
+           AND type = OLD.type;
+        DELETE FROM monthly_totals
+         WHERE aikotoba_id = COALESCE(OLD.aikotoba_id, 0)
+           AND month = strftime('%Y-%m', OLD.date)
+           AND type = OLD.type
+           AND row_count <= 0;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_monthly_totals_update
+    AFTER UPDATE OF aikotoba_id, date, type, amount ON transactions
+    BEGIN
+        UPDATE monthly_totals
+           SET total = total - COALESCE(OLD.amount, 0), row_count = row_count - 1
+         WHERE aikotoba_id = COALESCE(OLD.aikotoba_id, 0)
+           AND month = strftime('%Y-%m', OLD.date)
+           AND type = OLD.type;
+        INSERT INTO monthly_totals (aikotoba_id, month, type, total, row_count)
+        SELECT COALESCE(NEW.aikotoba_id, 0), strftime('%Y-%m', NEW.date), NEW.type, COALESCE(NEW.amount, 0), 1
+         WHERE strftime('%Y-%m', NEW.date) IS NOT NULL
+        ON CONFLICT (aikotoba_id, month, type)
+        DO UPDATE SET total = total + excluded.total, row_count = row_count + 1;
+        DELETE FROM monthly_totals
+         WHERE aikotoba_id = COALESCE(OLD.aikotoba_id, 0)
+           AND month = strftime('%Y-%m', OLD.date)
+           AND type = OLD.type
+           AND row_count <= 0;
+    END
+    """,
+)
+
+# Dropped and re-created on every ensure_aikotoba_schema() so databases created
+# with an older trigger body pick up the current one (IF NOT EXISTS would keep it).
+_MONTHLY_TOTALS_TRIGGERS = (
+    "trg_monthly_totals_insert",
+    "trg_monthly_totals_delete",
+    "trg_monthly_totals_update",
+)
+
+_REBUILD_MONTHLY_TOTALS_SQL = """
+    INSERT INTO monthly_totals (aikotoba_id, month, type, total, row_count)
+    SELECT COALESCE(aikotoba_id, 0), strftime('%Y-%m', date), type, SUM(COALESCE(amount, 0)), COUNT(*)
+      FROM transactions
+     WHERE strftime('%Y-%m', date) IS NOT NULL
+     GROUP BY 1, 2, 3
+"""
 
 
 def _column_exists(conn, table: str, column: str) -> bool:
@@ -42,13 +229,61 @@ def _column_exists(conn, table: str, column: str) -> bool:
     return any(r[1] == column for r in rows)
 
 
+# Per-tenant data version, bumped by triggers on every write to the tables the
+# UI reads. Readers fold it into cache keys and ETags; being in the DB it is
+# shared by all gunicorn workers and sees writes from the Streamlit process.
+# Tenant-less rows count under aikotoba_id 0, which every tenant's version includes.
+_VERSIONED_TABLES = ("transactions", "sub_categories", "main_categories")
+_BUMP_VERSION_SQL = """
+    INSERT INTO data_versions (aikotoba_id, version, updated_at)
+    VALUES (COALESCE({ref}.aikotoba_id, 0), 1, CAST(strftime('%s', 'now') AS INTEGER))
+    ON CONFLICT (aikotoba_id) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+"""
+_DATA_VERSIONS_DDL = (
+    """
+    CREATE TABLE IF NOT EXISTS data_versions (
+        aikotoba_id INTEGER PRIMARY KEY,
+        version INTEGER NOT NULL,
+        updated_at INTEGER NOT NULL
+    )
+    """,
+    *(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_data_versions_{table}_{event} AFTER {event.upper()} ON {table}
+        BEGIN
+            {_BUMP_VERSION_SQL.format(ref=ref)}
+        END
+        """
+        for table in _VERSIONED_TABLES
+        for event, ref in (("insert", "NEW"), ("delete", "OLD"))
+    ),
+    *(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_data_versions_{table}_update AFTER UPDATE ON {table}
+        BEGIN
+            {_BUMP_VERSION_SQL.format(ref="NEW")}
+            INSERT INTO data_versions (aikotoba_id, version, updated_at)
+            SELECT COALESCE(OLD.aikotoba_id, 0), 1, CAST(strftime('%s', 'now') AS INTEGER)
+             WHERE OLD.aikotoba_id IS NOT NEW.aikotoba_id
+            ON CONFLICT (aikotoba_id) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+        END
+        """
+        for table in _VERSIONED_TABLES
+    ),
+)
+
+
 def ensure_aikotoba_schema():
     """Ensure aikotoba-based multi-tenancy schema exists and seed defaults.
 
     - Create aikotoba table if missing
     - Add aikotoba_id columns to users, main_categories, sub_categories, transactions
     - Seed a 'public' aikotoba and backfill NULLs
+    - Create the composite indexes in _INDEXES and refresh planner stats
+    - Create the monthly_totals rollup + triggers (backfilled on first creation)
+    - Create the data_versions table + triggers
     """
+    ensure_db_file()
     with ENGINE.begin() as conn:
         # aikotoba table
         conn.execute(text(
@@ -84,56 +319,149 @@ def ensure_aikotoba_schema():
         for table in ("users", "main_categories", "sub_categories", "transactions"):
             conn.execute(text(f"UPDATE {table} SET aikotoba_id = :did WHERE aikotoba_id IS NULL"), {"did": nitome_id})
 
+        # indexes for tenant-scoped reads
+        for name, table, columns in _INDEXES:
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+        # monthly rollup; populate from history the first time it appears
+        had_rollup = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'monthly_totals'")
+        ).scalar()
+        for name in _MONTHLY_TOTALS_TRIGGERS:
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+        for ddl in _MONTHLY_TOTALS_DDL:
+            conn.execute(text(ddl))
+        if not had_rollup:
+            conn.execute(text(_REBUILD_MONTHLY_TOTALS_SQL))
+        for ddl in _DATA_VERSIONS_DDL:
+            conn.execute(text(ddl))
+
+        # keep sqlite_stat1 fresh so the planner actually picks the indexes above
+        conn.execute(text("PRAGMA optimize"))
+
+
+def get_data_version_stamp(aikotoba_id: int | None = None) -> tuple[int, int]:
+    """(version, updated_at epoch seconds) of ``aikotoba_id``'s data; None: all tenants.
+
+    A single primary-key read; the version only ever grows.
+    """
+    if aikotoba_id is None:
+        sql, params = "SELECT COALESCE(SUM(version), 0), COALESCE(MAX(updated_at), 0) FROM data_versions", {}
+    else:
+        sql = (
+            "SELECT COALESCE(SUM(version), 0), COALESCE(MAX(updated_at), 0)"
+            " FROM data_versions WHERE aikotoba_id IN (:aid, 0)"
+        )
+        params = {"aid": aikotoba_id}
+    with READ_ENGINE.connect() as conn:
+        version, updated_at = conn.execute(text(sql), params).one()
+    return version, updated_at
+
+
+def get_data_version(aikotoba_id: int | None = None) -> int:
+    return get_data_version_stamp(aikotoba_id)[0]
+
+
+def bump_data_version(aikotoba_id: int | None = None) -> None:
+    """Invalidate readers of ``aikotoba_id`` (None: every tenant) by hand.
+
+    Row writes are covered by triggers; this is for changes they cannot see,
+    such as DDL from the developer console.
+    """
+    WRITER.run(
+        lambda conn: conn.execute(
+            text(
+                "INSERT INTO data_versions (aikotoba_id, version, updated_at)"
+                " VALUES (:aid, 1, CAST(strftime('%s', 'now') AS INTEGER))"
+                " ON CONFLICT (aikotoba_id) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at"
+            ),
+            {"aid": aikotoba_id or 0},
+        )
+    )
+
+
+def rebuild_monthly_totals() -> int:
+    """Recompute monthly_totals from scratch; return the number of rollup rows."""
+    def _rebuild(conn):
+        conn.execute(text("DELETE FROM monthly_totals"))
+        conn.execute(text(_REBUILD_MONTHLY_TOTALS_SQL))
+        return conn.execute(text("SELECT COUNT(*) FROM monthly_totals")).scalar_one()
+
+    return WRITER.run(_rebuild)
+
+
+def lookup_aikotoba_id(code: str) -> int | None:
+    """Read-only variant of get_aikotoba_id: return the ID or None, never insert."""
+    with READ_ENGINE.connect() as conn:
+        return conn.execute(text("SELECT id FROM aikotoba WHERE code = :c"), {"c": code}).scalar()
+
 
 def get_aikotoba_id(code: str) -> int:
-    """Return ID of a specific aikotoba code."""
-    with ENGINE.begin() as conn:
+    """Return ID of a specific aikotoba code (creating it if missing)."""
+    def _get_or_create(conn):
         conn.execute(text("INSERT OR IGNORE INTO aikotoba (code, label) VALUES (:c, :l)"), {"c": code, "l": code})
-        aid = conn.execute(text("SELECT id FROM aikotoba WHERE code = :c"), {"c": code}).scalar_one()
-        return aid
+        return conn.execute(text("SELECT id FROM aikotoba WHERE code = :c"), {"c": code}).scalar_one()
 
+    return WRITER.run(_get_or_create)
 
-def load_data(sub_category_id: int):
-    sql = text(
-        """
-        SELECT id, sub_category_id, date, detail, type, amount
-        FROM transactions
-        WHERE sub_category_id = :sid
-        """
-    )
-    try:
-        with ENGINE.connect() as conn:
-            df = pd.read_sql(sql, conn, params={"sid": sub_category_id})
-    except Exception:
-        return None
-    return df
 
+def _month_range(month: str) -> tuple[str, str]:
+    """Return the half-open date range ``[start, next)`` covering ``YYYY-MM``.
 
-def get_budget_and_spent_of_month(month: str, aikotoba_id: int):
-    sql = text(
-        """
-        SELECT
-            sub_categories.name as sub_category_name,
-            transactions.type as type,
-            SUM(transactions.amount) as total
-        FROM transactions
-        JOIN sub_categories ON transactions.sub_category_id = sub_categories.id
-        JOIN main_categories ON sub_categories.main_category_id = main_categories.id
-        WHERE main_categories.name = '日常'
-          AND transactions.date LIKE :month_like
-          AND transactions.aikotoba_id = :aid
-        GROUP BY sub_category_name, type
+    Raises ValueError if ``month`` is not a valid ``YYYY-MM``.
+    """
+    first = datetime.strptime(month, "%Y-%m")
+    year, mon = first.year, first.month
+    return f"{year:04d}-{mon:02d}-01", f"{year + mon // 12:04d}-{mon % 12 + 1:02d}-01"
+
+
+def get_budget_rows(month: str, aikotoba_id: int | None = None) -> list[tuple]:
+    """(sub_category_name, budget, spent) of the '日常' category for ``month``.
+
+    One conditional-aggregation pass; ``budget`` is None for sub-categories
+    without a '予算' row that month, ``spent`` is 0 when nothing was spent.
+    Without ``aikotoba_id`` every tenant's '日常' category counts. Raises
+    ValueError if ``month`` is not ``YYYY-MM``.
+    """
+    start, next_start = _month_range(month)
+    params = {"start": start, "next": next_start}
+    daily_clause = aikotoba_clause = ""
+    if aikotoba_id is not None:
+        daily_clause = "AND aikotoba_id = :aid"
+        aikotoba_clause = "AND t.aikotoba_id = :aid"
+        params["aid"] = aikotoba_id
+    q = text(
+        f"""
+        SELECT sc.name,
+               SUM(CASE WHEN t.type = '予算' THEN t.amount END) AS budget,
+               SUM(CASE WHEN t.type = '支出' THEN t.amount ELSE 0 END) AS spent
+          FROM transactions t
+          JOIN sub_categories sc ON t.sub_category_id = sc.id
+         WHERE sc.main_category_id IN (SELECT id FROM main_categories WHERE name = '日常' {daily_clause})
+           AND t.type IN ('予算', '支出')
+           AND t.date >= :start AND t.date < :next
+           {aikotoba_clause}
+         GROUP BY sc.name
+         ORDER BY sc.name
         """
     )
-    with ENGINE.connect() as conn:
-        df = pd.read_sql(sql, conn, params={"month_like": f"{month}%", "aid": aikotoba_id})
-    budget = df[df['type'] == '予算'].groupby('sub_category_name')['total'].sum()
-    spent = df[df['type'] == '支出'].groupby('sub_category_name')['total'].sum()
-    return spent, budget, df
+    with READ_ENGINE.connect() as conn:
+        return [tuple(r) for r in conn.execute(q, params)]
+
+
+def get_budget_and_spent_of_month(month: str, aikotoba_id: int | None = None):
+    """Return ``(spent, budget, rows)`` of the '日常' category for ``month``.
+
+    ``spent`` and ``budget`` map sub-category name to total amount; ``rows`` are
+    the (sub_category_name, budget, spent) tuples of get_budget_rows().
+    """
+    rows = get_budget_rows(month, aikotoba_id)
+    budget = {name: b for name, b, _ in rows if b is not None}
+    spent = {name: s for name, _, s in rows if s}
+    return spent, budget, rows
 
 
 def get_categories(engine=None, aikotoba_id: int | None = None):
-    engine = engine or ENGINE
+    engine = engine or READ_ENGINE
     where = ""
     params = {}
     if aikotoba_id is not None:
@@ -148,89 +476,35 @@ def get_categories(engine=None, aikotoba_id: int | None = None):
     return main_categories, sub_categories
 
 
-def update_data(df, changes):
-    try:
-        with ENGINE.begin() as conn:
-            if changes["edited_rows"]:
-                deltas = st.session_state.inventory_table["edited_rows"]
-                rows = [dict(df.iloc[i].to_dict(), **delta) for i, delta in deltas.items()]
-                if rows:
-                    conn.execute(
-                        text(
-                            """
-                            UPDATE transactions
-                            SET amount = :amount,
-                                date = :date,
-                                type = :type,
-                                detail = :detail
-                            WHERE id = :id
-                            """
-                        ),
-                        rows,
-                    )
-
-            if changes["added_rows"]:
-                deltas = st.session_state.inventory_table["added_rows"]
-                for delta in list(deltas):
-                    if not delta:
-                        st.error("空の行が追加されています。空の削除をお願いします。")
-                        deltas.remove(delta)
-                if deltas:
-                    rows = [dict(df.iloc[i].to_dict(), **delta) for i, delta in enumerate(deltas)]
-                    if rows:
-                        conn.execute(
-                            text(
-                                """
-                                INSERT INTO transactions (sub_category_id, amount, type, date, detail)
-                                VALUES (:sub_category_id, :amount, :type, :date, :detail)
-                                """
-                            ),
-                            rows,
-                        )
-
-            if changes["deleted_rows"]:
-                rows = [{"id": int(df.loc[i, "id"])} for i in changes["deleted_rows"]]
-                if rows:
-                    conn.execute(text("DELETE FROM transactions WHERE id = :id"), rows)
-    except Exception as e:
-        st.error(f"An error occurred: {str(e)}")
-
-
-def get_monthly_summary(aikotoba_id: int | None = None):
-    conn = connect_db()
-    sql = text(
-        """
-        SELECT strftime('%Y-%m', date) as month, type, SUM(amount) as total
-        FROM transactions
-        WHERE date >= '2023-10-01' {aikotoba_clause}
-        GROUP BY month, type
-        ORDER BY month
-        """
-    )
-    params = {}
+def get_monthly_balance(aikotoba_id: int | None = None) -> list[tuple]:
+    """(month 'YYYY-MM', income, expense, net, cumulative) per month, oldest first.
+
+    Pivots the monthly_totals rollup with conditional aggregation and computes
+    the running balance with a window function; no pandas involved.
+    """
+    engine = connect_db(readonly=True)
     aikotoba_clause = ""
+    params = {}
     if aikotoba_id is not None:
         aikotoba_clause = "AND aikotoba_id = :aid"
         params["aid"] = aikotoba_id
-    q = text(sql.text.format(aikotoba_clause=aikotoba_clause))
-    with conn.connect() as c:
-        df = pd.read_sql(q, c, params=params)
-    pivot_df = df.pivot(index='month', columns='type', values='total').fillna(0)
-    # Ensure columns exist even if df is empty
-    for col in ['収入', '支出']:
-        if col not in pivot_df.columns:
-            pivot_df[col] = 0
-    pivot_df['当月収支'] = pivot_df['収入'] - pivot_df['支出']
-    pivot_df['累計資産'] = pivot_df['当月収支'].cumsum()
-    # Altair expects fields as columns, not index. Also use a real datetime for temporal axis.
-    pivot_df = pivot_df.reset_index()
-    if not pivot_df.empty:
-        try:
-            pivot_df['month'] = pd.to_datetime(pivot_df['month'].astype(str) + '-01', format='%Y-%m-%d')
-        except Exception:
-            # Fallback: let pandas infer
-            pivot_df['month'] = pd.to_datetime(pivot_df['month'], errors='coerce')
-    return pivot_df
+    q = text(
+        f"""
+        SELECT month, income, expense, income - expense AS net,
+               SUM(income - expense) OVER (ORDER BY month) AS cumulative
+          FROM (
+                SELECT month,
+                       SUM(CASE WHEN type = '収入' THEN total ELSE 0 END) AS income,
+                       SUM(CASE WHEN type = '支出' THEN total ELSE 0 END) AS expense
+                  FROM monthly_totals
+                 WHERE month >= '2023-10' {aikotoba_clause}
+                 GROUP BY month
+               )
+         ORDER BY month
+        """
+    )
+    with engine.connect() as conn:
+        return [tuple(row) for row in conn.execute(q, params)]
 
 
 def get_transaction_by_id(transaction_id: int):
@@ -244,66 +518,105 @@ def get_transaction_by_id(transaction_id: int):
         WHERE t.id = :id
         """
     )
-    with ENGINE.connect() as conn:
+    with READ_ENGINE.connect() as conn:
         result = conn.execute(sql, {"id": transaction_id}).fetchone()
     return result
 
-def get_gifts_summary(aikotoba_id: int | None = None):
-    engine = connect_db()
-    query = text(
-        """
-    SELECT 
-        detail,
-        type,
-        SUM(amount) as total
-    FROM transactions
-    WHERE type IN ('収入', '支出') AND sub_category_id IN (
-        SELECT id FROM sub_categories WHERE name = '贈与'
-    )
-    {aikotoba_clause}
-    GROUP BY detail, type;
-    """
-    )
+def _gift_totals_sql(aikotoba_id: int | None) -> tuple[str, dict]:
+    """SELECT of (detail, received, returned) over '贈与' rows, plus its params."""
+    tenant_t = tenant_sc = ""
     params = {}
-    aikotoba_clause = ""
     if aikotoba_id is not None:
-        aikotoba_clause = "AND aikotoba_id = :aid"
+        tenant_t = "AND t.aikotoba_id = :aid"
+        tenant_sc = "AND aikotoba_id = :aid"
         params["aid"] = aikotoba_id
-    q = text(query.text.format(aikotoba_clause=aikotoba_clause))
-    with engine.connect() as conn:
-        df = pd.read_sql(q, conn, params=params)
-    return df
+    sql = f"""
+        SELECT t.detail,
+               SUM(CASE WHEN t.type = '収入' THEN t.amount END) AS received,
+               SUM(CASE WHEN t.type = '支出' THEN t.amount END) AS returned
+          FROM transactions t
+         WHERE t.type IN ('収入', '支出')
+           AND t.sub_category_id IN (SELECT id FROM sub_categories WHERE name = '贈与' {tenant_sc})
+           {tenant_t}
+         GROUP BY t.detail
+    """
+    return sql, params
 
-def get_unentered_recurring_transactions(aikotoba_id: int | None = None):
-    engine = connect_db()
-    sql = text(
-        """
-        SELECT id, sub_category_id, amount, date, detail, type
-        FROM transactions
-        WHERE sub_category_id IN (
-            SELECT id FROM sub_categories WHERE main_category_id = (
-                SELECT id FROM main_categories WHERE name = '定期'
-            )
-        )
-        {aikotoba_clause}
-        AND date = (
-            SELECT MAX(date) FROM transactions t2 WHERE t2.detail = transactions.detail
-        )
+
+def get_gift_totals(aikotoba_id: int | None = None) -> list[tuple]:
+    """(detail, received, returned) per '贈与' detail; None where no such rows exist."""
+    sql, params = _gift_totals_sql(aikotoba_id)
+    with connect_db(readonly=True).connect() as conn:
+        return [tuple(r) for r in conn.execute(text(sql + " ORDER BY t.detail"), params)]
+
+
+def get_gift_return_summary(aikotoba_id: int | None = None) -> list[dict]:
+    """Gifts received ('贈与' income) with the returns whose detail contains the gift's detail.
+
+    Rows are ready to render: detail, gift_amount, return_amount, percentage
+    (capped at 100). Matching is an instr() self-join over the per-detail
+    totals, so its cost depends on distinct details, not on transactions.
+    """
+    totals_sql, params = _gift_totals_sql(aikotoba_id)
+    q = text(
+        f"""
+        WITH totals AS ({totals_sql})
+        SELECT g.detail,
+               g.received AS gift_amount,
+               COALESCE(SUM(r.returned), 0) AS return_amount
+          FROM totals g
+          LEFT JOIN totals r ON r.returned IS NOT NULL AND instr(r.detail, g.detail) > 0
+         WHERE g.received IS NOT NULL
+         GROUP BY g.detail, g.received
+         ORDER BY g.detail
         """
     )
+    with connect_db(readonly=True).connect() as conn:
+        rows = conn.execute(q, params).fetchall()
+    return [
+        {
+            "detail": detail,
+            "gift_amount": gift_amount,
+            "return_amount": return_amount,
+            "percentage": min(return_amount * 100 / gift_amount, 100) if gift_amount > 0 else 0,
+        }
+        for detail, gift_amount, return_amount in rows
+    ]
+
+
+def get_unentered_recurring_transactions(aikotoba_id: int | None = None):
+    """Latest '定期' transaction per detail: (id, sub_category_id, amount, date, detail, type).
+
+    One GROUP BY pass over idx_transactions_aikotoba_detail_date; SQLite fills
+    the bare columns from the row holding MAX(date).
+    """
+    engine = connect_db(readonly=True)
+    tenant_t = tenant_mc = ""
     params = {}
-    aikotoba_clause = ""
     if aikotoba_id is not None:
-        aikotoba_clause = "AND aikotoba_id = :aid"
+        tenant_t = "AND t.aikotoba_id = :aid"
+        tenant_mc = "AND mc.aikotoba_id = :aid"
         params["aid"] = aikotoba_id
-    q = text(sql.text.format(aikotoba_clause=aikotoba_clause))
+    q = text(
+        f"""
+        SELECT t.id, t.sub_category_id, t.amount, MAX(t.date) AS date, t.detail, t.type
+          FROM transactions t
+         WHERE t.sub_category_id IN (
+                SELECT sc.id FROM sub_categories sc
+                  JOIN main_categories mc ON mc.id = sc.main_category_id
+                 WHERE mc.name = '定期' {tenant_mc}
+               )
+           {tenant_t}
+         GROUP BY t.detail
+        """
+    )
     with engine.connect() as conn:
         recurring_transactions = conn.execute(q, params).fetchall()
     return recurring_transactions
 
 
 def add_sub_category(main_category_id: int, name: str):
-    with ENGINE.begin() as conn:
+    def _insert(conn):
         # inherit aikotoba_id from main category
         aid = conn.execute(text("SELECT aikotoba_id FROM main_categories WHERE id = :mid"), {"mid": main_category_id}).scalar()
         conn.execute(
@@ -311,22 +624,26 @@ def add_sub_category(main_category_id: int, name: str):
             {"mid": main_category_id, "name": name, "aid": aid},
         )
 
+    WRITER.run(_insert)
+
 def rename_sub_category(sub_category_id: int, new_name: str):
-    with ENGINE.begin() as conn:
-        conn.execute(
+    WRITER.run(
+        lambda conn: conn.execute(
             text("UPDATE sub_categories SET name = :new_name WHERE id = :id"),
             {"new_name": new_name, "id": sub_category_id},
         )
+    )
 
 def delete_sub_category(sub_category_id: int):
-    with ENGINE.begin() as conn:
-        conn.execute(
+    WRITER.run(
+        lambda conn: conn.execute(
             text("DELETE FROM sub_categories WHERE id = :id"),
             {"id": sub_category_id},
         )
+    )
 
 def get_sub_category_by_id(sub_category_id: int):
     sql = text("SELECT id, main_category_id, name FROM sub_categories WHERE id = :id")
-    with ENGINE.connect() as conn:
+    with READ_ENGINE.connect() as conn:
         result = conn.execute(sql, {"id": sub_category_id}).fetchone()
     return result
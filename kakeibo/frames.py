@@ -0,0 +1,103 @@
+"""pandas/Streamlit helpers on top of kakeibo.db.
+
+Kept apart so importing kakeibo.db (the Flask path) needs only SQLAlchemy and
+the standard library; kakeibo.db still re-exports these names lazily.
+"""
+import pandas as pd
+import streamlit as st
+from sqlalchemy import text
+
+from kakeibo.db import READ_ENGINE, WRITER, get_gift_totals, get_monthly_balance
+from kakeibo.st_cache import invalidate
+
+
+def load_data(sub_category_id: int):
+    sql = text(
+        """
+        SELECT id, sub_category_id, date, detail, type, amount
+        FROM transactions
+        WHERE sub_category_id = :sid
+        """
+    )
+    try:
+        with READ_ENGINE.connect() as conn:
+            df = pd.read_sql(sql, conn, params={"sid": sub_category_id})
+    except Exception:
+        return None
+    return df
+
+
+def update_data(df, changes):
+    try:
+        # rows are gathered here (st.* needs the script thread); the writer thread only runs SQL
+        edited, added, deleted = [], [], []
+        if changes["edited_rows"]:
+            deltas = st.session_state.inventory_table["edited_rows"]
+            edited = [dict(df.iloc[i].to_dict(), **delta) for i, delta in deltas.items()]
+
+        if changes["added_rows"]:
+            deltas = st.session_state.inventory_table["added_rows"]
+            for delta in list(deltas):
+                if not delta:
+                    st.error("空の行が追加されています。空の削除をお願いします。")
+                    deltas.remove(delta)
+            added = [dict(df.iloc[i].to_dict(), **delta) for i, delta in enumerate(deltas)]
+
+        if changes["deleted_rows"]:
+            deleted = [{"id": int(df.loc[i, "id"])} for i in changes["deleted_rows"]]
+
+        def _apply(conn):
+            if edited:
+                conn.execute(
+                    text(
+                        """
+                        UPDATE transactions
+                        SET amount = :amount,
+                            date = :date,
+                            type = :type,
+                            detail = :detail
+                        WHERE id = :id
+                        """
+                    ),
+                    edited,
+                )
+            if added:
+                conn.execute(
+                    text(
+                        """
+                        INSERT INTO transactions (sub_category_id, amount, type, date, detail)
+                        VALUES (:sub_category_id, :amount, :type, :date, :detail)
+                        """
+                    ),
+                    added,
+                )
+            if deleted:
+                conn.execute(text("DELETE FROM transactions WHERE id = :id"), deleted)
+
+        if edited or added or deleted:
+            WRITER.run(_apply)
+            invalidate()
+    except Exception as e:
+        st.error(f"An error occurred: {str(e)}")
+
+
+def get_monthly_summary(aikotoba_id: int | None = None):
+    """DataFrame adapter over db.get_monthly_balance() for the Streamlit graphs.
+
+    Indexed by month (datetime) with columns 収入, 支出, 当月収支, 累計資産.
+    """
+    rows = get_monthly_balance(aikotoba_id)
+    df = pd.DataFrame(rows, columns=["month", "収入", "支出", "当月収支", "累計資産"])
+    df["month"] = pd.to_datetime(df["month"] + "-01", format="%Y-%m-%d")
+    return df.set_index("month")
+
+
+def get_gifts_summary(aikotoba_id: int | None = None):
+    """DataFrame (detail, type, total) adapter over db.get_gift_totals()."""
+    records = []
+    for detail, received, returned in get_gift_totals(aikotoba_id):
+        if received is not None:
+            records.append((detail, "収入", received))
+        if returned is not None:
+            records.append((detail, "支出", returned))
+    return pd.DataFrame(records, columns=["detail", "type", "total"])
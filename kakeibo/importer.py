@@ -0,0 +1,238 @@
+"""Bulk CSV import of transactions.
+
+The CSV is read as a stream and processed in chunks. Per chunk:
+- sub-category names are resolved to ids with one query (cached across chunks)
+- the chunk's (date, amount, detail, sub_category_id) keys are joined against
+  transactions through the (sub_category_id, date) index to skip duplicates
+- new rows are inserted with a single executemany; each chunk is one job on
+  the shared writer queue (kakeibo.writer), or one transaction on ``engine``
+
+Rows identical on that key (already in the DB or repeated in the file) are
+imported once. Memory is bounded by the chunk size, not by the file size.
+"""
+import csv
+import math
+from datetime import date, datetime
+from itertools import islice
+
+from sqlalchemy import bindparam, text
+
+from kakeibo.db import WRITER
+
+TRANSACTION_TYPES = ("支出", "収入", "予算")
+# target field -> CSV header. "sub_category" takes a name, "sub_category_id" an id.
+DEFAULT_MAPPING = {
+    "date": "date",
+    "amount": "amount",
+    "type": "type",
+    "detail": "detail",
+    "sub_category": "sub_category",
+}
+CHUNK_ROWS = 2000
+MAX_REPORTED_ERRORS = 100
+_DATE_FORMATS = ("%Y-%m-%d", "%Y/%m/%d", "%Y.%m.%d", "%Y%m%d")
+
+_IMPORT_KEYS_DDL = """
+    CREATE TEMP TABLE IF NOT EXISTS import_keys (
+        sub_category_id INTEGER, date TEXT, amount INTEGER, detail TEXT
+    )
+"""
+_INSERT_SQL = text(
+    """
+    INSERT INTO transactions (sub_category_id, amount, type, date, detail, aikotoba_id)
+    VALUES (:sub_category_id, :amount, :type, :date, :detail, :aikotoba_id)
+    """
+)
+
+
+def _parse_date(value: str) -> str:
+    value = (value or "").strip()
+    try:
+        return date.fromisoformat(value).isoformat()  # fast path for YYYY-MM-DD
+    except ValueError:
+        pass
+    for fmt in _DATE_FORMATS[1:]:
+        try:
+            return datetime.strptime(value, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    raise ValueError(f"日付を解釈できません: {value!r}")
+
+
+def _parse_amount(value: str) -> int:
+    cleaned = (value or "").strip()
+    for ch in (",", "¥", "￥", "円", " "):
+        cleaned = cleaned.replace(ch, "")
+    if not cleaned:
+        raise ValueError("金額が空です")
+    amount = float(cleaned)
+    if not math.isfinite(amount):
+        raise ValueError(f"金額が不正です: {value!r}")
+    return int(round(amount))
+
+
+def _row_key(row: dict) -> tuple:
+    return (row["date"], int(row["amount"]), row["detail"] or "", int(row["sub_category_id"]))
+
+
+def _resolve_sub_categories(conn, keys, column, aikotoba_id, cache):
+    """Fill ``cache`` (name or id -> (id, aikotoba_id)) for ``keys`` with one query.
+
+    ``column`` is "name" or "id"; keys outside the aikotoba resolve to None.
+    """
+    missing = sorted({k for k in keys if k not in cache})
+    if not missing:
+        return
+    where = f"{column} IN :keys"
+    params = {"keys": missing}
+    if aikotoba_id is not None:
+        where += " AND aikotoba_id = :aid"
+        params["aid"] = aikotoba_id
+    q = text(f"SELECT {column}, id, aikotoba_id FROM sub_categories WHERE {where} ORDER BY id").bindparams(
+        bindparam("keys", expanding=True)
+    )
+    for key, sid, aid in conn.execute(q, params):
+        # Same name under several main categories: the oldest wins
+        cache.setdefault(key, (sid, aid))
+    for key in missing:
+        cache.setdefault(key, None)
+
+
+def _existing_keys(conn, rows):
+    """Return the keys of ``rows`` that already exist in transactions.
+
+    The chunk's keys are staged in a temp table and joined through the
+    (sub_category_id, date) index, so only actual matches come back.
+    """
+    conn.execute(text(_IMPORT_KEYS_DDL))
+    conn.execute(text("DELETE FROM temp.import_keys"))
+    conn.execute(
+        text("INSERT INTO temp.import_keys VALUES (:sub_category_id, :date, :amount, :detail)"),
+        [{k: r[k] for k in ("sub_category_id", "date", "amount", "detail")} for r in rows],
+    )
+    q = text(
+        """
+        SELECT DISTINCT t.date, t.amount, t.detail, t.sub_category_id
+          FROM temp.import_keys k
+          JOIN transactions t
+            ON t.sub_category_id = k.sub_category_id AND t.date = k.date
+           AND t.amount = k.amount AND COALESCE(t.detail, '') = k.detail
+        """
+    )
+    return {(d, int(a), detail or "", int(s)) for d, a, detail, s in conn.execute(q)}
+
+
+def import_transactions_csv(
+    fileobj,
+    aikotoba_id: int | None = None,
+    mapping: dict | None = None,
+    default_type: str = "支出",
+    default_sub_category: str | None = None,
+    chunk_rows: int = CHUNK_ROWS,
+    engine=None,
+) -> dict:
+    """Import transactions from a text-mode CSV file object.
+
+    ``mapping`` maps target fields (date, amount, type, detail, sub_category or
+    sub_category_id) to CSV headers. Without a type column, negative amounts are
+    imported as '支出' and the rest as ``default_type``; amounts are stored as
+    absolute values. ``engine`` commits the chunks there directly instead of
+    through the writer queue. Returns counts plus up to MAX_REPORTED_ERRORS row errors.
+    """
+    mapping = {**DEFAULT_MAPPING, **(mapping or {})}
+    if default_type not in TRANSACTION_TYPES:
+        raise ValueError(f"default_type must be one of {TRANSACTION_TYPES}")
+    reader = csv.DictReader(fileobj)
+    headers = set(reader.fieldnames or [])
+    for field in ("date", "amount"):
+        if mapping[field] not in headers:
+            raise ValueError(f"CSV に列 {mapping[field]!r} がありません（{field}）")
+    has_type = mapping["type"] in headers
+    has_detail = mapping["detail"] in headers
+    id_column = mapping.get("sub_category_id") if mapping.get("sub_category_id") in headers else None
+    name_column = mapping["sub_category"] if mapping["sub_category"] in headers else None
+    if not (id_column or name_column or default_sub_category):
+        raise ValueError("小カテゴリの列または既定の小カテゴリを指定してください")
+
+    result = {"rows": 0, "inserted": 0, "duplicates": 0, "errors": [], "error_count": 0}
+    sub_cache: dict = {}
+    numbered = enumerate(reader, start=2)  # line 1 is the header
+
+    def _error(line_no, message):
+        result["error_count"] += 1
+        if len(result["errors"]) < MAX_REPORTED_ERRORS:
+            result["errors"].append({"line": line_no, "error": message})
+
+    def _import_chunk(conn, chunk):
+        # counts come back instead of being added to result, so a retried batch cannot double them
+        outcome = {"inserted": 0, "duplicates": 0, "errors": []}
+        if id_column:
+            keys = []
+            for _, raw in chunk:
+                try:
+                    keys.append(int(raw.get(id_column)))
+                except (TypeError, ValueError):
+                    keys.append(None)
+        else:
+            keys = [
+                ((raw.get(name_column) or "").strip() if name_column else "") or default_sub_category
+                for _, raw in chunk
+            ]
+        _resolve_sub_categories(conn, [k for k in keys if k], "id" if id_column else "name", aikotoba_id, sub_cache)
+
+        parsed = []
+        for (line_no, raw), key in zip(chunk, keys):
+            try:
+                amount = _parse_amount(raw.get(mapping["amount"]))
+                if has_type:
+                    type_ = (raw.get(mapping["type"]) or "").strip()
+                    if type_ not in TRANSACTION_TYPES:
+                        raise ValueError(f"種別が不正です: {type_!r}")
+                else:
+                    type_ = "支出" if amount < 0 else default_type
+                resolved = sub_cache.get(key)
+                if resolved is None:
+                    raise ValueError(f"小カテゴリが見つかりません: {key!r}")
+                sub_category_id, sub_aid = resolved
+                parsed.append({
+                    "date": _parse_date(raw.get(mapping["date"])),
+                    "amount": abs(amount),
+                    "type": type_,
+                    "detail": (raw.get(mapping["detail"]) or "").strip() if has_detail else "",
+                    "sub_category_id": sub_category_id,
+                    "aikotoba_id": sub_aid if sub_aid is not None else aikotoba_id,
+                })
+            except (TypeError, ValueError) as e:
+                outcome["errors"].append((line_no, str(e)))
+
+        if not parsed:
+            return outcome
+        seen = _existing_keys(conn, parsed)
+        fresh = []
+        for row in parsed:
+            key = _row_key(row)
+            if key in seen:
+                outcome["duplicates"] += 1
+                continue
+            seen.add(key)
+            fresh.append(row)
+        if fresh:
+            conn.execute(_INSERT_SQL, fresh)
+            outcome["inserted"] += len(fresh)
+        return outcome
+
+    while True:
+        chunk = list(islice(numbered, chunk_rows))
+        if not chunk:
+            break
+        result["rows"] += len(chunk)
+        if engine is not None:
+            with engine.begin() as conn:
+                outcome = _import_chunk(conn, chunk)
+        else:
+            outcome = WRITER.run(_import_chunk, chunk)
+        result["inserted"] += outcome["inserted"]
+        result["duplicates"] += outcome["duplicates"]
+        for line_no, message in outcome["errors"]:
+            _error(line_no, message)
+    return result
@@ -6,7 +6,7 @@ from typing import Dict, Optional
 import requests
 import streamlit as st
 from sqlalchemy import text
-from kakeibo.db import connect_db
+from kakeibo.db import WRITER, connect_db
 
 LINE_AUTH_URL = "https://access.line.me/oauth2/v2.1/authorize"
 LINE_TOKEN_URL = "https://api.line.me/oauth2/v2.1/token"
@@ -43,20 +43,16 @@ def _get_line_config() -> Optional[Dict[str, str]]:
 # DB: oauth_states (state一時保存)
 # ---------------------------
 def _init_state_table():
-    engine = connect_db()
-    with engine.begin() as conn:
-        conn.execute(text("""
-            CREATE TABLE IF NOT EXISTS oauth_states (
-                state TEXT PRIMARY KEY,
-                created_at TEXT NOT NULL DEFAULT (datetime('now'))
-            )
-        """))
+    WRITER.run(lambda conn: conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS oauth_states (
+            state TEXT PRIMARY KEY,
+            created_at TEXT NOT NULL DEFAULT (datetime('now'))
+        )
+    """)))
 
 
 def _save_state(state: str):
-    engine = connect_db()
-    with engine.begin() as conn:
-        conn.execute(text("INSERT INTO oauth_states (state) VALUES (:s)"), {"s": state})
+    WRITER.run(lambda conn: conn.execute(text("INSERT INTO oauth_states (state) VALUES (:s)"), {"s": state}))
 
 
 def _is_valid_state(state: str) -> bool:
@@ -72,34 +68,28 @@ def _is_valid_state(state: str) -> bool:
 
 
 def _remove_state(state: str):
-    engine = connect_db()
-    with engine.begin() as conn:
-        conn.execute(text("DELETE FROM oauth_states WHERE state = :s"), {"s": state})
+    WRITER.run(lambda conn: conn.execute(text("DELETE FROM oauth_states WHERE state = :s"), {"s": state}))
 
 
 def _cleanup_old_states():
-    engine = connect_db()
-    with engine.begin() as conn:
-        conn.execute(text(
-            "DELETE FROM oauth_states WHERE datetime(created_at) < datetime('now','-1 day')"
-        ))
+    WRITER.run(lambda conn: conn.execute(text(
+        "DELETE FROM oauth_states WHERE datetime(created_at) < datetime('now','-1 day')"
+    )))
 
 
 # ---------------------------
 # DB: users（未登録なら作成）
 # ---------------------------
 def _ensure_users_table():
-    engine = connect_db()
-    with engine.begin() as conn:
-        conn.execute(text("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT NOT NULL UNIQUE,
-                password TEXT NOT NULL,
-                role TEXT NOT NULL DEFAULT 'user',
-                created_at TEXT NOT NULL DEFAULT (datetime('now'))
-            )
-        """))
+    WRITER.run(lambda conn: conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL UNIQUE,
+            password TEXT NOT NULL,
+            role TEXT NOT NULL DEFAULT 'user',
+            created_at TEXT NOT NULL DEFAULT (datetime('now'))
+        )
+    """)))
 
 
 def _user_exists(username: str) -> bool:
@@ -111,12 +101,10 @@ def _user_exists(username: str) -> bool:
 
 def _create_user(username: str):
     # 外部IdPで認証するためダミーパスワードを格納
-    engine = connect_db()
-    with engine.begin() as conn:
-        conn.execute(
-            text("INSERT INTO users (username, password) VALUES (:u, :p)"),
-            {"u": username, "p": "external"}
-        )
+    WRITER.run(lambda conn: conn.execute(
+        text("INSERT INTO users (username, password) VALUES (:u, :p)"),
+        {"u": username, "p": "external"}
+    ))
 
 
 # ---------------------------
@@ -0,0 +1,229 @@
+"""Per-route request latency and SQL metrics in Prometheus text format.
+
+``instrument_engine`` hooks SQLAlchemy's before/after_cursor_execute (and pool
+checkouts), and ``instrument_app`` hooks Flask's request signals. Queries are
+attributed to the route in ``current_route``, a contextvar set for the
+duration of each request, so the stdlib is all this needs. ``render()``
+produces the /metrics payload. Values are per process: with several gunicorn
+workers, each scrape sees the worker that answered.
+"""
+import threading
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+# Route template ("/api/transactions/<int:transaction_id>") of the running request
+current_route: ContextVar[str] = ContextVar("kakeibo_route", default="")
+_request_stats: ContextVar[dict | None] = ContextVar("kakeibo_request_stats", default=None)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+NO_ROUTE = "(none)"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter keyed by label values."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self._lock = threading.Lock()
+        self._values: dict = {}
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Gauge(Counter):
+    """Value that can go up and down (set or inc/dec)."""
+
+    kind = "gauge"
+
+    def set(self, *labels, value: float) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def dec(self, *labels, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label values."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames, self.buckets = name, help, labelnames, buckets
+        self._lock = threading.Lock()
+        self._values: dict = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, *labels, value: float) -> None:
+        with self._lock:
+            row = self._values.setdefault(labels, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def count(self, *labels) -> int:
+        row = self._values.get(labels)
+        return row[-1] if row else 0
+
+    def total(self, *labels) -> float:
+        row = self._values.get(labels)
+        return row[-2] if row else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((labels, list(row)) for labels, row in self._values.items())
+        for labels, row in items:
+            for bound, n in zip(self.buckets, row):
+                le = 'le="%s"' % bound
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {n}"
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {row[-1]}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(row[-2])}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {row[-1]}"
+
+
+REGISTRY: list = []
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+REQUEST_SECONDS = register(Histogram(
+    "kakeibo_http_request_duration_seconds", "Request latency by route.", ("route", "method"),
+))
+REQUESTS = register(Counter(
+    "kakeibo_http_requests_total", "Requests by route and status.", ("route", "method", "status"),
+))
+QUERIES_PER_REQUEST = register(Histogram(
+    "kakeibo_sql_queries_per_request", "SQL statements issued per request.", ("route",), COUNT_BUCKETS,
+))
+QUERY_SECONDS = register(Histogram(
+    "kakeibo_sql_query_duration_seconds", "SQL statement latency by route.", ("route",), QUERY_BUCKETS,
+))
+CHECKOUTS = register(Counter(
+    "kakeibo_db_connection_checkouts_total", "Connection pool checkouts by route.", ("route",),
+))
+LOCKED_ERRORS = register(Counter(
+    "kakeibo_db_locked_errors_total", "Requests answered 503 because SQLite stayed locked.", ("route",),
+))
+# kakeibo.writer: the single-writer queue
+WRITE_QUEUE_DEPTH = register(Gauge(
+    "kakeibo_write_queue_depth", "Writes waiting for the writer thread.",
+))
+WRITE_QUEUE_SECONDS = register(Histogram(
+    "kakeibo_write_queue_wait_seconds", "Time a write waited in the queue before its batch started.", ("route",),
+))
+WRITE_LOCK_SECONDS = register(Histogram(
+    "kakeibo_write_lock_wait_seconds", "Time BEGIN IMMEDIATE waited for SQLite's write lock.", (), QUERY_BUCKETS,
+))
+WRITE_LOCK_RETRIES = register(Counter(
+    "kakeibo_write_lock_retries_total", "Write batches retried because another process held the lock.",
+))
+WRITE_BATCH_SIZE = register(Histogram(
+    "kakeibo_write_batch_size", "Writes group-committed per transaction.", (), COUNT_BUCKETS,
+))
+WRITE_FAILURES = register(Counter(
+    "kakeibo_write_failures_total",
+    "Failed writes by reason: job (the write raised), batch (the transaction failed), locked (gave up on the lock).",
+    ("reason",),
+))
+
+
+def render() -> str:
+    """All registered metrics in Prometheus text exposition format (0.0.4)."""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+def _route() -> str:
+    return current_route.get() or NO_ROUTE
+
+
+def instrument_engine(engine) -> None:
+    """Time every statement on ``engine`` and count pool checkouts, per route."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("kakeibo_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["kakeibo_query_start"].pop()
+        QUERY_SECONDS.observe(_route(), value=elapsed)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats["queries"] += 1
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        # after_cursor_execute does not fire for failed statements
+        starts = context.connection.info.get("kakeibo_query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_conn, record, proxy):
+        CHECKOUTS.inc(_route())
+
+
+def instrument_app(app) -> None:
+    """Record latency, status and query count for every request to ``app``."""
+    from flask import g, request, request_finished, request_started
+
+    def _started(sender, **extra):
+        rule = request.url_rule.rule if request.url_rule is not None else "(unmatched)"
+        g._metrics_tokens = (current_route.set(rule), _request_stats.set({"queries": 0}))
+        g._metrics_start = time.perf_counter()
+
+    def _finished(sender, response, **extra):
+        tokens = g.pop("_metrics_tokens", None)
+        if tokens is None:
+            return
+        route = current_route.get()
+        REQUEST_SECONDS.observe(route, request.method, value=time.perf_counter() - g._metrics_start)
+        REQUESTS.inc(route, request.method, str(response.status_code))
+        QUERIES_PER_REQUEST.observe(route, value=_request_stats.get()["queries"])
+        current_route.reset(tokens[0])
+        _request_stats.reset(tokens[1])
+
+    request_started.connect(_started, app, weak=False)
+    request_finished.connect(_finished, app, weak=False)
@@ -1,7 +1,8 @@
 from datetime import date
 import streamlit as st
 from sqlalchemy import text
-from kakeibo.db import connect_db
+from kakeibo.db import WRITER
+from kakeibo.st_cache import invalidate
 
 
 def render(main_category_id: int, sub_categories: list):
@@ -14,9 +15,8 @@ def render(main_category_id: int, sub_categories: list):
     expense = st.number_input("支出額", min_value=0)
 
     if st.button("データを追加"):
-        engine = connect_db()
-        with engine.begin() as conn:
-            conn.execute(
+        WRITER.run(
+            lambda conn: conn.execute(
                 text(
                     """
                     INSERT INTO transactions (sub_category_id, amount, type, date, detail)
@@ -31,4 +31,6 @@ def render(main_category_id: int, sub_categories: list):
                     "detail": detail,
                 },
             )
+        )
+        invalidate()
         st.success("データが追加されました")
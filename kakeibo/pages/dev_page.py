@@ -1,33 +1,92 @@
 import streamlit as st
 import pandas as pd
-from sqlalchemy import text
-from kakeibo.db import DB_FILENAME, connect_db
+from kakeibo import slowlog, sql_console
+from kakeibo.st_cache import invalidate
+from kakeibo.backup import CODECS, MIMETYPES, available_codecs, compressed_backup
+
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _snapshot_bytes(path: str, mtime_ns: int) -> bytes:
+    # スナップショットごとに一度だけ読み、同じ bytes を使い回す（cache_data だと再描画のたびに複製される）
+    # mtime はファイルが作り直されたとき用
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _render_backup_download():
+    # 毎回の再描画で DB 全体を読まないよう、押されたときだけスナップショットを作る
+    codec = st.selectbox("圧縮形式", available_codecs())
+    if st.button("バックアップを作成"):
+        with st.spinner("バックアップを作成しています..."):
+            st.session_state["dev_backup"] = (codec, compressed_backup(codec))
+    prepared = st.session_state.get("dev_backup")
+    if prepared is None or not prepared[1].exists():
+        return
+    codec, path = prepared
+    st.download_button(
+        label=f"DBファイルのダウンロード（{path.stat().st_size / 1024 / 1024:.1f} MB）",
+        data=_snapshot_bytes(str(path), path.stat().st_mtime_ns),
+        file_name="kakeibo_backup" + CODECS[codec],
+        mime=MIMETYPES[codec],
+    )
+
+
+def _render_slow_queries():
+    if slowlog.threshold_ms is None:
+        return
+    with st.expander(f"スロークエリ（{slowlog.threshold_ms:g} ms 以上）"):
+        rows = slowlog.aggregate()
+        if not rows:
+            st.caption("まだ記録されていません")
+            return
+        st.dataframe(pd.DataFrame(rows)[["count", "total_ms", "avg_ms", "max_ms", "callers", "fingerprint", "params"]])
 
 
 def render():
-    with open(DB_FILENAME, "rb") as file:
-        st.download_button(
-            label="DBファイルのダウンロード",
-            data=file,
-            file_name="kakeibo_backup.db",
-            mime="application/octet-stream",
-        )
+    _render_backup_download()
+    _render_slow_queries()
 
     with st.form("SQLクエリ"):
-        query = st.text_area("SQLクエリ", "SELECT * FROM transactions")
+        query = st.text_area("SQLクエリ", "SELECT * FROM transactions ORDER BY id DESC")
+        row_limit = st.number_input("1 ページの行数", 1, sql_console.MAX_ROW_LIMIT, sql_console.DEFAULT_ROW_LIMIT)
+        confirmed = st.checkbox("INSERT/UPDATE/DELETE 等を本当に実行する")
         if st.form_submit_button("実行"):
-            engine = connect_db()
-            try:
-                if query.strip().upper().startswith("SELECT"):
-                    with engine.connect() as conn:
-                        df = pd.read_sql(text(query), conn)
-                        st.write(df)
-                elif any(query.strip().upper().startswith(x) for x in ("INSERT", "UPDATE", "DELETE")):
-                    if st.button("本当に実行しますか？"):
-                        with engine.begin() as conn:
-                            conn.execute(text(query))
-                        st.success("クエリを実行しました")
-                else:
-                    st.warning("SELECT/INSERT/UPDATE/DELETE のいずれかを実行してください")
-            except Exception as e:
-                st.error(f"Error: {e}")
+            st.session_state["dev_sql"] = {"query": query, "row_limit": int(row_limit), "page": 1}
+            if not sql_console.is_read(query):
+                if not confirmed:
+                    st.warning("書き込み系のクエリはチェックを入れてから実行してください")
+                    return
+                try:
+                    result = sql_console.run_write(query)
+                except Exception as e:
+                    st.error(f"Error: {e}")
+                    return
+                invalidate()
+                st.success(f"クエリを実行しました（{result['rowcount']} 行、{result['elapsed_ms']} ms）")
+                st.session_state.pop("dev_sql")
+                return
+
+    # 読み取りクエリはページ送りのたびにそのページだけ取り直す
+    current = st.session_state.get("dev_sql")
+    if not current:
+        return
+    try:
+        result = sql_console.run_read(current["query"], page=current["page"], row_limit=current["row_limit"])
+    except Exception as e:
+        st.error(f"Error: {e}")
+        return
+    st.caption(
+        f"{result['page']} ページ目 / {len(result['rows'])} 行 / {result['elapsed_ms']} ms / "
+        f"約 {result['vm_steps']:,} VM ステップ"
+    )
+    st.dataframe(pd.DataFrame(result["rows"], columns=result["columns"]))
+    prev_col, next_col = st.columns(2)
+    if result["page"] > 1 and prev_col.button("前へ"):
+        current["page"] -= 1
+        st.rerun()
+    if result["has_more"] and next_col.button("次へ"):
+        current["page"] += 1
+        st.rerun()
+    if result["plan"]:
+        with st.expander("EXPLAIN QUERY PLAN"):
+            st.code("\n".join(result["plan"]))
@@ -1,6 +1,7 @@
 from datetime import datetime
 import streamlit as st
-from kakeibo.db import load_data, update_data
+from kakeibo.frames import update_data
+from kakeibo.st_cache import load_data
 
 
 def render(main_category_id: int, sub_categories: list):
@@ -1,7 +1,7 @@
 import streamlit as st
 import pandas as pd
 import altair as alt
-from kakeibo.db import get_monthly_summary
+from kakeibo.st_cache import get_monthly_summary
 
 
 def _to_pandas(df):
@@ -0,0 +1,70 @@
+import csv
+import io
+
+import streamlit as st
+
+from kakeibo.importer import DEFAULT_MAPPING, TRANSACTION_TYPES, import_transactions_csv
+from kakeibo.st_cache import invalidate
+
+_NONE = "（なし）"
+_FIELD_LABELS = {
+    "date": "日付",
+    "amount": "金額",
+    "type": "種別",
+    "detail": "詳細",
+    "sub_category": "小カテゴリ名",
+}
+
+
+def render(main_category_id: int, sub_categories: list):
+    st.subheader("CSV インポート")
+    uploaded = st.file_uploader("CSV ファイル", type=["csv", "txt"])
+    encoding = st.selectbox("文字コード", ["utf-8-sig", "cp932"])
+    if uploaded is None:
+        return
+
+    # 見出し行だけ読んで列の対応付けを作る
+    uploaded.seek(0)
+    wrapper = io.TextIOWrapper(uploaded, encoding=encoding, newline="")
+    try:
+        headers = next(csv.reader(wrapper), [])
+    except UnicodeDecodeError:
+        st.error("文字コードが合っていません")
+        return
+    finally:
+        wrapper.detach()  # GC 時に uploaded ごと閉じられないように
+    choices = [_NONE] + headers
+
+    mapping = {}
+    for field, label in _FIELD_LABELS.items():
+        default = DEFAULT_MAPPING[field]
+        column = st.selectbox(f"{label}の列", choices, index=choices.index(default) if default in headers else 0)
+        mapping[field] = "" if column == _NONE else column
+
+    default_type = st.selectbox("種別列がない場合の種別", list(TRANSACTION_TYPES))
+    sub_names = [sub[2] for sub in sub_categories if sub[1] == main_category_id]
+    default_sub = st.selectbox("小カテゴリ列がない場合の小カテゴリ", [_NONE] + sub_names)
+
+    if st.button("インポート実行"):
+        uploaded.seek(0)
+        wrapper = io.TextIOWrapper(uploaded, encoding=encoding, newline="")
+        try:
+            result = import_transactions_csv(
+                wrapper,
+                mapping=mapping,
+                default_type=default_type,
+                default_sub_category=None if default_sub == _NONE else default_sub,
+            )
+        except (ValueError, UnicodeDecodeError) as e:
+            st.error(f"インポートできませんでした: {e}")
+            return
+        finally:
+            wrapper.detach()
+        if result["inserted"]:
+            invalidate()
+        st.success(
+            f"{result['rows']} 行中 {result['inserted']} 件を追加しました（重複 {result['duplicates']} 件、"
+            f"エラー {result['error_count']} 件）"
+        )
+        if result["errors"]:
+            st.dataframe(result["errors"])
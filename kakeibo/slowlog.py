@@ -0,0 +1,179 @@
+"""Opt-in slow-query log for the SQLAlchemy engines in kakeibo.db.
+
+Enabled with KAKEIBO_SLOW_QUERY_MS=<threshold>. Statements at or over the
+threshold are recorded with:
+- a normalized fingerprint: literals and bind markers become ``?``, IN lists
+  and multi-row VALUES collapse, whitespace is squeezed, so the f-string
+  assembled queries (``WHERE 1=1 AND ...``) group by shape
+- the bound-parameter shape (types only, never values)
+- the duration, the calling function in this repo and the Flask route
+
+Entries go to an in-process ring buffer (KAKEIBO_SLOW_QUERY_BUFFER, default
+500), which ``aggregate()`` groups by fingerprint for /dev. They also go to a
+rotating JSON-lines file when KAKEIBO_SLOW_QUERY_LOG names a path.
+"""
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+from sqlalchemy import event
+
+from kakeibo.metrics import current_route
+
+_threshold = os.environ.get("KAKEIBO_SLOW_QUERY_MS")
+threshold_ms: float | None = float(_threshold) if _threshold else None
+BUFFER = deque(maxlen=int(os.environ.get("KAKEIBO_SLOW_QUERY_BUFFER", 500)))
+LOG_PATH = os.environ.get("KAKEIBO_SLOW_QUERY_LOG")
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 3
+
+_REPO_ROOT = str(Path(__file__).resolve().parent.parent)
+_SKIP_MODULES = ("kakeibo.slowlog", "kakeibo.metrics")
+_APP_MODULES = ("flask_app", "app")
+# the image's venv (/app/.venv) sits inside the repo root; its frames are library code
+_LIBRARY_DIRS = ("site-packages", "dist-packages", ".venv")
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_NAMED_BIND_RE = re.compile(r"(?<![:\w]):\w+")
+_IN_LIST_RE = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.I)
+_VALUES_ROW = r"\(\s*\?(?:\s*,\s*\?)*\s*\)"
+_VALUES_RE = re.compile(rf"({_VALUES_ROW})(?:\s*,\s*{_VALUES_ROW})+")
+_SPACE_RE = re.compile(r"\s+")
+_file_logger = None
+_file_logger_lock = threading.Lock()
+
+
+def fingerprint(statement: str) -> str:
+    """Normalize ``statement`` so queries that differ only in values compare equal."""
+    sql = _STRING_RE.sub("?", statement)
+    sql = _NAMED_BIND_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _IN_LIST_RE.sub("IN (?...)", sql)
+    sql = _VALUES_RE.sub(r"\1, ...", sql)
+    return _SPACE_RE.sub(" ", sql).strip()
+
+
+def fingerprint_id(fp: str) -> str:
+    return hashlib.sha1(fp.encode("utf-8")).hexdigest()[:12]
+
+
+def _type_name(value) -> str:
+    return "null" if value is None else type(value).__name__
+
+
+def param_shape(parameters, executemany: bool = False) -> str:
+    """Types of the bound parameters, e.g. ``(int, str)`` or ``500 x (int, str)``."""
+    if executemany:
+        rows = list(parameters or ())
+        return f"{len(rows)} x {param_shape(rows[0]) if rows else '()'}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{k}: {_type_name(v)}" for k, v in parameters.items()) + "}"
+    return "(" + ", ".join(_type_name(v) for v in parameters or ()) + ")"
+
+
+def _is_app_frame(filename: str, module: str) -> bool:
+    if module in _SKIP_MODULES:
+        return False
+    if module.startswith("kakeibo.") or module in _APP_MODULES:
+        return True
+    # scripts/ and tests run as __main__ or by path; accept them unless they are library code
+    return filename.startswith(_REPO_ROOT) and not any(part in _LIBRARY_DIRS for part in Path(filename).parts)
+
+
+def _caller() -> str:
+    """Innermost function in this repo (outside the logging code) on the stack."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if _is_app_frame(frame.f_code.co_filename, module):
+            return f"{module}.{frame.f_code.co_qualname}"
+        frame = frame.f_back
+    return "?"
+
+
+def _write_file(entry: dict) -> None:
+    global _file_logger
+    if _file_logger is None:
+        with _file_logger_lock:
+            if _file_logger is None:
+                import logging
+                from logging.handlers import RotatingFileHandler
+
+                logger = logging.getLogger("kakeibo.slowlog")
+                logger.propagate = False
+                logger.setLevel(logging.INFO)
+                logger.addHandler(RotatingFileHandler(LOG_PATH, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS))
+                _file_logger = logger
+    _file_logger.info(json.dumps(entry, ensure_ascii=False))
+
+
+def record(statement: str, parameters, executemany: bool, duration_ms: float) -> dict:
+    fp = fingerprint(statement)
+    entry = {
+        "at": time.time(),
+        "fingerprint": fp,
+        "id": fingerprint_id(fp),
+        "params": param_shape(parameters, executemany),
+        "duration_ms": round(duration_ms, 2),
+        "caller": _caller(),
+        "route": current_route.get() or None,
+    }
+    BUFFER.append(entry)
+    if LOG_PATH:
+        _write_file(entry)
+    return entry
+
+
+def aggregate() -> list[dict]:
+    """Buffered entries grouped by fingerprint, slowest total first."""
+    groups: dict = {}
+    for e in list(BUFFER):
+        g = groups.setdefault(e["id"], {
+            "id": e["id"], "fingerprint": e["fingerprint"], "count": 0, "total_ms": 0.0, "max_ms": 0.0,
+            "callers": set(), "routes": set(), "params": set(),
+        })
+        g["count"] += 1
+        g["total_ms"] += e["duration_ms"]
+        g["max_ms"] = max(g["max_ms"], e["duration_ms"])
+        g["callers"].add(e["caller"])
+        g["params"].add(e["params"])
+        if e["route"]:
+            g["routes"].add(e["route"])
+    rows = []
+    for g in groups.values():
+        g["avg_ms"] = round(g["total_ms"] / g["count"], 2)
+        g["total_ms"] = round(g["total_ms"], 2)
+        for key in ("callers", "routes", "params"):
+            g[key] = sorted(g[key])
+        rows.append(g)
+    return sorted(rows, key=lambda g: g["total_ms"], reverse=True)
+
+
+def instrument_engine(engine) -> None:
+    """Time statements on ``engine``; a no-op per statement while disabled."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if threshold_ms is not None:
+            conn.info.setdefault("kakeibo_slowlog_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("kakeibo_slowlog_start")
+        if not starts:
+            return
+        duration_ms = (time.perf_counter() - starts.pop()) * 1000
+        if threshold_ms is not None and duration_ms >= threshold_ms:
+            record(statement, parameters, executemany, duration_ms)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        starts = context.connection.info.get("kakeibo_slowlog_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
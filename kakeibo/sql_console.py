@@ -0,0 +1,199 @@
+"""Bounded SQL execution for the developer consoles (/dev and the Streamlit page).
+
+- reads run on the read-only engine (``PRAGMA query_only``), one page at a time:
+  SELECT/WITH/VALUES are wrapped in ``LIMIT/OFFSET`` so SQLite stops early, and
+  other statements (PRAGMA, EXPLAIN) are streamed with fetchmany
+- every statement runs under a wall-clock deadline that sqlite3's progress
+  handler enforces. The handler fires every PROGRESS_STEPS VM instructions, and
+  its call count doubles as an approximate "rows scanned" figure. Python's sqlite3
+  does not expose sqlite3_stmt_status, so this is VM steps rather than
+  SQLITE_STMTSTATUS_FULLSCAN_STEP.
+- results carry the elapsed time, that step count and ``EXPLAIN QUERY PLAN``
+"""
+import os
+import re
+import time
+
+from sqlalchemy import text
+
+from kakeibo.db import WRITER, bump_data_version, connect_db
+
+DEFAULT_ROW_LIMIT = int(os.environ.get("KAKEIBO_SQL_ROW_LIMIT", 200))
+MAX_ROW_LIMIT = 5000
+DEFAULT_TIMEOUT_MS = int(os.environ.get("KAKEIBO_SQL_TIMEOUT_MS", 3000))
+PROGRESS_STEPS = 1000
+
+READ_KEYWORDS = ("SELECT", "WITH", "VALUES", "EXPLAIN", "PRAGMA")
+WRITE_KEYWORDS = ("INSERT", "UPDATE", "DELETE", "REPLACE", "CREATE", "DROP", "ALTER")
+_PAGEABLE = ("SELECT", "WITH", "VALUES")
+# writes run inside the writer queue's shared transaction (kakeibo.writer)
+_TRANSACTION_CONTROL = ("BEGIN", "COMMIT", "END", "ROLLBACK", "SAVEPOINT", "RELEASE", "VACUUM", "ATTACH", "DETACH")
+_LEADING_COMMENTS_RE = re.compile(r"^\s*(?:(?:--[^\n]*(?:\n|$))|(?:/\*.*?\*/)|\s+)*", re.S)
+# statements a WITH clause can lead into
+_MAIN_VERBS = ("SELECT", "VALUES", "INSERT", "UPDATE", "DELETE", "REPLACE")
+# comments, quoted strings/identifiers, words and parentheses; anything else is skipped
+_TOKEN_RE = re.compile(
+    r"""--[^\n]*|/\*.*?(?:\*/|$)|'(?:[^']|'')*'|"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\]|[A-Za-z_]\w*|[()]""",
+    re.S,
+)
+
+
+class QueryTimeout(Exception):
+    """The statement was interrupted after exceeding its time budget."""
+
+
+def statement_keyword(sql: str) -> str:
+    """First keyword of ``sql`` in upper case, ignoring leading comments."""
+    body = _LEADING_COMMENTS_RE.sub("", sql, count=1)
+    match = re.match(r"[A-Za-z]+", body)
+    return match.group(0).upper() if match else ""
+
+
+def statement_verb(sql: str) -> str:
+    """Like statement_keyword, but a WITH clause yields the statement it leads into.
+
+    ``WITH t AS (...) DELETE FROM ...`` is a DELETE: the verb is the first of
+    _MAIN_VERBS outside the CTE bodies' parentheses.
+    """
+    keyword = statement_keyword(sql)
+    if keyword != "WITH":
+        return keyword
+    depth = 0
+    for token in _TOKEN_RE.findall(sql):
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif depth == 0 and token.upper() in _MAIN_VERBS:
+            return token.upper()
+    return keyword
+
+
+def is_read(sql: str) -> bool:
+    """Whether ``sql`` belongs on run_read (anything else goes to run_write)."""
+    return statement_verb(sql) in READ_KEYWORDS
+
+
+def clamp_row_limit(value) -> int:
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_ROW_LIMIT
+    return max(1, min(limit, MAX_ROW_LIMIT))
+
+
+class _Deadline:
+    """sqlite3 progress handler: counts VM steps and aborts past the deadline."""
+
+    def __init__(self, timeout_ms: int):
+        self.started = time.perf_counter()
+        self.deadline = self.started + timeout_ms / 1000
+        self.calls = 0
+
+    def __call__(self) -> int:
+        self.calls += 1
+        return 1 if time.perf_counter() > self.deadline else 0
+
+    @property
+    def elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self.started) * 1000, 1)
+
+    @property
+    def vm_steps(self) -> int:
+        return self.calls * PROGRESS_STEPS
+
+
+def _run_bounded(conn, timeout_ms: int, fn):
+    """Run ``fn(dbapi_connection)`` under a progress-handler deadline."""
+    dbapi_conn = conn.connection.driver_connection
+    guard = _Deadline(timeout_ms)
+    dbapi_conn.set_progress_handler(guard, PROGRESS_STEPS)
+    try:
+        return fn(dbapi_conn), guard
+    except Exception as e:
+        if "interrupted" in str(e):
+            raise QueryTimeout(f"{timeout_ms} ms を超えたため中断しました") from e
+        raise
+    finally:
+        dbapi_conn.set_progress_handler(None, 0)
+
+
+def _query_plan(dbapi_conn, sql: str) -> list[str]:
+    """``EXPLAIN QUERY PLAN`` rows rendered as an indented tree."""
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in dbapi_conn.execute(f"EXPLAIN QUERY PLAN {sql}"):
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return lines
+
+
+def run_read(sql: str, page: int = 1, row_limit: int = DEFAULT_ROW_LIMIT, timeout_ms: int = DEFAULT_TIMEOUT_MS) -> dict:
+    """Run a read statement and return one page of its result.
+
+    Returns ``{columns, rows, page, row_limit, has_more, elapsed_ms, vm_steps, plan}``.
+    Raises QueryTimeout past ``timeout_ms`` and sqlite3 errors as they come.
+    """
+    sql = sql.strip().rstrip(";")
+    page = max(1, int(page))
+    row_limit = clamp_row_limit(row_limit)
+    offset = (page - 1) * row_limit
+    pageable = statement_verb(sql) in _PAGEABLE
+
+    def _fetch(dbapi_conn):
+        if pageable:
+            # newline so a trailing "-- comment" cannot swallow the parenthesis
+            cur = dbapi_conn.execute(f"SELECT * FROM (\n{sql}\n) LIMIT ? OFFSET ?", (row_limit + 1, offset))
+            rows = cur.fetchall()
+        else:
+            cur = dbapi_conn.execute(sql)
+            skip = offset
+            while skip > 0:
+                skipped = cur.fetchmany(min(skip, 1000))
+                if not skipped:
+                    break
+                skip -= len(skipped)
+            rows = cur.fetchmany(row_limit + 1)
+        columns = [d[0] for d in cur.description or ()]
+        cur.close()
+        return columns, rows
+
+    engine = connect_db(readonly=True)
+    with engine.connect() as conn:
+        (columns, rows), guard = _run_bounded(conn, timeout_ms, _fetch)
+        plan = _query_plan(conn.connection.driver_connection, sql) if pageable else []
+    return {
+        "columns": columns,
+        "rows": [tuple(r) for r in rows[:row_limit]],
+        "page": page,
+        "row_limit": row_limit,
+        "has_more": len(rows) > row_limit,
+        "elapsed_ms": guard.elapsed_ms,
+        "vm_steps": guard.vm_steps,
+        "plan": plan,
+    }
+
+
+def run_write(sql: str, timeout_ms: int = DEFAULT_TIMEOUT_MS) -> dict:
+    """Run a DML/DDL statement as one job on the writer queue.
+
+    Returns ``{rowcount, elapsed_ms, vm_steps}``; a timeout rolls the statement back.
+    Transaction control (BEGIN, COMMIT, VACUUM, ...) is refused with ValueError.
+    """
+    sql = sql.strip().rstrip(";")
+    keyword = statement_keyword(sql)
+    if keyword in _TRANSACTION_CONTROL:
+        raise ValueError(f"{keyword} は開発者コンソールから実行できません")
+
+    def _write(conn):
+        result, guard = _run_bounded(conn, timeout_ms, lambda _: conn.execute(text(sql)))
+        rowcount = result.rowcount
+        if rowcount < 0 and statement_verb(sql) in WRITE_KEYWORDS:
+            # sqlite3 only counts statements that start with the verb, not WITH ... DELETE
+            rowcount = conn.execute(text("SELECT changes()")).scalar()
+        # Triggers see row writes, not DDL; arbitrary SQL may touch any tenant
+        bump_data_version()
+        return rowcount, guard
+
+    rowcount, guard = WRITER.run(_write)
+    return {"rowcount": rowcount, "elapsed_ms": guard.elapsed_ms, "vm_steps": guard.vm_steps}
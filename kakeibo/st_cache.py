@@ -0,0 +1,116 @@
+"""st.cache_data wrappers over the kakeibo.db readers for the Streamlit app.
+
+app.py reruns top to bottom on every widget interaction. The readers here are
+cached by Streamlit under (arguments, tenant, data version), so a rerun where
+nothing changed does not query SQLite:
+- the data version (kakeibo.db.get_data_version) is itself kept for
+  VERSION_TTL_SECONDS. Reruns inside that window cost no query at all, and
+  writes from other processes (the Flask app) show up within that time.
+- write paths call ``invalidate()`` once the write has committed. The
+  Streamlit app is not tenant-scoped (it reads the all-tenants view and its
+  inserts carry no aikotoba_id), so its pages call it without an argument. That
+  drops every remembered version, and the next rerun reads the versions the
+  triggers bumped. ``invalidate(aikotoba_id)`` forgets only that tenant (and
+  the all-tenants view), for callers that write one tenant's data.
+Entries for old versions are never looked up again and age out via
+``max_entries``.
+"""
+import os
+import threading
+import time
+
+import streamlit as st
+
+from kakeibo import db
+
+VERSION_TTL_SECONDS = float(os.environ.get("KAKEIBO_ST_VERSION_TTL", 5))
+MAX_ENTRIES = 64
+
+_versions: dict = {}  # aikotoba_id -> (version, read at)
+_versions_lock = threading.Lock()
+
+
+def data_version(aikotoba_id: int | None = None) -> int:
+    """``db.get_data_version(aikotoba_id)``, re-read at most every VERSION_TTL_SECONDS."""
+    now = time.monotonic()
+    with _versions_lock:
+        cached = _versions.get(aikotoba_id)
+    if cached is not None and now - cached[1] < VERSION_TTL_SECONDS:
+        return cached[0]
+    version = db.get_data_version(aikotoba_id)
+    with _versions_lock:
+        _versions[aikotoba_id] = (version, now)
+    return version
+
+
+def invalidate(aikotoba_id: int | None = None) -> None:
+    """Forget the data version of ``aikotoba_id`` after writing to its data.
+
+    The all-tenants version sums every tenant, so it goes too. ``None`` means
+    the write was tenant-less (it counts for every tenant) and forgets them all.
+    """
+    with _versions_lock:
+        if aikotoba_id is None:
+            _versions.clear()
+        else:
+            _versions.pop(aikotoba_id, None)
+            _versions.pop(None, None)
+
+
+@st.cache_data(max_entries=MAX_ENTRIES, show_spinner=False)
+def _categories(aikotoba_id, version):
+    return db.get_categories(aikotoba_id=aikotoba_id)
+
+
+@st.cache_data(max_entries=MAX_ENTRIES, show_spinner=False)
+def _budget_and_spent(month, aikotoba_id, version):
+    return db.get_budget_and_spent_of_month(month, aikotoba_id)
+
+
+@st.cache_data(max_entries=MAX_ENTRIES, show_spinner=False)
+def _gift_return_summary(aikotoba_id, version):
+    return db.get_gift_return_summary(aikotoba_id)
+
+
+@st.cache_data(max_entries=MAX_ENTRIES, show_spinner=False)
+def _unentered_recurring(aikotoba_id, version):
+    return [tuple(r) for r in db.get_unentered_recurring_transactions(aikotoba_id)]
+
+
+@st.cache_data(max_entries=MAX_ENTRIES, show_spinner=False)
+def _monthly_summary(aikotoba_id, version):
+    from kakeibo import frames
+
+    return frames.get_monthly_summary(aikotoba_id)
+
+
+@st.cache_data(max_entries=MAX_ENTRIES, show_spinner=False)
+def _sub_category_rows(sub_category_id, aikotoba_id, version):
+    from kakeibo import frames
+
+    return frames.load_data(sub_category_id)
+
+
+def get_categories(aikotoba_id: int | None = None):
+    return _categories(aikotoba_id, data_version(aikotoba_id))
+
+
+def get_budget_and_spent_of_month(month: str, aikotoba_id: int | None = None):
+    return _budget_and_spent(month, aikotoba_id, data_version(aikotoba_id))
+
+
+def get_gift_return_summary(aikotoba_id: int | None = None) -> list[dict]:
+    return _gift_return_summary(aikotoba_id, data_version(aikotoba_id))
+
+
+def get_unentered_recurring_transactions(aikotoba_id: int | None = None) -> list[tuple]:
+    return _unentered_recurring(aikotoba_id, data_version(aikotoba_id))
+
+
+def get_monthly_summary(aikotoba_id: int | None = None):
+    return _monthly_summary(aikotoba_id, data_version(aikotoba_id))
+
+
+def load_data(sub_category_id: int, aikotoba_id: int | None = None):
+    """Cached ``frames.load_data``; ``aikotoba_id`` only selects the version to key on."""
+    return _sub_category_rows(sub_category_id, aikotoba_id, data_version(aikotoba_id))
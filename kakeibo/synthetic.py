@@ -0,0 +1,210 @@
+"""Deterministic synthetic household-ledger data for benchmarks.
+
+``generate()`` writes a fresh SQLite file with the tenant-aware schema and
+fills it with the stdlib sqlite3 module. Indexes, the monthly rollup and the
+data-version triggers are left to ``kakeibo.db.ensure_aikotoba_schema()``, so
+the bulk insert runs without triggers and the rollup is backfilled once.
+
+Every tenant gets the categories the app's features key on: 日常 for budget
+progress, 定期 for the unentered-recurring panel, 交際/贈与 for gifts, and 収入.
+Each month holds:
+- 予算 rows for every 日常 category, plus 給与 (and 賞与 in June/December) as 収入
+- one 定期 支出 per recurring category, with about 5% skipped so some are unentered
+- 贈与 gifts received, about 60% answered with an "お返し" 支出 in the same month
+- everyday 支出 for the rest of that month's share of the total
+
+The same arguments always produce the same rows.
+"""
+import random
+import sqlite3
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE aikotoba (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    code TEXT NOT NULL UNIQUE,
+    label TEXT,
+    active INTEGER NOT NULL DEFAULT 1,
+    created_at TEXT NOT NULL DEFAULT (datetime('now'))
+);
+CREATE TABLE users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL UNIQUE,
+    password TEXT NOT NULL,
+    role TEXT NOT NULL DEFAULT 'user',
+    created_at TEXT NOT NULL DEFAULT (datetime('now')),
+    aikotoba_id INTEGER
+);
+CREATE TABLE main_categories (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, aikotoba_id INTEGER);
+CREATE TABLE sub_categories (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, main_category_id INTEGER NOT NULL, name TEXT NOT NULL, aikotoba_id INTEGER
+);
+CREATE TABLE transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sub_category_id INTEGER NOT NULL,
+    amount INTEGER NOT NULL,
+    type TEXT CHECK(type IN ('支出','収入','予算')) NOT NULL,
+    date TEXT NOT NULL,
+    detail TEXT,
+    aikotoba_id INTEGER
+);
+CREATE TABLE backup_time (id INTEGER PRIMARY KEY AUTOINCREMENT, time TEXT NOT NULL);
+"""
+
+# main category -> sub category -> (typical amount, detail pool)
+CATEGORIES = {
+    "日常": {
+        "食費": (1800, ["スーパー", "コンビニ", "ランチ", "パン屋", "八百屋"]),
+        "日用品": (1200, ["ドラッグストア", "100円ショップ", "ホームセンター"]),
+        "交通費": (900, ["電車", "バス", "タクシー", "ガソリン"]),
+        "娯楽": (3000, ["映画", "書籍", "ゲーム", "カラオケ"]),
+        "医療": (2500, ["内科", "歯科", "薬局"]),
+        "衣服": (5000, ["ユニクロ", "靴", "クリーニング"]),
+    },
+    "定期": {
+        "家賃": (85000, None),
+        "電気": (7000, None),
+        "ガス": (4500, None),
+        "水道": (3500, None),
+        "通信": (6000, None),
+        "サブスク": (1500, None),
+    },
+    "交際": {
+        "贈与": (10000, None),
+        "会食": (4500, ["飲み会", "誕生日会", "送別会"]),
+    },
+    "収入": {
+        "給与": (280000, None),
+        "賞与": (500000, None),
+    },
+}
+EVERYDAY = [("日常", sub) for sub in CATEGORIES["日常"]] + [("交際", "会食")]
+GIFT_PEOPLE = ["田中", "佐藤", "鈴木", "高橋", "伊藤", "渡辺", "山本", "中村", "小林", "加藤"]
+GIFT_OCCASIONS = ["出産祝い", "結婚祝い", "入学祝い", "お中元", "お歳暮", "香典"]
+INSERT_CHUNK = 50_000
+
+
+def _months(end_month: str, count: int) -> list[str]:
+    year, month = map(int, end_month.split("-"))
+    out = []
+    for _ in range(count):
+        out.append(f"{year:04d}-{month:02d}")
+        month -= 1
+        if month == 0:
+            year, month = year - 1, 12
+    return out[::-1]
+
+
+def _amount(rnd: random.Random, typical: int) -> int:
+    # right-skewed like real receipts, rounded to 10 yen
+    return max(10, int(rnd.lognormvariate(0, 0.5) * typical) // 10 * 10)
+
+
+def _split(total: int, parts: int) -> list[int]:
+    base, extra = divmod(total, parts)
+    return [base + (1 if i < extra else 0) for i in range(parts)]
+
+
+def _month_rows(
+    rnd: random.Random, month: str, subs: dict, categories: dict, everyday: list, salary: int, quota: int
+) -> list[tuple]:
+    """Rows ``(sub_category_id, amount, type, date, detail)`` for one tenant-month."""
+    mm = int(month[5:])
+    rows = [(subs[("収入", "給与")], salary, "収入", f"{month}-25", "給与")]
+    if mm in (6, 12):
+        rows.append((subs[("収入", "賞与")], salary * 2, "収入", f"{month}-10", "賞与"))
+    for sub, (typical, _) in categories["日常"].items():
+        rows.append((subs[("日常", sub)], typical * 25 // 1000 * 1000, "予算", f"{month}-01", f"{sub}予算"))
+    for day, (sub, (typical, _)) in enumerate(categories["定期"].items(), start=3):
+        if rnd.random() >= 0.05:
+            rows.append((subs[("定期", sub)], typical, "支出", f"{month}-{day:02d}", sub))
+    if rnd.random() < 0.3:
+        detail = f"{rnd.choice(GIFT_PEOPLE)}さん {rnd.choice(GIFT_OCCASIONS)}"
+        gift = rnd.choice((5000, 10000, 20000, 30000, 50000))
+        rows.append((subs[("交際", "贈与")], gift, "収入", f"{month}-{rnd.randint(1, 14):02d}", detail))
+        if rnd.random() < 0.6:
+            rows.append((subs[("交際", "贈与")], gift // 2, "支出", f"{month}-{rnd.randint(15, 28):02d}", f"{detail} お返し"))
+
+    if len(rows) > quota:
+        rows = rnd.sample(rows, quota)
+    for _ in range(quota - len(rows)):
+        main, sub = rnd.choice(everyday)
+        typical, details = categories[main][sub]
+        rows.append((subs[(main, sub)], _amount(rnd, typical), "支出", f"{month}-{rnd.randint(1, 28):02d}", rnd.choice(details)))
+    rows.sort(key=lambda r: r[3])
+    return rows
+
+
+def generate(
+    path,
+    tenants: int = 3,
+    transactions: int = 10_000,
+    months: int = 36,
+    end_month: str = "2024-12",
+    extra_categories: int = 0,
+    seed: int = 0,
+) -> dict:
+    """Create ``path`` (must not exist) with ``transactions`` rows spread over ``tenants``.
+
+    ``extra_categories`` adds that many more 日常 sub categories per tenant, used
+    by the everyday rows like the built-in ones. Returns the tenants'
+    ``{code, aikotoba_id, username}`` plus the row count.
+    """
+    path = Path(path)
+    if path.exists():
+        raise FileExistsError(path)
+    rnd = random.Random(seed)
+    everyday = list(EVERYDAY)
+    categories = {main: dict(subs) for main, subs in CATEGORIES.items()}
+    for i in range(1, extra_categories + 1):
+        categories["日常"][f"カテゴリ{i}"] = (rnd.choice((800, 1500, 3000)), ["その他"])
+        everyday.append(("日常", f"カテゴリ{i}"))
+
+    con = sqlite3.connect(path)
+    try:
+        con.executescript(SCHEMA)
+        month_list = _months(end_month, months)
+        summary = {"tenants": [], "transactions": transactions}
+        for t, quota in enumerate(_split(transactions, tenants), start=1):
+            code = f"bench-{t:02d}"
+            with con:
+                aid = con.execute("INSERT INTO aikotoba (code, label) VALUES (?, ?)", (code, code)).lastrowid
+                con.execute(
+                    "INSERT INTO users (username, password, aikotoba_id) VALUES (?, 'external', ?)", (f"user:{code}", aid)
+                )
+                subs = {}
+                for main, sub_map in categories.items():
+                    mid = con.execute(
+                        "INSERT INTO main_categories (name, aikotoba_id) VALUES (?, ?)", (main, aid)
+                    ).lastrowid
+                    for sub in sub_map:
+                        subs[(main, sub)] = con.execute(
+                            "INSERT INTO sub_categories (main_category_id, name, aikotoba_id) VALUES (?, ?, ?)",
+                            (mid, sub, aid),
+                        ).lastrowid
+            summary["tenants"].append({"code": code, "aikotoba_id": aid, "username": f"user:{code}"})
+
+            salary = rnd.randrange(220_000, 420_000, 10_000)
+            buffer = []
+            for month, month_quota in zip(month_list, _split(quota, len(month_list))):
+                buffer += [
+                    (*row, aid)
+                    for row in _month_rows(rnd, month, subs, categories, everyday, salary, month_quota)
+                ]
+                if len(buffer) >= INSERT_CHUNK:
+                    _insert(con, buffer)
+                    buffer = []
+            _insert(con, buffer)
+    finally:
+        con.close()
+    return summary
+
+
+def _insert(con, rows: list[tuple]) -> None:
+    if not rows:
+        return
+    with con:
+        con.executemany(
+            "INSERT INTO transactions (sub_category_id, amount, type, date, detail, aikotoba_id) VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
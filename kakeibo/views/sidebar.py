@@ -1,107 +1,63 @@
 from datetime import datetime, date
 from dateutil.relativedelta import relativedelta
 import pytz
-import pandas as pd
 import streamlit as st
 
 from sqlalchemy import text
-from kakeibo.db import connect_db, get_budget_and_spent_of_month
+from kakeibo.db import WRITER
+from kakeibo.st_cache import (
+    get_budget_and_spent_of_month,
+    get_gift_return_summary,
+    get_unentered_recurring_transactions,
+    invalidate,
+)
 
 
-def render_sidebar():
-    # 初期化
-    options = ["追加", "編集", "カテゴリー追加・編集", "グラフ", "開発者オプション"]
-
-    if "page_change_select" not in st.session_state:
-        st.session_state.page_change_select = options[0]
-        st.write("page_change_select")
-    if "view_category" not in st.session_state:
-        st.session_state.view_category = options[0]
-        st.write("view_category")
-    
-    def on_page_change():
-        st.session_state.view_category = st.session_state.page_change_select
+# 1.35 では experimental_fragment、1.37 以降は fragment
+_fragment = getattr(st, "fragment", None) or st.experimental_fragment
 
-    st.sidebar.selectbox(
-        label="ページ変更",
-        options=options,
-        index=options.index(st.session_state.page_change_select),
-        key="page_change_select",
-        on_change=on_page_change
-    )
 
-    # 予算進捗
-    # 月選択と予算進捗
+@_fragment
+def _budget_section():
+    # 月選択と予算進捗（月を変えてもこの部分だけ再実行）
     months = [
         (datetime.now(pytz.timezone('Asia/Tokyo')) - relativedelta(months=i)).strftime("%Y-%m")
         for i in range(12)
     ]
-    selected_month = st.sidebar.selectbox("予実管理する月を選択", months, index=0, key="select_month")
+    selected_month = st.selectbox("予実管理する月を選択", months, index=0, key="select_month")
     spent, budget, _ = get_budget_and_spent_of_month(selected_month)
     today = date.today()
-    st.sidebar.title("今月の予算進捗")
-    st.sidebar.markdown(f" **【{selected_month}月分】** {today.month}月{today.day}日時点の使用状況：")
-    for category in budget.index:
+    st.title("今月の予算進捗")
+    st.markdown(f" **【{selected_month}月分】** {today.month}月{today.day}日時点の使用状況：")
+    for category, budget_amount in budget.items():
         spent_amount = spent.get(category, 0)
-        budget_amount = budget[category]
         percentage = (spent_amount / budget_amount) * 100 if budget_amount > 0 else 0
         percentage = percentage if percentage <= 100 else 100
-        st.sidebar.write(f"{category}: {spent_amount}円 / {budget_amount}円")
-        st.sidebar.progress(percentage / 100)
+        st.write(f"{category}: {spent_amount}円 / {budget_amount}円")
+        st.progress(percentage / 100)
+
 
+@_fragment
+def _gift_section():
     # 贈与見える化
-    st.sidebar.title("贈与見える化")
-    engine = connect_db()
-    query = text(
-        """
-    SELECT 
-        detail,
-        type,
-        SUM(amount) as total
-    FROM transactions
-    WHERE type IN ('収入', '支出') AND sub_category_id IN (
-        SELECT id FROM sub_categories WHERE name = '贈与'
-    )
-    GROUP BY detail, type;
-    """
-    )
-    with engine.connect() as conn:
-        df = pd.read_sql(query, conn)
-    if df.empty:
-        st.sidebar.warning("贈与に関するデータがありません。")
+    st.title("贈与見える化")
+    gift_summary = get_gift_return_summary()
+    if not gift_summary:
+        st.warning("贈与に関するデータがありません。")
     else:
-        gifts = df[df['type'] == '収入'].set_index('detail')['total']
-        returns = df[df['type'] == '支出'].set_index('detail')['total']
-        for gift in gifts.index:
-            gift_amount = gifts[gift]
-            return_amount = sum(amount for detail, amount in returns.items() if gift in detail)
-            percentage = (return_amount / gift_amount) * 100 if gift_amount > 0 else 0
-            percentage = percentage if percentage <= 100 else 100
-            st.sidebar.write(f"贈与: {gift}")
-            st.sidebar.write(f"返礼: {return_amount}円 / {gift_amount}円")
-            st.sidebar.progress(percentage / 100)
-
-    # 定期契約の通知
-    engine = connect_db()
-    sql = text(
-        """
-        SELECT id, sub_category_id, amount, date, detail, type
-        FROM transactions
-        WHERE sub_category_id IN (
-            SELECT id FROM sub_categories WHERE main_category_id = (
-                SELECT id FROM main_categories WHERE name = '定期'
-            )
-        )
-        AND date = (
-            SELECT MAX(date) FROM transactions t2 WHERE t2.detail = transactions.detail
-        )
-        """
-    )
-    with engine.connect() as conn:
-        recurring_transactions = conn.execute(sql).fetchall()
+        for gift in gift_summary:
+            st.write(f"贈与: {gift['detail']}")
+            st.write(f"返礼: {gift['return_amount']}円 / {gift['gift_amount']}円")
+            st.progress(gift['percentage'] / 100)
+
+
+@_fragment
+def _recurring_section():
+    # 定期契約の通知（トグル・入力はこの部分だけ再実行、追加時はページ全体を更新）
+    recurring_transactions = get_unentered_recurring_transactions()
     if recurring_transactions:
-        st.sidebar.write("---")
-        st.sidebar.title("未入力の月額")
+        st.write("---")
+        st.title("未入力の月額")
         try:
             transaction_to_show = []
             today = date.today()
@@ -110,7 +66,7 @@ def render_sidebar():
                 if today >= (transaction_date + relativedelta(months=1)) and today < (transaction_date + relativedelta(months=2)) and transaction[2] > 0:
                     transaction_to_show.append((transaction[0], transaction[1], transaction[2], transaction_date, transaction[4], transaction[5]))
 
-            if st.sidebar.toggle(f"{len(transaction_to_show)}件の未入力の月額あり"):
+            if st.toggle(f"{len(transaction_to_show)}件の未入力の月額あり"):
                 for transaction in transaction_to_show:
                     id = transaction[0]
                     sub_category_id = transaction[1]
@@ -118,12 +74,12 @@ def render_sidebar():
                     date_str = transaction[3].strftime("%Y/%m/%d")
                     detail = transaction[4]
                     type_ = transaction[5]
-                    st.sidebar.write(f"● {detail}  (前回入力 {date_str})")
-                    new_amount = st.sidebar.number_input(f"{type_}額", key=f"add_amount_data_{id} ", value=amount)
-                    new_date = st.sidebar.date_input("今回の日付", key=f"add_date_data_{id} ", value=today)
-                    if st.sidebar.button(f"{detail}のデータを追加", key=f"add_data_{id}"):
-                        with engine.begin() as conn:
-                            conn.execute(
+                    st.write(f"● {detail}  (前回入力 {date_str})")
+                    new_amount = st.number_input(f"{type_}額", key=f"add_amount_data_{id} ", value=amount)
+                    new_date = st.date_input("今回の日付", key=f"add_date_data_{id} ", value=today)
+                    if st.button(f"{detail}のデータを追加", key=f"add_data_{id}"):
+                        WRITER.run(
+                            lambda conn: conn.execute(
                                 text(
                                     """
                                     INSERT INTO transactions (sub_category_id, amount, type, date, detail)
@@ -138,10 +94,42 @@ def render_sidebar():
                                     "detail": detail,
                                 },
                             )
-                        st.sidebar.success(f"{detail}のデータが追加されました")
+                        )
+                        invalidate()
+                        st.success(f"{detail}のデータが追加されました")
                         st.rerun()
-                    st.sidebar.write("---")
+                    st.write("---")
         except Exception as e:
-            st.sidebar.error(f"An error occurred: {str(e)}")
+            st.error(f"An error occurred: {str(e)}")
+
+
+def render_sidebar():
+    # 初期化
+    options = ["追加", "編集", "カテゴリー追加・編集", "インポート", "グラフ", "開発者オプション"]
+
+    if "page_change_select" not in st.session_state:
+        st.session_state.page_change_select = options[0]
+        st.write("page_change_select")
+    if "view_category" not in st.session_state:
+        st.session_state.view_category = options[0]
+        st.write("view_category")
+    
+    def on_page_change():
+        st.session_state.view_category = st.session_state.page_change_select
+
+    st.sidebar.selectbox(
+        label="ページ変更",
+        options=options,
+        index=options.index(st.session_state.page_change_select),
+        key="page_change_select",
+        on_change=on_page_change
+    )
+
+    # 各セクションは fragment として独立に再実行され、データは st_cache から取る。
+    # fragment から st.sidebar は呼べないため with st.sidebar の中で呼び出す
+    with st.sidebar:
+        _budget_section()
+        _gift_section()
+        _recurring_section()
 
     return st.session_state.view_category
@@ -0,0 +1,186 @@
+"""Single-writer queue for SQLite mutations.
+
+SQLite has one write lock per file. When every gunicorn thread opens its own
+write transaction, they wait on that lock for busy_timeout and then fail with
+``database is locked``. ``WriteCoordinator`` sends a process's writes through
+one thread that owns one connection:
+
+- ``submit(fn, *args)`` queues ``fn(conn, *args)`` and returns a Future.
+  ``run()`` does the same and waits for the result.
+- The thread drains whatever is queued (up to ``max_batch`` jobs) and
+  group-commits it in one ``BEGIN IMMEDIATE`` transaction. Each job runs under
+  its own SAVEPOINT, so a job that raises rolls back alone and its caller gets
+  the exception. The rest of the batch still commits.
+- Another process (Streamlit, another worker) can hold the lock past
+  busy_timeout. The batch is then retried with backoff before its jobs fail.
+
+Queue wait, lock wait, retries and batch sizes go to kakeibo.metrics. Jobs run
+in a copy of the submitter's context, so their statements count towards the
+submitting request's route. A job that submits another write runs it inline
+on the same connection. A retried batch runs its jobs again, so jobs should
+only touch the database and must not begin or commit transactions themselves.
+"""
+import contextvars
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from sqlalchemy.exc import OperationalError
+
+from kakeibo import metrics
+
+MAX_BATCH = int(os.environ.get("KAKEIBO_WRITE_BATCH", 64))
+LOCK_RETRIES = 5
+RETRY_BACKOFF_SECONDS = 0.05  # doubled on every retry
+_SAVEPOINT = "kakeibo_write"
+
+
+def is_locked_error(exc: BaseException) -> bool:
+    return isinstance(exc, OperationalError) and "database is locked" in str(exc)
+
+
+class _Job:
+    __slots__ = ("fn", "args", "kwargs", "context", "future", "route", "queued_at")
+
+    def __init__(self, fn, args, kwargs):
+        self.fn, self.args, self.kwargs = fn, args, kwargs
+        self.context = contextvars.copy_context()
+        self.future = Future()
+        self.route = metrics.current_route.get() or metrics.NO_ROUTE
+        self.queued_at = time.perf_counter()
+
+
+class WriteCoordinator:
+    """Serialize and group-commit ``engine`` writes on one background thread."""
+
+    def __init__(self, engine, max_batch: int = MAX_BATCH, lock_retries: int = LOCK_RETRIES):
+        self.engine = engine
+        self.max_batch = max_batch
+        self.lock_retries = lock_retries
+        self._start_lock = threading.Lock()
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._pid = None
+        self._local = threading.local()  # .conn on the writer thread while a batch runs
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """Queue ``fn(conn, *args, **kwargs)``; the Future resolves once its batch committed."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            # nested write from inside a job: already in the batch's transaction
+            future = Future()
+            try:
+                future.set_result(fn(conn, *args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        job = _Job(fn, args, kwargs)
+        self._ensure_thread().put(job)
+        metrics.WRITE_QUEUE_DEPTH.inc()
+        return job.future
+
+    def run(self, fn, *args, **kwargs):
+        """``submit()`` and wait: return ``fn``'s result or raise its exception."""
+        return self.submit(fn, *args, **kwargs).result()
+
+    def close(self, timeout: float | None = None) -> None:
+        """Let the thread finish what is queued, then stop it (it restarts on the next submit)."""
+        with self._start_lock:
+            thread = self._thread
+            if thread is None or not thread.is_alive() or self._pid != os.getpid():
+                return
+            self._queue.put(None)
+            self._thread = None
+        thread.join(timeout)
+
+    def _ensure_thread(self) -> queue.SimpleQueue:
+        if self._thread is not None and self._pid == os.getpid():
+            return self._queue
+        with self._start_lock:
+            if self._thread is None or self._pid != os.getpid():
+                # after a fork the parent's thread and queued jobs are not ours
+                self._queue = queue.SimpleQueue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(
+                    target=self._loop, args=(self._queue,), name="kakeibo-writer", daemon=True
+                )
+                self._thread.start()
+            return self._queue
+
+    def _loop(self, jobs: queue.SimpleQueue) -> None:
+        conn = None
+        stopping = False
+        while not stopping:
+            batch = [jobs.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(jobs.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                stopping = True
+                batch = [job for job in batch if job is not None]
+            if not batch:
+                continue
+            metrics.WRITE_QUEUE_DEPTH.dec(amount=len(batch))
+            conn = self._run_batch(conn, batch)
+        if conn is not None:
+            conn.close()
+
+    def _run_batch(self, conn, batch: list):
+        started = time.perf_counter()
+        batch = [job for job in batch if job.future.set_running_or_notify_cancel()]
+        for job in batch:
+            metrics.WRITE_QUEUE_SECONDS.observe(job.route, value=started - job.queued_at)
+        attempt = 0
+        while batch:
+            try:
+                if conn is None:
+                    conn = self.engine.connect()
+                outcomes = self._transaction(conn, batch)
+            except Exception as e:
+                if conn is not None:
+                    conn.close()  # a fresh connection for the next batch
+                    conn = None
+                if is_locked_error(e) and attempt < self.lock_retries:
+                    metrics.WRITE_LOCK_RETRIES.inc()
+                    time.sleep(RETRY_BACKOFF_SECONDS * 2 ** attempt)
+                    attempt += 1
+                    continue
+                reason = "locked" if is_locked_error(e) else "batch"
+                for job in batch:
+                    metrics.WRITE_FAILURES.inc(reason)
+                    job.future.set_exception(e)
+                return conn
+            metrics.WRITE_BATCH_SIZE.observe(value=len(batch))
+            for job, (ok, value) in zip(batch, outcomes):
+                if ok:
+                    job.future.set_result(value)
+                else:
+                    metrics.WRITE_FAILURES.inc("job")
+                    job.future.set_exception(value)
+            break
+        return conn
+
+    def _transaction(self, conn, batch: list) -> list[tuple[bool, object]]:
+        outcomes = []
+        with conn.begin():
+            # take the write lock up front, so waiting for it happens here and is timed
+            t = time.perf_counter()
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            metrics.WRITE_LOCK_SECONDS.observe(value=time.perf_counter() - t)
+            self._local.conn = conn
+            try:
+                for job in batch:
+                    conn.exec_driver_sql(f"SAVEPOINT {_SAVEPOINT}")
+                    try:
+                        outcomes.append((True, job.context.run(job.fn, conn, *job.args, **job.kwargs)))
+                    except Exception as e:
+                        conn.exec_driver_sql(f"ROLLBACK TO {_SAVEPOINT}")
+                        outcomes.append((False, e))
+                    conn.exec_driver_sql(f"RELEASE {_SAVEPOINT}")
+            finally:
+                self._local.conn = None
+        return outcomes
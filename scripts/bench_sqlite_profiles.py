@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Concurrent read/write throughput of the SQLite connection profiles.
+Each profile gets a fresh temp DB; reader threads run the sidebar-style month
+range query while writer threads insert single transactions.
+Run: python scripts/bench_sqlite_profiles.py [--seconds 3] [--readers 4] [--writers 2]
+"""
+import argparse
+import random
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from kakeibo.db import SQLITE_PROFILES, create_sqlite_engine  # noqa: E402
+
+SCHEMA = (
+    """
+    CREATE TABLE transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        sub_category_id INTEGER NOT NULL,
+        amount INTEGER NOT NULL,
+        type TEXT NOT NULL,
+        date TEXT NOT NULL,
+        detail TEXT,
+        aikotoba_id INTEGER
+    )
+    """,
+    "CREATE INDEX idx_transactions_aikotoba_date ON transactions (aikotoba_id, date)",
+)
+READ_SQL = text(
+    """
+    SELECT sub_category_id, type, SUM(amount) FROM transactions
+     WHERE aikotoba_id = :aid AND date >= :start AND date < :next
+     GROUP BY sub_category_id, type
+    """
+)
+WRITE_SQL = text(
+    "INSERT INTO transactions (sub_category_id, amount, type, date, detail, aikotoba_id) "
+    "VALUES (:sid, :amount, '支出', :date, 'bench', :aid)"
+)
+
+
+def _seed(path: Path, profile: str, rows: int) -> None:
+    engine = create_sqlite_engine(path, profile)
+    rnd = random.Random(0)
+    with engine.begin() as conn:
+        for ddl in SCHEMA:
+            conn.execute(text(ddl))
+        conn.execute(
+            WRITE_SQL,
+            [
+                {"sid": rnd.randint(1, 20), "amount": rnd.randint(100, 5000),
+                 "date": f"2024-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}", "aid": rnd.randint(1, 3)}
+                for _ in range(rows)
+            ],
+        )
+    engine.dispose()
+
+
+def run_profile(profile: str, seconds: float, readers: int, writers: int, rows: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        _seed(path, profile, rows)
+        write_engine = create_sqlite_engine(path, profile)
+        read_engine = create_sqlite_engine(path, profile, readonly=bool(SQLITE_PROFILES[profile]))
+        counts = {"reads": 0, "writes": 0, "locked": 0}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + seconds
+
+        def reader(seed):
+            rnd = random.Random(seed)
+            while time.perf_counter() < deadline:
+                m = rnd.randint(1, 11)
+                try:
+                    with read_engine.connect() as conn:
+                        conn.execute(READ_SQL, {"aid": rnd.randint(1, 3), "start": f"2024-{m:02d}-01",
+                                                "next": f"2024-{m + 1:02d}-01"}).fetchall()
+                    key = "reads"
+                except OperationalError:
+                    key = "locked"
+                with lock:
+                    counts[key] += 1
+
+        def writer(seed):
+            rnd = random.Random(seed)
+            while time.perf_counter() < deadline:
+                try:
+                    with write_engine.begin() as conn:
+                        conn.execute(WRITE_SQL, {"sid": rnd.randint(1, 20), "amount": rnd.randint(100, 5000),
+                                                 "date": "2024-06-15", "aid": rnd.randint(1, 3)})
+                    key = "writes"
+                except OperationalError:
+                    key = "locked"
+                with lock:
+                    counts[key] += 1
+
+        threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+        threads += [threading.Thread(target=writer, args=(100 + i,)) for i in range(writers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        write_engine.dispose()
+        read_engine.dispose()
+    return {
+        "profile": profile,
+        "reads_per_s": counts["reads"] / seconds,
+        "writes_per_s": counts["writes"] / seconds,
+        "locked_errors": counts["locked"],
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--rows", type=int, default=20000, help="seed transactions per DB")
+    parser.add_argument("--profiles", nargs="*", default=list(SQLITE_PROFILES))
+    args = parser.parse_args()
+
+    print(f"{'profile':<12} {'reads/s':>10} {'writes/s':>10} {'locked':>8}")
+    for profile in args.profiles:
+        r = run_profile(profile, args.seconds, args.readers, args.writers, args.rows)
+        print(f"{r['profile']:<12} {r['reads_per_s']:>10.0f} {r['writes_per_s']:>10.0f} {r['locked_errors']:>8}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
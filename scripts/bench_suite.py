@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Benchmark kakeibo.db and the main Flask routes on deterministic synthetic data.
+Generates a throwaway DB (kakeibo.synthetic), times every public kakeibo.db
+function and the main routes through the Flask test client (sidebar cache
+cleared per call, no conditional requests), and writes the results to JSON.
+With a stored baseline, prints the ratio per case and exits 1 on regressions:
+fastest run slower by more than --tolerance (and by at least --noise-ms; the
+minimum is steadier than the median on a busy machine) or more SQL statements
+per request. Baselines are per machine; keep them out of git.
+Run: python scripts/bench_suite.py [--transactions 100000] [--tenants 3] [--repeat 5] [--save-baseline]
+"""
+import argparse
+import inspect
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import text
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = REPO_ROOT / "bench-results"
+# Not timed: engine factory, and update_data needs an edited Streamlit DataFrame
+SKIPPED = {"create_sqlite_engine", "update_data"}
+# Listing every row of a tenant is only meaningful on small data sets
+FULL_LIST_MAX_ROWS = 100_000
+
+
+def _timed(fn, repeat: int, setup=None) -> dict:
+    """Median/min/max of ``repeat`` calls after one warm-up.
+
+    With ``setup``, each call is ``fn(setup())`` and only ``fn`` is timed.
+    """
+    def once():
+        arg = setup() if setup else None
+        t = time.perf_counter()
+        fn(arg) if setup else fn()
+        return (time.perf_counter() - t) * 1000
+
+    once()  # warm-up: page cache, statement cache, first-use imports
+    samples = [once() for _ in range(repeat)]
+    return {
+        "median_ms": round(statistics.median(samples), 3),
+        "min_ms": round(min(samples), 3),
+        "max_ms": round(max(samples), 3),
+    }
+
+
+def db_cases(ctx: dict) -> dict:
+    """name -> callable or (setup, fn), one per public kakeibo.db function."""
+    import kakeibo.db as db
+
+    aid, month = ctx["aid"], ctx["month"]
+    names = (f"bench-sub-{i}" for i in range(10**9))
+
+    def _new_sub_category():
+        name = next(names)
+        db.add_sub_category(ctx["main_id"], name)
+        with db.READ_ENGINE.connect() as conn:
+            return conn.execute(text("SELECT MAX(id) FROM sub_categories WHERE name = :n"), {"n": name}).scalar()
+
+    return {
+        "exists_db_file": db.exists_db_file,
+        "ensure_db_file": db.ensure_db_file,
+        "connect_db": db.connect_db,
+        "ensure_aikotoba_schema": db.ensure_aikotoba_schema,
+        "get_data_version_stamp": lambda: db.get_data_version_stamp(aid),
+        "get_data_version": lambda: db.get_data_version(aid),
+        "bump_data_version": lambda: db.bump_data_version(aid),
+        "rebuild_monthly_totals": db.rebuild_monthly_totals,
+        "lookup_aikotoba_id": lambda: db.lookup_aikotoba_id(ctx["code"]),
+        "get_aikotoba_id": lambda: db.get_aikotoba_id(ctx["code"]),
+        "get_budget_rows": lambda: db.get_budget_rows(month, aid),
+        "get_budget_and_spent_of_month": lambda: db.get_budget_and_spent_of_month(month, aid),
+        "get_categories": lambda: db.get_categories(aikotoba_id=aid),
+        "get_monthly_balance": lambda: db.get_monthly_balance(aid),
+        "get_transaction_by_id": lambda: db.get_transaction_by_id(ctx["transaction_id"]),
+        "get_gift_totals": lambda: db.get_gift_totals(aid),
+        "get_gift_return_summary": lambda: db.get_gift_return_summary(aid),
+        "get_unentered_recurring_transactions": lambda: db.get_unentered_recurring_transactions(aid),
+        "add_sub_category": lambda: db.add_sub_category(ctx["main_id"], next(names)),
+        "rename_sub_category": (_new_sub_category, lambda sid: db.rename_sub_category(sid, f"renamed-{sid}")),
+        "delete_sub_category": (_new_sub_category, db.delete_sub_category),
+        "get_sub_category_by_id": lambda: db.get_sub_category_by_id(ctx["sub_id"]),
+        # pandas adapters, resolved lazily through kakeibo.db.__getattr__
+        "load_data": lambda: db.load_data(ctx["sub_id"]),
+        "get_monthly_summary": lambda: db.get_monthly_summary(aid),
+        "get_gifts_summary": lambda: db.get_gifts_summary(aid),
+    }
+
+
+def public_db_functions() -> set:
+    import kakeibo.db as db
+
+    names = {
+        name for name, obj in inspect.getmembers(db, inspect.isfunction)
+        if obj.__module__ == db.__name__ and not name.startswith("_")
+    }
+    return names | set(db._FRAME_FUNCTIONS)
+
+
+def route_cases(ctx: dict, transactions: int) -> list[tuple]:
+    """(name, method, path, kwargs) for the main pages and JSON endpoints."""
+    month, year = ctx["month"], ctx["month"][:4]
+    cases = [
+        ("GET /add", "GET", f"/add?month={month}", {}),
+        ("GET /edit", "GET", f"/edit?start_date={month}-01&end_date={month}-31", {}),
+        ("GET /graphs", "GET", "/graphs", {}),
+        ("GET /categories", "GET", "/categories", {}),
+        ("GET /api/transactions page", "GET", "/api/transactions?limit=100", {}),
+        ("GET /api/transactions month", "GET", f"/api/transactions?start_date={month}-01&end_date={month}-31", {}),
+        ("GET /api/transactions/export year", "GET",
+         f"/api/transactions/export?format=csv&start_date={year}-01-01&end_date={year}-12-31", {}),
+        ("GET /api/sub_categories", "GET", "/api/sub_categories", {}),
+        ("GET /api/graphs/monthly", "GET", "/api/graphs/monthly", {}),
+        ("POST /api/transactions", "POST", "/api/transactions", {"json": {
+            "sub_category_id": ctx["sub_id"], "date": f"{month}-15", "type": "支出", "amount": 500, "detail": "bench",
+        }}),
+        ("POST /api/transactions/batch", "POST", "/api/transactions/batch", {"json": {"ops": [
+            {"op": "create", "data": {
+                "sub_category_id": ctx["sub_id"], "date": f"{month}-16", "type": "支出", "amount": 100 + i, "detail": "bench",
+            }}
+            for i in range(50)
+        ]}}),
+    ]
+    if transactions <= FULL_LIST_MAX_ROWS:
+        cases.append(("GET /api/transactions all", "GET", "/api/transactions", {}))
+    return cases
+
+
+def run(args) -> dict:
+    workdir = Path(tempfile.mkdtemp(prefix="kakeibo-bench-"))
+    # kakeibo.db resolves its file from the environment at import
+    os.environ["KAKEIBO_DATA_DIR"] = str(workdir)
+    sys.path.insert(0, str(REPO_ROOT))
+    from kakeibo.synthetic import generate
+
+    t = time.perf_counter()
+    data = generate(
+        workdir / "kakeibo.db", tenants=args.tenants, transactions=args.transactions,
+        months=args.months, extra_categories=args.extra_categories, seed=args.seed,
+    )
+    generate_s = time.perf_counter() - t
+
+    import kakeibo.db as db
+
+    t = time.perf_counter()
+    db.ensure_aikotoba_schema()
+    schema_s = time.perf_counter() - t
+
+    tenant = data["tenants"][0]
+    aid = tenant["aikotoba_id"]
+    with db.READ_ENGINE.connect() as conn:
+        ctx = {
+            "aid": aid,
+            "code": tenant["code"],
+            "month": conn.execute(text("SELECT MAX(substr(date, 1, 7)) FROM transactions WHERE aikotoba_id = :a"), {"a": aid}).scalar(),
+            "main_id": conn.execute(text("SELECT id FROM main_categories WHERE aikotoba_id = :a AND name = '日常'"), {"a": aid}).scalar(),
+            "sub_id": conn.execute(text("SELECT id FROM sub_categories WHERE aikotoba_id = :a AND name = '食費'"), {"a": aid}).scalar(),
+            "transaction_id": conn.execute(text("SELECT MAX(id) FROM transactions WHERE aikotoba_id = :a"), {"a": aid}).scalar(),
+        }
+
+    results = {}
+    cases = db_cases(ctx)
+    uncovered = sorted(public_db_functions() - set(cases) - SKIPPED)
+    for name, fn in cases.items():
+        if args.only and args.only not in f"db.{name}":
+            continue
+        setup, fn = fn if isinstance(fn, tuple) else (None, fn)
+        results[f"db.{name}"] = _timed(fn, args.repeat, setup)
+        print(f"  {results[f'db.{name}']['median_ms']:>10.2f} ms  db.{name}", flush=True)
+
+    from flask_app import _SIDEBAR_CACHE, app
+    from kakeibo import metrics
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["auth_user"] = tenant["username"]
+    adapter = app.url_map.bind("localhost")
+    for name, method, path, kwargs in route_cases(ctx, args.transactions):
+        if args.only and args.only not in f"route.{name}":
+            continue
+        rule = adapter.match(path.split("?")[0], method=method, return_rule=True)[0].rule
+        statuses, streamed = set(), []
+
+        def call():
+            _SIDEBAR_CACHE.clear()
+            res = client.open(path, method=method, **kwargs)
+            streamed.append("Content-Length" not in res.headers)
+            res.get_data()  # drain streamed bodies
+            statuses.add(res.status_code)
+
+        entry = _timed(call, args.repeat)
+        # one more (warm) call for the statement count; streamed bodies run
+        # their queries after the request signals, so they are not counted
+        before = (metrics.QUERIES_PER_REQUEST.count(rule), metrics.QUERIES_PER_REQUEST.total(rule))
+        call()
+        calls = metrics.QUERIES_PER_REQUEST.count(rule) - before[0]
+        queries = metrics.QUERIES_PER_REQUEST.total(rule) - before[1]
+        entry["queries"] = None if streamed[-1] or not calls else int(queries)
+        entry["status"] = sorted(statuses)
+        results[f"route.{name}"] = entry
+        queries = "streamed" if entry["queries"] is None else f"{entry['queries']} queries"
+        print(f"  {entry['median_ms']:>10.2f} ms  route.{name}  ({queries})", flush=True)
+
+    return {
+        "meta": {
+            "params": {k: getattr(args, k) for k in ("tenants", "transactions", "months", "extra_categories", "seed", "repeat")},
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "sqlite_profile": db.SQLITE_PROFILE,
+            "generate_s": round(generate_s, 2),
+            "schema_s": round(schema_s, 2),
+            "db_bytes": (workdir / "kakeibo.db").stat().st_size,
+            "uncovered_db_functions": uncovered,
+        },
+        "results": results,
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float, noise_ms: float) -> list[str]:
+    """Print current vs baseline per case; return the names that regressed."""
+    if baseline["meta"]["params"] != report["meta"]["params"]:
+        print(f"\n[WARN] baseline params differ: {baseline['meta']['params']}; ratios are not comparable")
+    regressions = []
+    print(f"\n{'case':<48} {'base ms':>10} {'now ms':>10} {'ratio':>7}   (fastest run)")
+    for name, now in report["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"{name:<48} {'-':>10} {now['min_ms']:>10.2f} {'new':>7}")
+            continue
+        ratio = now["min_ms"] / base["min_ms"] if base["min_ms"] else float("inf")
+        slower = ratio > 1 + tolerance and now["min_ms"] - base["min_ms"] >= noise_ms
+        more_queries = (now.get("queries") or 0) > (base.get("queries") or 0)
+        flag = ""
+        if slower or more_queries:
+            regressions.append(name)
+            flag = "  <-- slower" if slower else ""
+            if more_queries:
+                flag += f"  <-- queries {base.get('queries')} -> {now.get('queries')}"
+        print(f"{name:<48} {base['min_ms']:>10.2f} {now['min_ms']:>10.2f} {ratio:>7.2f}{flag}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tenants", type=int, default=3)
+    parser.add_argument("--transactions", type=int, default=100_000, help="total rows (10k-5M)")
+    parser.add_argument("--months", type=int, default=36)
+    parser.add_argument("--extra-categories", type=int, default=0, help="additional 日常 sub categories per tenant")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", help="run only cases whose name contains this")
+    parser.add_argument("--output", type=Path, default=RESULTS_DIR / "latest.json")
+    parser.add_argument("--baseline", type=Path, default=RESULTS_DIR / "baseline.json")
+    parser.add_argument("--save-baseline", action="store_true", help="also store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown ratio before flagging")
+    parser.add_argument("--noise-ms", type=float, default=2.0, help="ignore slowdowns smaller than this")
+    args = parser.parse_args()
+
+    print(f"{args.transactions:,} transactions / {args.tenants} tenants, {args.repeat} runs per case")
+    report = run(args)
+    meta = report["meta"]
+    print(f"\ngenerated in {meta['generate_s']} s, schema/indexes in {meta['schema_s']} s, {meta['db_bytes'] / 2**20:.1f} MiB")
+    if meta["uncovered_db_functions"]:
+        print(f"[WARN] public kakeibo.db functions without a benchmark: {', '.join(meta['uncovered_db_functions'])}")
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+    print(f"results: {args.output}")
+
+    failed = False
+    if args.baseline.exists() and not args.save_baseline:
+        regressions = compare(report, json.loads(args.baseline.read_text()), args.tolerance, args.noise_ms)
+        if regressions:
+            print(f"\n[FAIL] {len(regressions)} regression(s): {', '.join(regressions)}", file=sys.stderr)
+            failed = True
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+        print(f"baseline saved: {args.baseline}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Import-time digest of a module (default: flask_app) from `python -X importtime`.
+Prints the total import time, the module count, the slowest direct imports and
+the heaviest modules by self time, and flags libraries that must stay off the
+Flask cold-start path. Exits 1 when a --budget-* is exceeded.
+Run: python scripts/importtime_report.py [--module flask_app] [--top 15] [--budget-ms 1500] [--budget-modules 600]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+# Libraries whose presence in the Flask import graph is a regression
+HEAVY_MODULES = ("pandas", "numpy", "streamlit", "altair", "pyarrow", "requests")
+_LINE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def parse_importtime(stderr: str) -> list[dict]:
+    """Parse `-X importtime` output into {name, self_us, cumulative_us, depth} rows."""
+    rows = []
+    for line in stderr.splitlines():
+        m = _LINE_RE.match(line)
+        if m:
+            rows.append({
+                "name": m.group(4),
+                "self_us": int(m.group(1)),
+                "cumulative_us": int(m.group(2)),
+                "depth": len(m.group(3)) // 2,
+            })
+    return rows
+
+
+def measure(module: str) -> list[dict]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(REPO_ROOT), env.get("PYTHONPATH")]))
+    # keep the measured import off the real data volume
+    env.setdefault("KAKEIBO_DATA_DIR", tempfile.mkdtemp(prefix="kakeibo-importtime-"))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=False,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed")
+    return parse_importtime(proc.stderr)
+
+
+def summarize(rows: list[dict], module: str, top: int) -> dict:
+    target = next((r for r in reversed(rows) if r["name"] == module and r["depth"] == 0), None)
+    # -X importtime lists children before their parent; the direct imports of
+    # `module` are the depth-1 rows between the previous depth-0 row and it.
+    end = rows.index(target) if target else len(rows)
+    start = max((i for i, r in enumerate(rows[:end]) if r["depth"] == 0), default=-1) + 1
+    direct = [r for r in rows[start:end] if r["depth"] == 1]
+    names = {r["name"] for r in rows}
+    return {
+        "module": module,
+        "total_ms": round((target["cumulative_us"] if target else 0) / 1000, 1),
+        "modules": len(names),
+        "slowest_direct_imports": [
+            {"name": r["name"], "ms": round(r["cumulative_us"] / 1000, 1)}
+            for r in sorted(direct, key=lambda r: r["cumulative_us"], reverse=True)[:top]
+        ],
+        "heaviest_self": [
+            {"name": r["name"], "ms": round(r["self_us"] / 1000, 1)}
+            for r in sorted(rows, key=lambda r: r["self_us"], reverse=True)[:top]
+        ],
+        "heavy_modules_loaded": sorted(m for m in HEAVY_MODULES if m in names),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="flask_app")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float, default=None)
+    parser.add_argument("--budget-modules", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="print the digest as JSON")
+    args = parser.parse_args()
+
+    report = summarize(measure(args.module), args.module, args.top)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(f"{report['module']}: {report['total_ms']:.1f} ms, {report['modules']} modules")
+        print("\nslowest direct imports (cumulative):")
+        for r in report["slowest_direct_imports"]:
+            print(f"  {r['ms']:>8.1f} ms  {r['name']}")
+        print("\nheaviest modules (self):")
+        for r in report["heaviest_self"]:
+            print(f"  {r['ms']:>8.1f} ms  {r['name']}")
+        if report["heavy_modules_loaded"]:
+            print(f"\n[WARN] heavy modules on the import path: {', '.join(report['heavy_modules_loaded'])}")
+
+    failed = bool(report["heavy_modules_loaded"])
+    if args.budget_ms is not None and report["total_ms"] > args.budget_ms:
+        print(f"[FAIL] {report['total_ms']:.1f} ms > budget {args.budget_ms:.0f} ms", file=sys.stderr)
+        failed = True
+    if args.budget_modules is not None and report["modules"] > args.budget_modules:
+        print(f"[FAIL] {report['modules']} modules > budget {args.budget_modules}", file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Concurrent load test of the Flask app under gunicorn on a synthetic DB.
+Generates a DB (kakeibo.synthetic) in a temp dir and boots gunicorn against it
+with the given workers and threads, like start-flask.sh does. It signs a session
+cookie per tenant with the run's secret key, then has --concurrency virtual
+users replay a weighted read/write mix until --duration is up. Each user runs
+as a thread with its own keep-alive connection.
+Reports, per route:
+- p50/p95/p99/max latency and throughput
+- error responses
+- SQLite lock errors: 503 from the "database is locked" handler, or a body
+  that mentions it
+Run: python scripts/loadtest.py [--workers 1] [--threads 1] [--concurrency 8] [--duration 20] [--transactions 100000]
+     python scripts/loadtest.py --url http://127.0.0.1:5000 --secret-key KEY --username USER   # running server
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# (weight, name, method, path, body kind); {month} is the tenant's latest month and
+# write bodies use a random sub category of the tenant
+SCENARIO = (
+    (20, "GET /add", "GET", "/add?month={month}", None),
+    (15, "GET /edit", "GET", "/edit?start_date={month}-01&end_date={month}-31", None),
+    (25, "GET /api/transactions", "GET", "/api/transactions?limit=100", None),
+    (10, "GET /graphs", "GET", "/graphs", None),
+    (10, "GET /api/graphs/monthly", "GET", "/api/graphs/monthly", None),
+    (5, "GET /api/sub_categories", "GET", "/api/sub_categories", None),
+    (10, "POST /api/transactions", "POST", "/api/transactions", "create"),
+    (3, "POST /api/transactions/batch", "POST", "/api/transactions/batch", "batch"),
+    (2, "POST /add", "POST", "/add", "form"),
+)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def session_cookie(secret_key: str, username: str) -> str:
+    """Flask session cookie value logging ``username`` in, signed like the app does."""
+    from flask import Flask
+
+    signer = Flask("loadtest")
+    signer.secret_key = secret_key
+    return signer.session_interface.get_signing_serializer(signer).dumps({"auth_user": username})
+
+
+def prepare_db(args) -> tuple[Path, list[dict]]:
+    """Generate the synthetic DB and run the schema bootstrap (indexes, rollup) up front."""
+    workdir = Path(tempfile.mkdtemp(prefix="kakeibo-loadtest-"))
+    os.environ["KAKEIBO_DATA_DIR"] = str(workdir)
+    sys.path.insert(0, str(REPO_ROOT))
+    from kakeibo.synthetic import generate
+
+    data = generate(workdir / "kakeibo.db", tenants=args.tenants, transactions=args.transactions, seed=args.seed)
+    from sqlalchemy import text
+
+    import kakeibo.db as db
+
+    db.ensure_aikotoba_schema()
+    tenants = []
+    with db.READ_ENGINE.connect() as conn:
+        for t in data["tenants"]:
+            aid = t["aikotoba_id"]
+            tenants.append({
+                **t,
+                "month": conn.execute(
+                    text("SELECT MAX(substr(date, 1, 7)) FROM transactions WHERE aikotoba_id = :a"), {"a": aid}
+                ).scalar(),
+                "sub_ids": [r[0] for r in conn.execute(
+                    text("SELECT id FROM sub_categories WHERE aikotoba_id = :a"), {"a": aid}
+                )],
+            })
+    db.ENGINE.dispose()
+    db.READ_ENGINE.dispose()
+    return workdir, tenants
+
+
+def boot_gunicorn(args, workdir: Path, secret_key: str, port: int) -> subprocess.Popen:
+    env = dict(os.environ, KAKEIBO_DATA_DIR=str(workdir), FLASK_SECRET_KEY=secret_key)
+    if args.profile:
+        env["KAKEIBO_SQLITE_PROFILE"] = args.profile
+    cmd = [
+        sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}",
+        "--workers", str(args.workers), "--threads", str(args.threads), "--timeout", "60",
+        "--log-level", "warning", "flask_app:app",
+    ]
+    proc = subprocess.Popen(cmd, cwd=REPO_ROOT, env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {proc.returncode}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/login")
+            conn.getresponse().read()
+            conn.close()
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("gunicorn did not answer within 30 s")
+
+
+def _body(kind: str, tenant: dict, rnd: random.Random):
+    sub_id = rnd.choice(tenant["sub_ids"])
+    row = {"sub_category_id": sub_id, "date": f"{tenant['month']}-{rnd.randint(1, 28):02d}",
+           "type": "支出", "amount": rnd.randint(100, 5000), "detail": "loadtest"}
+    if kind == "create":
+        return json.dumps(row), "application/json"
+    if kind == "batch":
+        ops = [{"op": "create", "data": {**row, "amount": row["amount"] + i}} for i in range(10)]
+        return json.dumps({"ops": ops}), "application/json"
+    return urllib.parse.urlencode(row), "application/x-www-form-urlencoded"
+
+
+def virtual_user(host, port, tenant, cookie, deadline, seed, samples, lock):
+    rnd = random.Random(seed)
+    weights = [s[0] for s in SCENARIO]
+    conn = http.client.HTTPConnection(host, port, timeout=60)
+    local = []
+    while time.monotonic() < deadline:
+        _, name, method, path, kind = rnd.choices(SCENARIO, weights)[0]
+        headers = {"Cookie": f"session={cookie}", "Accept": "application/json, text/html"}
+        body = None
+        if kind:
+            body, headers["Content-Type"] = _body(kind, tenant, rnd)
+        t = time.perf_counter()
+        try:
+            conn.request(method, path.format(month=tenant["month"]), body=body.encode() if body else None, headers=headers)
+            res = conn.getresponse()
+            payload = res.read()
+            status = res.status
+            if res.getheader("Connection", "").lower() == "close":
+                conn.close()
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()  # reconnects on the next request
+            status, payload = 0, str(e).encode()
+        elapsed = (time.perf_counter() - t) * 1000
+        locked = status == 503 or b"database is locked" in payload
+        local.append((name, elapsed, status, locked))
+    conn.close()
+    with lock:
+        samples.extend(local)
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    k = math.ceil(p / 100 * len(sorted_values)) - 1
+    return sorted_values[max(0, min(k, len(sorted_values) - 1))]
+
+
+def summarize(samples: list, seconds: float) -> dict:
+    by_route: dict = {}
+    for name, ms, status, locked in samples:
+        by_route.setdefault(name, []).append((ms, status, locked))
+    routes = {}
+    for name, rows in sorted(by_route.items()):
+        latencies = sorted(ms for ms, _, _ in rows)
+        routes[name] = {
+            "requests": len(rows),
+            "rps": round(len(rows) / seconds, 1),
+            "p50_ms": round(percentile(latencies, 50), 1),
+            "p95_ms": round(percentile(latencies, 95), 1),
+            "p99_ms": round(percentile(latencies, 99), 1),
+            "max_ms": round(latencies[-1], 1),
+            "errors": sum(1 for _, status, _ in rows if not 200 <= status < 400),
+            "locked": sum(1 for _, _, locked in rows if locked),
+        }
+    return {
+        "requests": len(samples),
+        "rps": round(len(samples) / seconds, 1),
+        "errors": sum(r["errors"] for r in routes.values()),
+        "locked": sum(r["locked"] for r in routes.values()),
+        "routes": routes,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=8, help="virtual users")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of load")
+    parser.add_argument("--tenants", type=int, default=3)
+    parser.add_argument("--transactions", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--profile", help="KAKEIBO_SQLITE_PROFILE for the server")
+    parser.add_argument("--url", help="load an already running server instead of booting one")
+    parser.add_argument("--secret-key", help="FLASK_SECRET_KEY of the --url server")
+    parser.add_argument("--username", action="append", help="user(s) to log in as on the --url server")
+    parser.add_argument("--month", default=time.strftime("%Y-%m"), help="month for /add and /edit on the --url server")
+    parser.add_argument("--json", type=Path, help="also write the report here")
+    args = parser.parse_args()
+
+    proc = None
+    if args.url:
+        if not (args.secret_key and args.username):
+            parser.error("--url needs --secret-key and --username")
+        parsed = urllib.parse.urlsplit(args.url)
+        host, port = parsed.hostname, parsed.port or 80
+        secret_key = args.secret_key
+        # writes need a sub category id; the server's own list API provides one per user
+        tenants = [{"username": u, "month": args.month, "sub_ids": []} for u in args.username]
+        for tenant in tenants:
+            conn = http.client.HTTPConnection(host, port, timeout=10)
+            conn.request("GET", "/api/sub_categories", headers={"Cookie": f"session={session_cookie(secret_key, tenant['username'])}"})
+            res = conn.getresponse()
+            tenant["sub_ids"] = [row["id"] for row in json.loads(res.read() or b"[]")] if res.status == 200 else []
+            conn.close()
+            if not tenant["sub_ids"]:
+                parser.error(f"{tenant['username']}: no sub categories visible (wrong secret key?)")
+    else:
+        print(f"generating {args.transactions:,} transactions for {args.tenants} tenants ...", flush=True)
+        workdir, tenants = prepare_db(args)
+        secret_key = secrets.token_hex(16)
+        host, port = "127.0.0.1", _free_port()
+        proc = boot_gunicorn(args, workdir, secret_key, port)
+
+    try:
+        cookies = {t["username"]: session_cookie(secret_key, t["username"]) for t in tenants}
+        samples, lock = [], threading.Lock()
+        deadline = time.monotonic() + args.duration
+        users = [
+            threading.Thread(
+                target=virtual_user,
+                args=(host, port, tenants[i % len(tenants)], cookies[tenants[i % len(tenants)]["username"]],
+                      deadline, args.seed + i, samples, lock),
+            )
+            for i in range(args.concurrency)
+        ]
+        started = time.monotonic()
+        print(f"{args.concurrency} users for {args.duration:.0f} s against {host}:{port} "
+              f"(workers={args.workers}, threads={args.threads}) ...", flush=True)
+        for u in users:
+            u.start()
+        for u in users:
+            u.join()
+        report = summarize(samples, time.monotonic() - started)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    print(f"\n{'route':<32} {'reqs':>6} {'req/s':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'err':>5} {'locked':>6}")
+    for name, r in report["routes"].items():
+        print(f"{name:<32} {r['requests']:>6} {r['rps']:>7.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+              f"{r['p99_ms']:>8.1f} {r['max_ms']:>8.1f} {r['errors']:>5} {r['locked']:>6}")
+    print(f"\ntotal: {report['requests']} requests, {report['rps']} req/s, "
+          f"{report['errors']} errors, {report['locked']} lock errors (latencies in ms)")
+    if args.json:
+        report["params"] = {k: getattr(args, k) for k in ("workers", "threads", "concurrency", "duration",
+                                                          "tenants", "transactions", "profile")}
+        args.json.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
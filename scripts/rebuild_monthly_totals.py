@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""
+Rebuild the monthly_totals rollup from the transactions table.
+The rollup is kept current by triggers; run this after bulk edits made with
+triggers disabled or if the rollup is suspected to have drifted.
+Run: python scripts/rebuild_monthly_totals.py
+"""
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from kakeibo.db import ensure_aikotoba_schema, rebuild_monthly_totals  # noqa: E402
+
+
+def main() -> int:
+    ensure_aikotoba_schema()
+    rows = rebuild_monthly_totals()
+    print(f"[OK] monthly_totals rebuilt ({rows} rows)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -8,7 +8,8 @@ from datetime import datetime
 import pandas as pd
 from sqlalchemy import text
 
-from kakeibo.db import connect_db, get_budget_and_spent_of_month, get_monthly_summary
+from kakeibo.db import connect_db, get_budget_and_spent_of_month
+from kakeibo.frames import get_monthly_summary
 
 
 def main() -> int:
@@ -43,8 +44,8 @@ def main() -> int:
     # 3) Budget/spent aggregation (safe even with empty data)
     ym = datetime.now().strftime("%Y-%m")
     try:
-        spent, budget, df = get_budget_and_spent_of_month(ym)
-        assert isinstance(df, pd.DataFrame)
+        spent, budget, rows = get_budget_and_spent_of_month(ym)
+        assert isinstance(spent, dict) and isinstance(budget, dict)
         print("[OK] get_budget_and_spent_of_month")
     except Exception as e:
         print(f"[FAIL] get_budget_and_spent_of_month: {e}")
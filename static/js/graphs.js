@@ -1,25 +1,95 @@
-// Graphs page behavior: render charts and handle range changes
-document.addEventListener('DOMContentLoaded', function () {
-  try {
-    const monthlyDataEl = document.getElementById('monthlyChartData');
-    const cumulativeDataEl = document.getElementById('cumulativeChartData');
-    if (monthlyDataEl && cumulativeDataEl && window.vegaEmbed) {
-      const monthlySpec = JSON.parse(monthlyDataEl.textContent || '{}');
-      const cumulativeSpec = JSON.parse(cumulativeDataEl.textContent || '{}');
-      vegaEmbed('#monthly_chart', monthlySpec, { actions: false }).catch(console.error);
-      vegaEmbed('#cumulative_chart', cumulativeSpec, { actions: false }).catch(console.error);
-    }
-  } catch (e) {
-    console.error('Failed to render charts:', e);
-  }
+// Graphs page behavior: fetch the monthly series once, filter the range client-side.
+// The JSON endpoint answers repeat visits with 304 (ETag), so range changes and
+// reloads cost no server-side aggregation.
+
+function lineSpec(title, field, axisTitle) {
+  return {
+    $schema: 'https://vega.github.io/schema/vega-lite/v5.json',
+    title: title,
+    width: 'container',
+    data: { name: 'table' },
+    mark: 'line',
+    params: [{ name: 'grid', select: 'interval', bind: 'scales' }],
+    encoding: {
+      x: { field: 'date', type: 'temporal', axis: { title: '月' } },
+      y: { field: field, type: 'quantitative', axis: { title: axisTitle } },
+      tooltip: [
+        { field: 'date', type: 'temporal', timeUnit: 'yearmonth', title: '月' },
+        { field: field, type: 'quantitative', title: axisTitle },
+      ],
+    },
+  };
+}
+
+const CHARTS = {
+  '#monthly_chart': lineSpec('月次収支', 'net', '当月収支'),
+  '#cumulative_chart': lineSpec('累計資産推移', 'cumulative', '累計資産'),
+};
 
+document.addEventListener('DOMContentLoaded', function () {
   const form = document.getElementById('rangeForm');
   const startSel = document.getElementById('startMonth');
   const endSel = document.getElementById('endMonth');
-  if (form && startSel && endSel) {
-    const submit = () => form.submit();
-    startSel.addEventListener('change', submit);
-    endSel.addEventListener('change', submit);
+  if (!form || !startSel || !endSel) return;
+
+  let allRows = [];
+  const views = [];
+
+  function fillOptions(months) {
+    for (const [sel, fallback] of [[startSel, months[0]], [endSel, months[months.length - 1]]]) {
+      sel.innerHTML = '';
+      for (const m of months) {
+        const opt = document.createElement('option');
+        opt.value = m;
+        opt.textContent = m;
+        sel.appendChild(opt);
+      }
+      sel.value = months.includes(sel.dataset.selected) ? sel.dataset.selected : fallback;
+    }
+  }
+
+  function selectedRows() {
+    let start = startSel.value;
+    let end = endSel.value;
+    if (start > end) [start, end] = [end, start];
+    return allRows.filter((r) => r.month >= start && r.month <= end);
+  }
+
+  function render() {
+    const values = selectedRows();
+    for (const view of views) {
+      view.data('table', values).runAsync();
+    }
+    const params = new URLSearchParams(window.location.search);
+    params.set('start_month', startSel.value);
+    params.set('end_month', endSel.value);
+    history.replaceState(null, '', `${window.location.pathname}?${params}`);
   }
-});
 
+  fetch(form.dataset.apiUrl, { credentials: 'same-origin' })
+    .then((r) => {
+      if (!r.ok) throw new Error(`HTTP ${r.status}`);
+      return r.json();
+    })
+    .then(({ columns, rows }) => {
+      allRows = rows.map((row) => {
+        const rec = Object.fromEntries(columns.map((c, i) => [c, row[i]]));
+        const [y, m] = rec.month.split('-').map(Number);
+        rec.date = Date.UTC(y, m - 1, 1);
+        return rec;
+      });
+      fillOptions(allRows.map((r) => r.month));
+      if (!window.vegaEmbed) return;
+      return Promise.all(
+        Object.entries(CHARTS).map(([el, spec]) =>
+          vegaEmbed(el, spec, { actions: false }).then((res) => views.push(res.view))
+        )
+      ).then(render);
+    })
+    .catch((e) => console.error('Failed to render charts:', e));
+
+  // Range changes re-filter locally instead of reloading the page
+  form.addEventListener('submit', (e) => e.preventDefault());
+  startSel.addEventListener('change', render);
+  endSel.addEventListener('change', render);
+});
@@ -0,0 +1,90 @@
+"""Shared pytest setup: run every test against a throwaway SQLite file."""
+import os
+import sqlite3
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Must happen before kakeibo.db is imported: DB_FILENAME is resolved at import.
+_TEST_DATA_DIR = Path(tempfile.mkdtemp(prefix="kakeibo-test-"))
+os.environ["KAKEIBO_DATA_DIR"] = str(_TEST_DATA_DIR)
+
+# Same empty schema start.sh creates when no seed DB is shipped (+ users from auth)
+_BASE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS main_categories (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS sub_categories (id INTEGER PRIMARY KEY AUTOINCREMENT, main_category_id INTEGER NOT NULL, name TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS transactions (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  sub_category_id INTEGER NOT NULL,
+  amount INTEGER NOT NULL,
+  type TEXT CHECK(type IN ('支出','収入','予算')) NOT NULL,
+  date TEXT NOT NULL,
+  detail TEXT
+);
+CREATE TABLE IF NOT EXISTS backup_time (id INTEGER PRIMARY KEY AUTOINCREMENT, time TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS users (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  username TEXT NOT NULL UNIQUE,
+  password TEXT NOT NULL,
+  role TEXT NOT NULL DEFAULT 'user',
+  created_at TEXT NOT NULL DEFAULT (datetime('now'))
+);
+"""
+
+_con = sqlite3.connect(_TEST_DATA_DIR / "kakeibo.db")
+_con.executescript(_BASE_SCHEMA)
+_con.close()
+
+
+def _seed_tenant(code: str, categories: dict[str, list[str]]) -> dict:
+    """Create an aikotoba with main/sub categories; return ids keyed by name."""
+    from sqlalchemy import text
+
+    from kakeibo.db import ENGINE, ensure_aikotoba_schema
+
+    ensure_aikotoba_schema()
+    with ENGINE.begin() as conn:
+        conn.execute(text("INSERT OR IGNORE INTO aikotoba (code, label) VALUES (:c, :c)"), {"c": code})
+        aid = conn.execute(text("SELECT id FROM aikotoba WHERE code = :c"), {"c": code}).scalar_one()
+        ids = {"aid": aid, "main": {}, "sub": {}}
+        for main_name, sub_names in categories.items():
+            mid = conn.execute(
+                text("INSERT INTO main_categories (name, aikotoba_id) VALUES (:n, :aid)"), {"n": main_name, "aid": aid}
+            ).lastrowid
+            ids["main"][main_name] = mid
+            for sub_name in sub_names:
+                ids["sub"][sub_name] = conn.execute(
+                    text("INSERT INTO sub_categories (main_category_id, name, aikotoba_id) VALUES (:mid, :n, :aid)"),
+                    {"mid": mid, "n": sub_name, "aid": aid},
+                ).lastrowid
+    return ids
+
+
+def _add_transactions(aid: int, rows: list[tuple]) -> None:
+    """Insert ``(sub_category_id, amount, type, date, detail)`` rows for ``aid``."""
+    from sqlalchemy import text
+
+    from kakeibo.db import ENGINE
+
+    with ENGINE.begin() as conn:
+        conn.execute(
+            text(
+                "INSERT INTO transactions (sub_category_id, amount, type, date, detail, aikotoba_id) "
+                "VALUES (:sid, :amount, :type, :date, :detail, :aid)"
+            ),
+            [
+                {"sid": sid, "amount": amount, "type": type_, "date": d, "detail": detail, "aid": aid}
+                for sid, amount, type_, d, detail in rows
+            ],
+        )
+
+
+@pytest.fixture
+def seed_tenant():
+    return _seed_tenant
+
+
+@pytest.fixture
+def add_transactions():
+    return _add_transactions
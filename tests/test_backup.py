@@ -0,0 +1,21 @@
+import os
+import time
+
+from kakeibo import backup
+
+
+def test_superseded_snapshots_outlive_the_reuse_window(seed_tenant, add_transactions):
+    ids = seed_tenant("backup-grace", {"日常": ["食費"]})
+    add_transactions(ids["aid"], [(ids["sub"]["食費"], 100, "支出", "2024-01-01", "")])
+    first = backup.compressed_backup()
+
+    add_transactions(ids["aid"], [(ids["sub"]["食費"], 200, "支出", "2024-01-02", "")])
+    second = backup.compressed_backup()
+    # a download of the first snapshot may still be streaming
+    assert second != first and first.exists()
+
+    stale = time.time() - backup.BACKUP_MAX_AGE_SECONDS - backup.BACKUP_GRACE_SECONDS - 1
+    os.utime(first, (stale, stale))
+    add_transactions(ids["aid"], [(ids["sub"]["食費"], 300, "支出", "2024-01-03", "")])
+    third = backup.compressed_backup()
+    assert not first.exists() and second.exists() and third.exists()
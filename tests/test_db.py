@@ -0,0 +1,224 @@
+import pytest
+from sqlalchemy import text
+
+from kakeibo.db import (
+    ENGINE,
+    get_budget_and_spent_of_month,
+    get_data_version,
+    get_gift_return_summary,
+    get_gift_totals,
+    get_monthly_balance,
+    get_unentered_recurring_transactions,
+    rebuild_monthly_totals,
+)
+
+
+def test_budget_and_spent_uses_half_open_month(seed_tenant, add_transactions):
+    ids = seed_tenant("db-budget", {"日常": ["食費", "日用品"], "趣味": ["本"]})
+    food, daily, book = ids["sub"]["食費"], ids["sub"]["日用品"], ids["sub"]["本"]
+    add_transactions(ids["aid"], [
+        (food, 30000, "予算", "2024-12-01", ""),
+        (food, 1200, "支出", "2024-12-31", "スーパー"),
+        (food, 800, "支出", "2024-12-15", "コンビニ"),
+        (food, 999, "支出", "2025-01-01", "翌月"),
+        (food, 999, "支出", "2024-11-30", "前月"),
+        (daily, 5000, "予算", "2024-12-01", ""),
+        (book, 2000, "支出", "2024-12-10", "日常外"),
+    ])
+
+    spent, budget, rows = get_budget_and_spent_of_month("2024-12", ids["aid"])
+
+    assert budget == {"日用品": 5000, "食費": 30000}
+    assert spent == {"食費": 2000}
+    assert rows == [("日用品", 5000, 0), ("食費", 30000, 2000)]
+
+
+def test_budget_without_tenant_counts_every_daily_category(seed_tenant, add_transactions):
+    first = seed_tenant("db-budget-all-a", {"日常": ["食費"]})
+    second = seed_tenant("db-budget-all-b", {"日常": ["外食"]})
+    add_transactions(first["aid"], [(first["sub"]["食費"], 700, "支出", "2031-02-03", "")])
+    add_transactions(second["aid"], [(second["sub"]["外食"], 900, "支出", "2031-02-04", "")])
+
+    spent, _, _ = get_budget_and_spent_of_month("2031-02")
+
+    assert spent == {"外食": 900, "食費": 700}
+    # a 日常 category created later is picked up without a restart
+    third = seed_tenant("db-budget-all-c", {"日常": ["日用品"]})
+    add_transactions(third["aid"], [(third["sub"]["日用品"], 300, "支出", "2031-02-05", "")])
+    assert get_budget_and_spent_of_month("2031-02")[0] == {"外食": 900, "日用品": 300, "食費": 700}
+
+
+@pytest.mark.parametrize("month", ["2024-13", "2024", "24-05-01", "abc", ""])
+def test_budget_rejects_malformed_month(month):
+    with pytest.raises(ValueError):
+        get_budget_and_spent_of_month(month)
+
+
+def test_unentered_recurring_is_latest_per_detail_within_tenant(seed_tenant, add_transactions):
+    ids = seed_tenant("db-recurring", {"定期": ["家賃", "サブスク"], "日常": ["食費"]})
+    other = seed_tenant("db-recurring-other", {"定期": ["家賃"]})
+    rent, subs, food = ids["sub"]["家賃"], ids["sub"]["サブスク"], ids["sub"]["食費"]
+    add_transactions(ids["aid"], [
+        (rent, 80000, "支出", "2024-04-27", "家賃"),
+        (rent, 82000, "支出", "2024-05-27", "家賃"),
+        (subs, 990, "支出", "2024-05-03", "動画"),
+        (food, 500, "支出", "2024-06-01", "家賃"),  # same detail outside 定期
+    ])
+    add_transactions(other["aid"], [(other["sub"]["家賃"], 1, "支出", "2024-09-01", "家賃")])
+
+    latest = {r.detail: (r.date, r.amount) for r in get_unentered_recurring_transactions(ids["aid"])}
+
+    assert latest == {"家賃": ("2024-05-27", 82000), "動画": ("2024-05-03", 990)}
+
+
+def _rollup(aid):
+    with ENGINE.connect() as conn:
+        return {
+            (r.month, r.type): (r.total, r.row_count)
+            for r in conn.execute(
+                text("SELECT month, type, total, row_count FROM monthly_totals WHERE aikotoba_id = :aid"), {"aid": aid}
+            )
+        }
+
+
+def test_monthly_totals_follow_writes(seed_tenant, add_transactions):
+    ids = seed_tenant("db-rollup", {"日常": ["食費"]})
+    aid, food = ids["aid"], ids["sub"]["食費"]
+    add_transactions(aid, [
+        (food, 1000, "支出", "2024-01-05", "a"),
+        (food, 500, "支出", "2024-01-20", "b"),
+        (food, 300000, "収入", "2024-01-25", "給与"),
+    ])
+    assert _rollup(aid) == {("2024-01", "支出"): (1500, 2), ("2024-01", "収入"): (300000, 1)}
+
+    with ENGINE.begin() as conn:
+        conn.execute(
+            text("UPDATE transactions SET date = '2024-02-01', amount = 700 WHERE detail = 'b' AND aikotoba_id = :aid"),
+            {"aid": aid},
+        )
+        conn.execute(text("DELETE FROM transactions WHERE detail = '給与' AND aikotoba_id = :aid"), {"aid": aid})
+    assert _rollup(aid) == {("2024-01", "支出"): (1000, 1), ("2024-02", "支出"): (700, 1)}
+
+    before = _rollup(aid)
+    rebuild_monthly_totals()
+    assert _rollup(aid) == before
+
+
+def test_monthly_totals_cleanup_only_touches_the_written_key(seed_tenant, add_transactions):
+    from kakeibo.db import ensure_aikotoba_schema
+
+    ids = seed_tenant("db-rollup-scope", {"日常": ["食費"]})
+    aid, food = ids["aid"], ids["sub"]["食費"]
+    # a database created with the old, table-wide cleanup gets the scoped triggers on boot
+    with ENGINE.begin() as conn:
+        conn.execute(text("DROP TRIGGER trg_monthly_totals_delete"))
+        conn.execute(text(
+            "CREATE TRIGGER trg_monthly_totals_delete AFTER DELETE ON transactions"
+            " BEGIN DELETE FROM monthly_totals WHERE row_count <= 0; END"
+        ))
+    ensure_aikotoba_schema()
+
+    add_transactions(aid, [
+        (food, 100, "支出", "2024-03-01", "a"),
+        (food, 200, "支出", "2024-04-01", "b"),
+        (food, 300, "支出", "2024-05-01", "c"),
+    ])
+    with ENGINE.begin() as conn:
+        # an emptied key of another month is not the trigger's business
+        conn.execute(text("UPDATE monthly_totals SET row_count = 0 WHERE aikotoba_id = :aid AND month = '2024-04'"),
+                     {"aid": aid})
+        conn.execute(text("DELETE FROM transactions WHERE detail = 'a' AND aikotoba_id = :aid"), {"aid": aid})
+        conn.execute(text("UPDATE transactions SET amount = 350 WHERE detail = 'c' AND aikotoba_id = :aid"),
+                     {"aid": aid})
+    assert _rollup(aid) == {("2024-04", "支出"): (200, 0), ("2024-05", "支出"): (350, 1)}
+
+
+def test_engines_apply_connection_profile():
+    import pytest
+    from sqlalchemy.exc import OperationalError
+
+    from kakeibo.db import READ_ENGINE, SQLITE_PROFILE, SQLITE_PROFILES
+
+    assert SQLITE_PROFILE == "balanced"
+    with ENGINE.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == SQLITE_PROFILES["balanced"]["busy_timeout"]
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+    with pytest.raises(OperationalError):
+        with READ_ENGINE.begin() as conn:
+            conn.execute(text("DELETE FROM transactions"))
+
+
+def test_gift_return_summary_matches_returns_by_substring(seed_tenant, add_transactions):
+    ids = seed_tenant("db-gift", {"交際": ["贈与"], "日常": ["食費"]})
+    other = seed_tenant("db-gift-other", {"交際": ["贈与"]})
+    gift, food = ids["sub"]["贈与"], ids["sub"]["食費"]
+    add_transactions(ids["aid"], [
+        (gift, 10000, "収入", "2024-03-01", "結婚祝い"),
+        (gift, 3000, "支出", "2024-03-10", "結婚祝い 内祝い"),
+        (gift, 1000, "支出", "2024-03-12", "結婚祝いお返し"),
+        (gift, 2000, "収入", "2024-04-01", "出産祝い"),
+        (gift, 5000, "支出", "2024-04-05", "出産祝い 内祝い"),
+        (food, 9999, "支出", "2024-04-06", "結婚祝い 食事"),  # not a 贈与 row
+    ])
+    add_transactions(other["aid"], [(other["sub"]["贈与"], 777, "支出", "2024-03-11", "結婚祝い 他人")])
+
+    assert get_gift_totals(ids["aid"]) == [
+        ("出産祝い", 2000, None),
+        ("出産祝い 内祝い", None, 5000),
+        ("結婚祝い", 10000, None),
+        ("結婚祝い 内祝い", None, 3000),
+        ("結婚祝いお返し", None, 1000),
+    ]
+    rows = get_gift_return_summary(ids["aid"])
+
+    assert rows == [
+        {"detail": "出産祝い", "gift_amount": 2000, "return_amount": 5000, "percentage": 100},
+        {"detail": "結婚祝い", "gift_amount": 10000, "return_amount": 4000, "percentage": 40},
+    ]
+
+
+def test_monthly_balance_and_pandas_adapter_agree(seed_tenant, add_transactions):
+    from kakeibo.frames import get_monthly_summary
+
+    ids = seed_tenant("db-balance", {"日常": ["食費"]})
+    food = ids["sub"]["食費"]
+    add_transactions(ids["aid"], [
+        (food, 5000, "収入", "2024-02-01", ""),
+        (food, 1500, "支出", "2024-02-10", ""),
+        (food, 9999, "予算", "2024-03-01", ""),
+        (food, 700, "支出", "2024-04-03", ""),
+        (food, 1, "支出", "2023-09-30", "before the cutoff"),
+    ])
+
+    rows = get_monthly_balance(ids["aid"])
+    assert rows == [
+        ("2024-02", 5000, 1500, 3500, 3500),
+        ("2024-03", 0, 0, 0, 3500),
+        ("2024-04", 0, 700, -700, 2800),
+    ]
+    df = get_monthly_summary(ids["aid"])
+    assert list(df.index.strftime("%Y-%m")) == [r[0] for r in rows]
+    assert df["累計資産"].tolist() == [r[4] for r in rows]
+
+
+def test_data_version_follows_writes_per_tenant(seed_tenant, add_transactions):
+    a = seed_tenant("db-version-a", {"日常": ["食費"]})
+    b = seed_tenant("db-version-b", {"日常": ["食費"]})
+    va, vb = get_data_version(a["aid"]), get_data_version(b["aid"])
+
+    add_transactions(a["aid"], [(a["sub"]["食費"], 100, "支出", "2024-01-01", "")])
+    assert get_data_version(a["aid"]) > va
+    assert get_data_version(b["aid"]) == vb
+
+    # moving a row between tenants invalidates both
+    va, vb = get_data_version(a["aid"]), get_data_version(b["aid"])
+    with ENGINE.begin() as conn:
+        conn.execute(text("UPDATE transactions SET aikotoba_id = :b WHERE aikotoba_id = :a"), {"a": a["aid"], "b": b["aid"]})
+    assert get_data_version(a["aid"]) > va and get_data_version(b["aid"]) > vb
+
+    # tenant-less rows (legacy Streamlit inserts) count for everyone
+    va, vb = get_data_version(a["aid"]), get_data_version(b["aid"])
+    with ENGINE.begin() as conn:
+        conn.execute(text("INSERT INTO main_categories (name) VALUES ('共有')"))
+    assert get_data_version(a["aid"]) > va and get_data_version(b["aid"]) > vb
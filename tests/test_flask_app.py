@@ -0,0 +1,434 @@
+import pytest
+from sqlalchemy import text
+
+from kakeibo.db import ENGINE, READ_ENGINE
+
+
+@pytest.fixture
+def client_for(seed_tenant):
+    """Return a logged-in test client bound to a freshly seeded aikotoba."""
+    from flask_app import app
+
+    def _make(code):
+        ids = seed_tenant(code, {"日常": ["食費"], "定期": ["家賃"], "交際": ["贈与"]})
+        username = f"user:{code}"
+        with ENGINE.begin() as conn:
+            conn.execute(
+                text("INSERT OR IGNORE INTO users (username, password, aikotoba_id) VALUES (:u, 'external', :aid)"),
+                {"u": username, "aid": ids["aid"]},
+            )
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["auth_user"] = username
+        return client, ids
+
+    return _make
+
+
+def test_sidebar_cache_hits_until_a_write(client_for):
+    from flask_app import _SIDEBAR_CACHE
+
+    client, ids = client_for("flask-cache")
+    _SIDEBAR_CACHE.clear()
+    client.get("/add?month=2024-05")
+    misses = _SIDEBAR_CACHE.misses
+    hits = _SIDEBAR_CACHE.hits
+    client.get("/edit?month=2024-05")
+    client.get("/categories?month=2024-05")
+    assert _SIDEBAR_CACHE.misses == misses
+    assert _SIDEBAR_CACHE.hits == hits + 2
+
+    res = client.post("/api/transactions", json={
+        "sub_category_id": ids["sub"]["食費"], "date": "2024-05-02", "type": "予算", "amount": 40000,
+    })
+    assert res.status_code == 201
+    client.get("/add?month=2024-05")
+    assert _SIDEBAR_CACHE.misses == misses + 1
+
+    stats = client.get("/api/cache/stats").get_json()["sidebar"]
+    assert 0 < stats["hit_rate"] < 1
+
+
+def test_malformed_month_shows_no_budget_progress(client_for):
+    client, _ = client_for("flask-bad-month")
+    for month in ("2024-13", "garbage", "2024-5-1x"):
+        assert client.get(f"/add?month={month}").status_code == 200
+
+
+def _statements_during(fn):
+    from sqlalchemy import event
+
+    seen = []
+
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        seen.append(statement.strip().split(None, 1)[0].upper())
+
+    for engine in (ENGINE, READ_ENGINE):
+        event.listen(engine, "before_cursor_execute", _before)
+    try:
+        fn()
+    finally:
+        for engine in (ENGINE, READ_ENGINE):
+            event.remove(engine, "before_cursor_execute", _before)
+    return seen
+
+
+def test_get_requests_never_write(client_for):
+    client, _ = client_for("flask-readonly")
+    for url in ("/add", "/edit?main_category_id=1", "/api/transactions", "/api/sub_categories", "/aikotoba"):
+        verbs = _statements_during(lambda: client.get(url))
+        assert not {"INSERT", "UPDATE", "DELETE", "REPLACE"} & set(verbs), (url, verbs)
+
+
+def test_join_and_leave_refresh_session_aikotoba(client_for):
+    client, ids = client_for("flask-join")
+    client.get("/add")
+    with client.session_transaction() as sess:
+        assert sess["aikotoba_id"] == ids["aid"]
+
+    client.post("/aikotoba/leave")
+    with client.session_transaction() as sess:
+        public_id = sess["aikotoba_id"]
+        assert public_id != ids["aid"]
+
+    client.post("/aikotoba/join", data={"code": "flask-join"})
+    with client.session_transaction() as sess:
+        assert sess["aikotoba_id"] == ids["aid"]
+
+
+def test_api_transactions_keyset_pages_cover_everything(client_for, add_transactions):
+    client, ids = client_for("flask-pages")
+    food = ids["sub"]["食費"]
+    add_transactions(ids["aid"], [
+        (food, (i * 37) % 1000, "支出", f"2024-{(i % 6) + 1:02d}-{(i % 3) + 1:02d}", f"row{i}") for i in range(53)
+    ])
+    full = client.get("/api/transactions").get_json()
+    assert len(full) == 53
+
+    for sort, direction in (("date", "desc"), ("amount", "asc"), ("id", "desc")):
+        seen, cursor, first = [], None, True
+        while True:
+            url = f"/api/transactions?limit=10&sort={sort}&dir={direction}"
+            res = client.get(url + (f"&cursor={cursor}" if cursor else ""))
+            assert res.status_code == 200
+            if first:
+                assert res.headers["X-Total-Count"] == "53"
+                first = False
+            seen.extend(res.get_json())
+            cursor = res.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        assert sorted(r["id"] for r in seen) == sorted(r["id"] for r in full)
+        keys = [(r[sort], r["id"]) for r in seen]
+        assert keys == sorted(keys, reverse=(direction == "desc"))
+
+    assert client.get("/api/transactions?limit=5&q=row1").headers["X-Total-Count"] == "11"
+    assert client.get("/api/transactions?limit=5&cursor=garbage").status_code == 400
+    assert client.get("/api/transactions?sort=detail").status_code == 400
+
+
+def test_export_streams_csv_ndjson_and_gzip(client_for, add_transactions):
+    import csv
+    import gzip
+    import io
+    import json
+
+    client, ids = client_for("flask-export")
+    food = ids["sub"]["食費"]
+    add_transactions(ids["aid"], [(food, i, "支出", f"2024-03-{(i % 28) + 1:02d}", f"品目,{i}") for i in range(1200)])
+
+    res = client.get("/api/transactions/export?format=csv&start_date=2024-03-01")
+    assert res.status_code == 200 and res.mimetype == "text/csv"
+    rows = list(csv.reader(io.StringIO(res.get_data(as_text=True).lstrip("﻿"))))
+    assert rows[0][:3] == ["id", "date", "main_category_name"]
+    assert len(rows) == 1201
+    assert {r[7] for r in rows[1:]} >= {"品目,0", "品目,1199"}
+
+    res = client.get("/api/transactions/export?format=ndjson&gzip=1")
+    assert res.mimetype == "application/gzip"
+    lines = gzip.decompress(res.get_data()).decode("utf-8").splitlines()
+    assert len(lines) == 1200
+    assert json.loads(lines[0])["sub_category_name"] == "食費"
+
+    assert client.get("/api/transactions/export?format=xml").status_code == 400
+
+
+def test_csv_import_skips_duplicates_and_reports_errors(client_for):
+    import io
+
+    client, ids = client_for("flask-import")
+    _, other = client_for("flask-import-other")
+    body = (
+        "日付,金額,内容,カテゴリ\n"
+        "2024/06/01,\"1,200\",ランチ,食費\n"
+        "2024-06-02,-3000,家賃振込,家賃\n"
+        "2024-06-01,1200,ランチ,食費\n"  # same row repeated in the file
+        "2024-13-01,500,bad date,食費\n"
+        "2024-06-03,500,unknown,存在しない\n"
+        "2024-06-04,inf,overflow,食費\n"
+        "2024-06-04,1e400,overflow,食費\n"
+    ).encode("utf-8-sig")
+    form = {"mapping": '{"date": "日付", "amount": "金額", "detail": "内容", "sub_category": "カテゴリ"}'}
+
+    res = client.post("/api/transactions/import",
+                      data={**form, "file": (io.BytesIO(body), "bank.csv")}, content_type="multipart/form-data")
+    assert res.status_code == 200
+    result = res.get_json()
+    assert (result["rows"], result["inserted"], result["duplicates"], result["error_count"]) == (7, 2, 1, 4)
+    assert [e["line"] for e in result["errors"]] == [5, 6, 7, 8]
+
+    rows = client.get("/api/transactions?sort=date&dir=asc").get_json()
+    assert [(r["date"], r["amount"], r["type"]) for r in rows] == [("2024-06-01", 1200, "支出"), ("2024-06-02", 3000, "支出")]
+
+    again = client.post("/api/transactions/import",
+                        data={**form, "file": (io.BytesIO(body), "bank.csv")}, content_type="multipart/form-data")
+    assert again.get_json()["inserted"] == 0
+    assert again.get_json()["duplicates"] == 3
+
+    # ids of another aikotoba's sub categories are rejected
+    foreign = f"date,amount,sub_category_id\n2024-06-05,100,{other['sub']['食費']}\n".encode()
+    res = client.post("/api/transactions/import",
+                      data={"mapping": '{"sub_category_id": "sub_category_id"}',
+                            "file": (io.BytesIO(foreign), "ids.csv")}, content_type="multipart/form-data")
+    assert res.get_json()["inserted"] == 0
+    assert res.get_json()["error_count"] == 1
+
+
+def test_batch_applies_all_ops_in_one_commit(client_for):
+    client, ids = client_for("flask-batch")
+    _, other = client_for("flask-batch-other")
+    food, rent = ids["sub"]["食費"], ids["sub"]["家賃"]
+    seed = client.post("/api/transactions/batch", json={"ops": [
+        {"op": "create", "ref": f"r{i}", "data": {"sub_category_id": food, "date": "2024-07-01",
+                                                   "type": "支出", "amount": 100 + i}}
+        for i in range(3)
+    ]}).get_json()
+    assert [c["ref"] for c in seed["created"]] == ["r0", "r1", "r2"]
+    new_ids = [c["id"] for c in seed["created"]]
+    rows = {r["id"]: r for r in client.get("/api/transactions").get_json()}
+    assert [rows[i]["amount"] for i in new_ids] == [100, 101, 102]
+
+    commits = []
+    from sqlalchemy import event
+
+    def _commit(conn):
+        commits.append(1)
+
+    event.listen(ENGINE, "commit", _commit)
+    try:
+        res = client.post("/api/transactions/batch", json={"ops": [
+            {"op": "update", "id": new_ids[0], "data": {"amount": "500"}},
+            {"op": "update", "id": new_ids[1], "data": {"amount": 600}},
+            {"op": "update", "id": new_ids[1], "data": {"sub_category_id": rent, "detail": "moved"}},
+            {"op": "delete", "id": new_ids[2]},
+            {"op": "create", "ref": "x", "data": {"sub_category_id": rent, "date": "2024-07-02",
+                                                  "type": "支出", "amount": 9}},
+        ]})
+    finally:
+        event.remove(ENGINE, "commit", _commit)
+    assert res.status_code == 200
+    body = res.get_json()
+    assert (body["updated"], body["deleted"], len(body["created"])) == (3, 1, 1)
+    assert len(commits) == 1
+
+    rows = {r["id"]: r for r in client.get("/api/transactions").get_json()}
+    assert rows[new_ids[0]]["amount"] == 500
+    assert (rows[new_ids[1]]["amount"], rows[new_ids[1]]["detail"]) == (600, "moved")
+    assert new_ids[2] not in rows and body["created"][0]["id"] in rows
+
+    # invalid ops or foreign sub categories reject the whole batch
+    before = client.get("/api/transactions").get_json()
+    for ops in (
+        [{"op": "update", "id": new_ids[0], "data": {"amount": 1}}, {"op": "upsert", "id": 1}],
+        [{"op": "update", "id": new_ids[0], "data": {"amount": 1}},
+         {"op": "create", "data": {"sub_category_id": other["sub"]["食費"], "date": "2024-07-03",
+                                   "type": "支出", "amount": 1}}],
+        [],
+        [{"op": "delete", "id": True}],
+        [{"op": "update", "id": new_ids[0], "data": [1]}],
+        [{"op": "create", "data": "amount=1"}],
+    ):
+        assert client.post("/api/transactions/batch", json={"ops": ops}).status_code == 400
+    assert client.get("/api/transactions").get_json() == before
+
+    # type and date are checked per op and the error names the offending op
+    for op, message in (
+        ({"op": "update", "id": new_ids[0], "data": {"type": "寄付"}}, "ops[1]: type"),
+        ({"op": "create", "data": {"sub_category_id": rent, "date": "2024-13-01",
+                                   "type": "支出", "amount": 1}}, "ops[1]: date"),
+        ({"op": "update", "id": new_ids[0], "data": {"date": "07/02/2024"}}, "ops[1]: date"),
+    ):
+        res = client.post("/api/transactions/batch", json={"ops": [
+            {"op": "update", "id": new_ids[0], "data": {"amount": 1}}, op,
+        ]})
+        assert res.status_code == 400 and message in res.get_json()["error"]
+    assert client.get("/api/transactions").get_json() == before
+
+
+def test_graph_data_endpoint_revalidates_with_etag(client_for, add_transactions):
+    import sys
+
+    client, ids = client_for("flask-graphs")
+    food = ids["sub"]["食費"]
+    add_transactions(ids["aid"], [
+        (food, 1000, "収入", "2024-01-05", ""),
+        (food, 300, "支出", "2024-01-20", ""),
+        (food, 200, "支出", "2024-03-02", ""),
+    ])
+
+    page = client.get("/graphs")
+    assert page.status_code == 200
+    assert b"api/graphs/monthly" in page.data
+    assert "altair" not in sys.modules
+
+    res = client.get("/api/graphs/monthly")
+    assert res.status_code == 200 and res.headers["ETag"] and res.headers["Last-Modified"]
+    assert res.get_json()["rows"] == [["2024-01", 1000, 300, 700, 700], ["2024-03", 0, 200, -200, 500]]
+    ranged = client.get("/api/graphs/monthly?start=2024-02&end=2024-12").get_json()["rows"]
+    assert ranged == [["2024-03", 0, 200, -200, 500]]
+
+    cached = client.get("/api/graphs/monthly", headers={"If-None-Match": res.headers["ETag"]})
+    assert cached.status_code == 304 and not cached.data
+
+    client.post("/api/transactions", json={"sub_category_id": food, "date": "2024-03-09", "type": "支出", "amount": 1})
+    fresh = client.get("/api/graphs/monthly", headers={"If-None-Match": res.headers["ETag"]})
+    assert fresh.status_code == 200
+    assert fresh.get_json()["rows"][-1] == ["2024-03", 0, 201, -201, 499]
+
+
+def test_json_apis_answer_conditional_gets_with_304(client_for, add_transactions):
+    client, ids = client_for("flask-etag")
+    _, other = client_for("flask-etag-other")
+    add_transactions(ids["aid"], [(ids["sub"]["食費"], 100, "支出", "2024-01-01", "")])
+
+    for url in ("/api/transactions?limit=50", "/api/sub_categories"):
+        first = client.get(url)
+        etag = first.headers["ETag"]
+        assert first.status_code == 200 and etag
+
+        res = None
+
+        def _get():
+            nonlocal res
+            res = client.get(url, headers={"If-None-Match": etag})
+
+        statements = _statements_during(_get)
+        assert res.status_code == 304 and not res.data
+        assert statements == ["SELECT"]  # the data_versions lookup only
+        assert res.headers["ETag"] == etag
+
+        # another tenant's writes do not invalidate ...
+        add_transactions(other["aid"], [(other["sub"]["食費"], 1, "支出", "2024-01-02", "")])
+        assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+        # ... this tenant's do, even when written outside the Flask process
+        add_transactions(ids["aid"], [(ids["sub"]["食費"], 1, "支出", "2024-01-03", "")])
+        fresh = client.get(url, headers={"If-None-Match": etag})
+        assert fresh.status_code == 200 and fresh.headers["ETag"] != etag
+
+
+def test_download_db_serves_a_consistent_compressed_snapshot(client_for, add_transactions, tmp_path):
+    import gzip
+    import sqlite3
+
+    client, ids = client_for("flask-backup")
+    add_transactions(ids["aid"], [(ids["sub"]["食費"], 100, "支出", "2024-01-01", "")])
+
+    res = client.get("/download_db")
+    assert res.status_code == 200
+    assert res.headers["Content-Disposition"].endswith("kakeibo.db.gz")
+    restored = tmp_path / "restored.db"
+    restored.write_bytes(gzip.decompress(res.data))
+    con = sqlite3.connect(restored)
+    try:
+        assert con.execute("PRAGMA integrity_check").fetchone() == ("ok",)
+        count = con.execute("SELECT COUNT(*) FROM transactions WHERE aikotoba_id = ?", (ids["aid"],)).fetchone()
+        assert count == (1,)
+    finally:
+        con.close()
+
+    # the same snapshot is reused, so ranges line up
+    etag = res.headers["ETag"]
+    part = client.get("/download_db", headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert part.status_code == 206 and part.data == res.data[:10]
+    assert client.get("/download_db", headers={"If-None-Match": etag}).status_code == 304
+
+    add_transactions(ids["aid"], [(ids["sub"]["食費"], 1, "支出", "2024-01-02", "")])
+    assert client.get("/download_db", headers={"If-None-Match": etag}).status_code == 200
+    assert client.get("/download_db?codec=bogus").status_code == 400
+
+
+def test_dev_console_pages_results(client_for):
+    client, _ = client_for("flask-dev-console")
+    sql = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 30) SELECT i FROM n"
+    res = client.post("/dev", data={"sql_query": sql, "row_limit": "10", "page": "2"})
+    html = res.get_data(as_text=True)
+    assert res.status_code == 200
+    assert "<td>11</td>" in html and "<td>10</td>" not in html and "<td>21</td>" not in html
+    assert "前へ" in html and "次へ" in html and "EXPLAIN QUERY PLAN" in html
+
+
+def test_metrics_count_requests_and_queries_per_route(client_for):
+    from flask_app import app
+    from kakeibo import metrics
+
+    client, _ = client_for("flask-metrics")
+    route = "/api/transactions"
+    before = metrics.QUERIES_PER_REQUEST.count(route)
+    assert client.get("/api/transactions?limit=5").status_code == 200
+    assert metrics.QUERIES_PER_REQUEST.count(route) == before + 1
+    assert metrics.REQUESTS.value(route, "GET", "200") >= 1
+
+    # no login needed, like /health
+    res = app.test_client().get("/metrics")
+    body = res.get_data(as_text=True)
+    assert res.status_code == 200 and res.mimetype == "text/plain"
+    assert "# TYPE kakeibo_http_request_duration_seconds histogram" in body
+    assert f'kakeibo_http_request_duration_seconds_bucket{{route="{route}",method="GET",le="+Inf"}}' in body
+    assert f'kakeibo_sql_query_duration_seconds_count{{route="{route}"}}' in body
+    assert f'kakeibo_db_connection_checkouts_total{{route="{route}"}}' in body
+
+
+def test_dev_view_aggregates_slow_queries_by_fingerprint(monkeypatch, client_for):
+    from kakeibo import slowlog
+
+    client, _ = client_for("flask-slowlog")
+    monkeypatch.setattr(slowlog, "threshold_ms", 0.0)
+    slowlog.BUFFER.clear()
+
+    client.get("/api/transactions?limit=5")
+    client.get("/api/transactions?limit=7")
+    listing = [g for g in slowlog.aggregate() if "flask_app.api_get_transactions.<locals>.build" in g["callers"]]
+    assert listing and listing[0]["count"] == 2 and listing[0]["routes"] == ["/api/transactions"]
+
+    html = client.get("/dev").get_data(as_text=True)
+    assert "スロークエリ" in html and "flask_app.api_get_transactions" in html
+
+
+def test_database_locked_maps_to_503(client_for, monkeypatch):
+    import sqlite3
+
+    from sqlalchemy.exc import OperationalError
+
+    import flask_app
+    from kakeibo import metrics
+
+    client, _ = client_for("flask-locked")
+
+    def _locked(*args, **kwargs):
+        raise OperationalError("SELECT 1", {}, sqlite3.OperationalError("database is locked"))
+
+    monkeypatch.setattr(flask_app, "get_data_version_stamp", _locked)
+    before = metrics.LOCKED_ERRORS.value("/api/graphs/monthly")
+    res = client.get("/api/graphs/monthly")
+    assert res.status_code == 503 and res.headers["Retry-After"] == "1"
+    assert res.get_json() == {"error": "Database is busy, please retry"}
+    assert metrics.LOCKED_ERRORS.value("/api/graphs/monthly") == before + 1
+
+    monkeypatch.setattr(flask_app, "get_categories", _locked)
+    assert client.get("/add").status_code == 503
+
+    def _broken(*args, **kwargs):
+        raise OperationalError("SELECT 1", {}, sqlite3.OperationalError("no such table: nope"))
+
+    monkeypatch.setattr(flask_app, "get_categories", _broken)
+    assert client.get("/add").status_code == 500
@@ -0,0 +1,44 @@
+"""Cold-start budget: importing flask_app must stay light.
+
+Measured in a fresh interpreter (this process already has everything loaded).
+The millisecond budget is deliberately loose for slow CI machines; override it
+with KAKEIBO_IMPORT_BUDGET_MS. The module list is the stable signal.
+"""
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+IMPORT_BUDGET_MS = float(os.environ.get("KAKEIBO_IMPORT_BUDGET_MS", 1500))
+MODULE_BUDGET = 600
+FORBIDDEN = ("pandas", "numpy", "streamlit", "altair", "pyarrow", "requests")
+
+_PROBE = """
+import json, sys, time
+t = time.perf_counter()
+import flask_app
+ms = (time.perf_counter() - t) * 1000
+print(json.dumps({"ms": ms, "modules": sorted(sys.modules)}))
+"""
+
+
+def _probe(tmp_path):
+    env = dict(os.environ, KAKEIBO_DATA_DIR=str(tmp_path), PYTHONPATH=str(REPO_ROOT))
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE], cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def test_flask_app_import_budget(tmp_path):
+    # best of three: the first run may also be writing .pyc files
+    runs = [_probe(tmp_path) for _ in range(3)]
+    modules = set(runs[-1]["modules"])
+
+    assert not [m for m in FORBIDDEN if m in modules]
+    assert len(modules) <= MODULE_BUDGET, len(modules)
+    assert min(r["ms"] for r in runs) <= IMPORT_BUDGET_MS, [round(r["ms"]) for r in runs]
+    # nothing is written at import: no seed copy, no schema bootstrap
+    assert not (tmp_path / "kakeibo.db").exists()
@@ -0,0 +1,172 @@
+"""Guard the hot read paths against full table scans.
+
+Every SELECT issued by the tenant-scoped hot paths is captured from the engine
+and re-run through EXPLAIN QUERY PLAN. A bare ``SCAN <table>`` (i.e. not
+``SCAN ... USING INDEX``) means an index from ``_INDEXES`` is missing or unused.
+"""
+import re
+from datetime import date
+
+import pytest
+from sqlalchemy import event, text
+
+from kakeibo.db import (
+    ENGINE,
+    READ_ENGINE,
+    ensure_aikotoba_schema,
+    get_budget_and_spent_of_month,
+    get_categories,
+    get_gift_return_summary,
+    get_monthly_summary,
+    get_unentered_recurring_transactions,
+)
+
+_SUBQUERY_RE = re.compile(r"^(?:MATERIALIZE|CO-ROUTINE) (\S+)")
+_SCAN_RE = re.compile(r"^SCAN (\S+)(.*)$")
+
+
+@pytest.fixture(scope="module")
+def tenant():
+    ensure_aikotoba_schema()
+    with ENGINE.begin() as conn:
+        conn.execute(text("INSERT OR IGNORE INTO aikotoba (code, label) VALUES ('plan-test', 'plan-test')"))
+        aid = conn.execute(text("SELECT id FROM aikotoba WHERE code = 'plan-test'")).scalar_one()
+        # a realistic spread of tenants/categories so the planner sees non-trivial tables
+        for n in range(5):
+            conn.execute(text("INSERT OR IGNORE INTO aikotoba (code) VALUES (:c)"), {"c": f"plan-other-{n}"})
+            owner = aid if n == 0 else conn.execute(
+                text("SELECT id FROM aikotoba WHERE code = :c"), {"c": f"plan-other-{n}"}
+            ).scalar_one()
+            for i in range(8):
+                other = conn.execute(
+                    text("INSERT INTO main_categories (name, aikotoba_id) VALUES (:name, :aid)"),
+                    {"name": f"main{i}", "aid": owner},
+                ).lastrowid
+                conn.execute(
+                    text("INSERT INTO sub_categories (main_category_id, name, aikotoba_id) VALUES (:mid, :name, :aid)"),
+                    [{"mid": other, "name": f"sub{i}-{j}", "aid": owner} for j in range(5)],
+                )
+        mid = conn.execute(
+            text("INSERT INTO main_categories (name, aikotoba_id) VALUES ('日常', :aid)"), {"aid": aid}
+        ).lastrowid
+        sid = conn.execute(
+            text("INSERT INTO sub_categories (main_category_id, name, aikotoba_id) VALUES (:mid, '食費', :aid)"),
+            {"mid": mid, "aid": aid},
+        ).lastrowid
+        rows = [
+            {"sid": sid, "amount": 100 + i, "type": ("支出", "収入", "予算")[i % 3],
+             "date": f"2024-{(i % 12) + 1:02d}-{(i % 28) + 1:02d}", "detail": f"row{i}", "aid": aid}
+            for i in range(300)
+        ]
+        conn.execute(
+            text(
+                "INSERT INTO transactions (sub_category_id, amount, type, date, detail, aikotoba_id) "
+                "VALUES (:sid, :amount, :type, :date, :detail, :aid)"
+            ),
+            rows,
+        )
+        conn.execute(
+            text("INSERT OR IGNORE INTO users (username, password, aikotoba_id) VALUES ('plan-user', 'external', :aid)"),
+            {"aid": aid},
+        )
+        conn.execute(text("ANALYZE"))
+    return {"aid": aid, "main_category_id": mid, "sub_category_id": sid}
+
+
+def _capture_selects(fn):
+    captured = []
+
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            captured.append((statement, parameters))
+
+    for engine in (ENGINE, READ_ENGINE):
+        event.listen(engine, "before_cursor_execute", _before)
+    try:
+        fn()
+    finally:
+        for engine in (ENGINE, READ_ENGINE):
+            event.remove(engine, "before_cursor_execute", _before)
+    return captured
+
+
+def _table_scans(statement, parameters):
+    raw = ENGINE.raw_connection()
+    try:
+        cur = raw.cursor()
+        cur.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        details = [row[3] for row in cur.fetchall()]
+    finally:
+        raw.close()
+    subqueries = {m.group(1) for d in details if (m := _SUBQUERY_RE.match(d))}
+    # aliases of materialized CTEs ("FROM totals g") are scanned under the alias
+    subqueries |= {
+        alias
+        for name in list(subqueries)
+        for alias in re.findall(rf"(?:FROM|JOIN)\s+{re.escape(name)}\s+(?:AS\s+)?(\w+)", statement, re.I)
+    }
+    scans = []
+    for d in details:
+        m = _SCAN_RE.match(d)
+        if m and m.group(1) not in subqueries and m.group(1) != "CONSTANT" and "USING" not in m.group(2):
+            scans.append(d)
+    return scans
+
+
+def _assert_no_scans(captured):
+    assert captured, "no queries captured"
+    offenders = [(stmt.strip(), scans) for stmt, params in captured if (scans := _table_scans(stmt, params))]
+    assert not offenders, offenders
+
+
+def test_indexes_created(tenant):
+    with ENGINE.connect() as conn:
+        names = {r[0] for r in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'"))}
+    for expected in (
+        "idx_transactions_aikotoba_date",
+        "idx_transactions_sub_category_date",
+        "idx_transactions_aikotoba_type_date",
+        "idx_sub_categories_main_aikotoba",
+        "idx_transactions_aikotoba_detail_date",
+    ):
+        assert expected in names
+
+
+def test_db_hot_queries_use_indexes(tenant):
+    aid = tenant["aid"]
+    month = date(2024, 3, 1).strftime("%Y-%m")
+    _assert_no_scans(_capture_selects(lambda: get_budget_and_spent_of_month(month, aid)))
+    _assert_no_scans(_capture_selects(lambda: get_monthly_summary(aikotoba_id=aid)))
+    _assert_no_scans(_capture_selects(lambda: get_categories(aikotoba_id=aid)))
+    _assert_no_scans(_capture_selects(lambda: get_unentered_recurring_transactions(aid)))
+    _assert_no_scans(_capture_selects(lambda: get_gift_return_summary(aid)))
+
+
+def test_api_transactions_uses_indexes(tenant):
+    from flask_app import app
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["auth_user"] = "plan-user"
+    urls = [
+        "/api/transactions",
+        f"/api/transactions?main_category_id={tenant['main_category_id']}&sub_category_id={tenant['sub_category_id']}",
+        "/api/transactions?start_date=2024-02-01&end_date=2024-04-30",
+        "/api/transactions?limit=50",
+    ]
+    for url in urls:
+        captured = _capture_selects(lambda: client.get(url))
+        _assert_no_scans([c for c in captured if "FROM transactions" in c[0]])
+
+
+def test_unentered_recurring_groups_on_the_detail_index(tenant):
+    captured = _capture_selects(lambda: get_unentered_recurring_transactions(tenant["aid"]))
+    raw = ENGINE.raw_connection()
+    try:
+        cur = raw.cursor()
+        cur.execute(f"EXPLAIN QUERY PLAN {captured[0][0]}", captured[0][1])
+        details = [row[3] for row in cur.fetchall()]
+    finally:
+        raw.close()
+    assert any("idx_transactions_aikotoba_detail_date" in d for d in details), details
+    assert not any("TEMP B-TREE" in d for d in details), details
@@ -0,0 +1,46 @@
+from kakeibo import slowlog
+
+
+def test_fingerprint_groups_queries_by_shape():
+    a = slowlog.fingerprint("SELECT * FROM t\n  WHERE 1=1 AND date >= '2024-01-01' AND id IN (?, ?, ?)")
+    b = slowlog.fingerprint("SELECT * FROM t WHERE 1=1 AND date >= 'it''s' AND id IN (?)")
+    assert a == b == "SELECT * FROM t WHERE ?=? AND date >= ? AND id IN (?...)"
+    assert slowlog.fingerprint("INSERT INTO t VALUES (?, ?), (?, ?), (?, ?)") == "INSERT INTO t VALUES (?, ?), ..."
+    assert slowlog.fingerprint("SELECT * FROM idx_2 WHERE a = :aid LIMIT 10") == "SELECT * FROM idx_2 WHERE a = ? LIMIT ?"
+
+
+def test_param_shape_records_types_only():
+    assert slowlog.param_shape(("x", 1, None)) == "(str, int, null)"
+    assert slowlog.param_shape({"aid": 1}) == "{aid: int}"
+    assert slowlog.param_shape([(1, "a"), (2, "b")], executemany=True) == "2 x (int, str)"
+
+
+
+def test_slow_queries_record_the_calling_function(monkeypatch, seed_tenant):
+    from kakeibo.db import get_unentered_recurring_transactions
+
+    ids = seed_tenant("slowlog", {"定期": ["家賃"]})
+    monkeypatch.setattr(slowlog, "threshold_ms", 0.0)
+    slowlog.BUFFER.clear()
+
+    get_unentered_recurring_transactions(ids["aid"])
+    assert {e["caller"] for e in slowlog.BUFFER} == {"kakeibo.db.get_unentered_recurring_transactions"}
+    assert all(e["route"] is None for e in slowlog.BUFFER)
+
+
+def test_caller_skips_library_frames_in_a_venv_under_the_repo_root(monkeypatch, seed_tenant):
+    from pathlib import Path
+
+    import sqlalchemy
+
+    from kakeibo.db import get_unentered_recurring_transactions
+
+    # like the image: /app is the root and the venv's site-packages lives below it
+    site_packages = Path(sqlalchemy.__file__).resolve().parent.parent
+    monkeypatch.setattr(slowlog, "_REPO_ROOT", str(site_packages.parent))
+    ids = seed_tenant("slowlog-venv", {"定期": ["家賃"]})
+    monkeypatch.setattr(slowlog, "threshold_ms", 0.0)
+    slowlog.BUFFER.clear()
+
+    get_unentered_recurring_transactions(ids["aid"])
+    assert {e["caller"] for e in slowlog.BUFFER} == {"kakeibo.db.get_unentered_recurring_transactions"}
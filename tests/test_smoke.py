@@ -24,8 +24,8 @@ def test_aggregations_dont_crash():
     from datetime import datetime
 
     ym = datetime.now().strftime("%Y-%m")
-    spent, budget, df = get_budget_and_spent_of_month(ym)
-    assert isinstance(df, pd.DataFrame)
+    spent, budget, rows = get_budget_and_spent_of_month(ym)
+    assert isinstance(spent, dict) and isinstance(budget, dict)
 
     md = get_monthly_summary()
     assert isinstance(md, pd.DataFrame)
@@ -0,0 +1,52 @@
+import pytest
+
+from kakeibo import sql_console
+
+_COUNT_TO = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < {}) SELECT i FROM n"
+
+
+def test_reads_are_paged_and_instrumented(seed_tenant, add_transactions):
+    ids = seed_tenant("console", {"日常": ["食費"]})
+    add_transactions(ids["aid"], [(ids["sub"]["食費"], i, "支出", "2024-01-01", "") for i in range(1, 6)])
+    sql = f"SELECT amount FROM transactions WHERE aikotoba_id = {ids['aid']} ORDER BY amount -- trailing comment"
+
+    first = sql_console.run_read(sql, page=1, row_limit=2)
+    assert first["columns"] == ["amount"]
+    assert first["rows"] == [(1,), (2,)] and first["has_more"]
+    assert first["plan"] and first["elapsed_ms"] >= 0
+    last = sql_console.run_read(sql, page=3, row_limit=2)
+    assert last["rows"] == [(5,)] and not last["has_more"]
+
+    # statements that cannot be wrapped are streamed and skipped through instead
+    pragma = sql_console.run_read("PRAGMA table_info(transactions)", page=2, row_limit=3)
+    assert len(pragma["rows"]) == 3 and pragma["plan"] == []
+
+
+def test_heavy_reads_are_interrupted():
+    with pytest.raises(sql_console.QueryTimeout):
+        sql_console.run_read(f"SELECT COUNT(*) FROM ({_COUNT_TO.format(10**9)})", timeout_ms=50)
+    result = sql_console.run_read(f"SELECT COUNT(*) FROM ({_COUNT_TO.format(10**5)})")
+    assert result["rows"] == [(10**5,)] and result["vm_steps"] > 10**5
+
+
+def test_console_reads_cannot_write():
+    assert sql_console.statement_keyword("/* note */ -- x\n  with t as (select 1) select * from t") == "WITH"
+    with pytest.raises(Exception, match="readonly|read-only|query_only|attempt to write"):
+        sql_console.run_read("PRAGMA user_version = 7")
+
+
+def test_statements_led_by_a_cte_are_routed_by_their_main_verb(seed_tenant, add_transactions):
+    assert sql_console.is_read(_COUNT_TO.format(3))
+    assert sql_console.is_read("WITH t(x) AS (SELECT 'delete') VALUES ((SELECT x FROM t))")
+    dml = "/* cleanup */ WITH old AS (SELECT id FROM transactions WHERE detail = 'insert (') DELETE FROM transactions"
+    assert sql_console.statement_verb(dml) == "DELETE" and not sql_console.is_read(dml)
+
+    ids = seed_tenant("console-cte", {"日常": ["食費"]})
+    add_transactions(ids["aid"], [(ids["sub"]["食費"], i, "支出", "2024-02-01", "cte") for i in range(1, 4)])
+    sql = (
+        f"WITH small AS (SELECT id FROM transactions WHERE aikotoba_id = {ids['aid']} AND amount < 3)"
+        " DELETE FROM transactions WHERE id IN (SELECT id FROM small)"
+    )
+    assert sql_console.run_write(sql)["rowcount"] == 2
+    remaining = sql_console.run_read(f"SELECT amount FROM transactions WHERE aikotoba_id = {ids['aid']}")
+    assert remaining["rows"] == [(3,)]
@@ -0,0 +1,105 @@
+import pytest
+from sqlalchemy import event, text
+from streamlit.testing.v1 import AppTest
+
+from kakeibo import st_cache
+from kakeibo.db import READ_ENGINE, WRITER
+
+
+def _app():
+    # one rerun of a page reading two tenants (st.cache_data needs a running app)
+    import streamlit as st
+
+    from kakeibo import st_cache
+
+    for aid in st.session_state["aids"]:
+        _, subs = st_cache.get_categories(aid)
+        spent, _, _ = st_cache.get_budget_and_spent_of_month("2024-05", aid)
+        st.text(repr((sorted(name for _, _, name in subs), spent)))
+        st_cache.get_monthly_summary(aid)
+
+
+@pytest.fixture
+def rerun():
+    st_cache.invalidate()
+    at = AppTest.from_function(_app)
+
+    def _rerun(*aids):
+        seen = []
+
+        def _before(conn, cursor, statement, parameters, context, executemany):
+            seen.append(statement)
+
+        at.session_state["aids"] = list(aids)
+        event.listen(READ_ENGINE, "before_cursor_execute", _before)
+        try:
+            at.run()
+        finally:
+            event.remove(READ_ENGINE, "before_cursor_execute", _before)
+        assert not at.exception
+        return [t.value for t in at.text], seen
+
+    yield _rerun
+    st_cache.invalidate()
+
+
+def test_reruns_are_served_from_cache_until_a_write_invalidates(rerun, seed_tenant, add_transactions):
+    a = seed_tenant("st-cache-a", {"日常": ["食費"]})
+    b = seed_tenant("st-cache-b", {"日常": ["食費"]})
+    add_transactions(a["aid"], [(a["sub"]["食費"], 1200, "支出", "2024-05-03", "")])
+
+    first, reads = rerun(a["aid"], b["aid"])
+    assert reads
+    again, reads = rerun(a["aid"], b["aid"])
+    assert reads == [] and again == first
+
+    WRITER.run(lambda conn: conn.execute(
+        text("INSERT INTO sub_categories (main_category_id, name, aikotoba_id) VALUES (:mid, '外食', :aid)"),
+        {"mid": a["main"]["日常"], "aid": a["aid"]},
+    ))
+    st_cache.invalidate(a["aid"])
+    after, reads = rerun(a["aid"], b["aid"])
+    assert "外食" in after[0] and after[1:] == first[1:]
+    # only tenant a's version is re-read and only its readers re-query; b stays cached
+    assert len([s for s in reads if "data_versions" in s]) == 1
+    assert len([s for s in reads if "SELECT id, name FROM main_categories" in s]) == 1
+
+
+def test_versions_expire_for_writes_from_other_processes(monkeypatch, rerun, seed_tenant, add_transactions):
+    ids = seed_tenant("st-cache-ttl", {"日常": ["食費"]})
+    before, _ = rerun(ids["aid"])
+    add_transactions(ids["aid"], [(ids["sub"]["食費"], 800, "支出", "2024-05-10", "")])
+    assert rerun(ids["aid"])[0] == before
+    monkeypatch.setattr(st_cache, "VERSION_TTL_SECONDS", 0)
+    after, _ = rerun(ids["aid"])
+    assert after != before and "800" in after[0]
+
+
+def _sidebar_app():
+    from kakeibo.views.sidebar import render_sidebar
+
+    render_sidebar()
+
+
+def test_sidebar_fragments_render_from_cache(seed_tenant, add_transactions):
+    ids = seed_tenant("st-cache-sidebar", {"日常": ["食費"], "交際": ["贈与"]})
+    add_transactions(ids["aid"], [(ids["sub"]["贈与"], 5000, "収入", "2024-05-01", "田中さん 出産祝い")])
+    st_cache.invalidate()
+    at = AppTest.from_function(_sidebar_app).run()
+    assert not at.exception
+    assert [t.value for t in at.sidebar.title][:2] == ["今月の予算進捗", "贈与見える化"]
+
+    seen = []
+
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        seen.append(statement)
+
+    # sidebar widget interaction with nothing written: every section is served from cache
+    event.listen(READ_ENGINE, "before_cursor_execute", _before)
+    try:
+        month = at.sidebar.selectbox(key="select_month")
+        month.select(month.options[0]).run()
+    finally:
+        event.remove(READ_ENGINE, "before_cursor_execute", _before)
+    assert not at.exception
+    assert seen == []
@@ -0,0 +1,47 @@
+import hashlib
+import sqlite3
+
+from kakeibo.synthetic import generate
+
+
+def _digest(path):
+    con = sqlite3.connect(path)
+    try:
+        rows = con.execute("SELECT * FROM transactions ORDER BY id").fetchall()
+    finally:
+        con.close()
+    return hashlib.sha1(repr(rows).encode()).hexdigest(), rows
+
+
+def test_generator_is_deterministic_and_exact(tmp_path):
+    summary = generate(tmp_path / "a.db", tenants=2, transactions=3001, months=12, seed=7)
+    generate(tmp_path / "b.db", tenants=2, transactions=3001, months=12, seed=7)
+    digest_a, rows = _digest(tmp_path / "a.db")
+    assert digest_a == _digest(tmp_path / "b.db")[0]
+    generate(tmp_path / "c.db", tenants=2, transactions=3001, months=12, seed=8)
+    assert digest_a != _digest(tmp_path / "c.db")[0]
+
+    assert len(rows) == 3001
+    assert [t["code"] for t in summary["tenants"]] == ["bench-01", "bench-02"]
+    assert {r[3] for r in rows} == {"支出", "収入", "予算"}
+
+
+def test_generator_covers_recurring_and_gift_rows(tmp_path):
+    generate(tmp_path / "k.db", tenants=1, transactions=2000, months=24, seed=1)
+    con = sqlite3.connect(tmp_path / "k.db")
+    try:
+        by_main = dict(con.execute(
+            """
+            SELECT mc.name, COUNT(*) FROM transactions t
+              JOIN sub_categories sc ON sc.id = t.sub_category_id
+              JOIN main_categories mc ON mc.id = sc.main_category_id
+             GROUP BY mc.name
+            """
+        ).fetchall())
+        returns = con.execute("SELECT COUNT(*) FROM transactions WHERE detail LIKE '%お返し'").fetchone()[0]
+    finally:
+        con.close()
+    assert set(by_main) == {"日常", "定期", "交際", "収入"}
+    # six recurring categories a month, a few skipped
+    assert 24 * 6 * 0.85 < by_main["定期"] < 24 * 6
+    assert returns > 0
@@ -0,0 +1,116 @@
+import sqlite3
+import threading
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+
+from kakeibo import metrics
+from kakeibo.writer import WriteCoordinator
+
+
+@pytest.fixture
+def make_writer(tmp_path):
+    writers = []
+
+    def _make(**kwargs):
+        path = tmp_path / f"writer-{len(writers)}.db"
+        con = sqlite3.connect(path)
+        con.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, v TEXT)")
+        con.close()
+        # short busy timeout so lock tests do not wait the sqlite3 default 5 s
+        engine = create_engine(f"sqlite:///{path}", connect_args={"timeout": 0.05})
+        writer = WriteCoordinator(engine, **kwargs)
+        writers.append((writer, engine))
+        return writer, engine, path
+
+    yield _make
+    for writer, engine in writers:
+        writer.close(timeout=5)
+        engine.dispose()
+
+
+def _insert(conn, v):
+    return conn.execute(text("INSERT INTO t (v) VALUES (:v)"), {"v": v}).lastrowid
+
+
+def _values(path):
+    con = sqlite3.connect(path)
+    try:
+        return sorted(v for (v,) in con.execute("SELECT v FROM t"))
+    finally:
+        con.close()
+
+
+def test_queued_writes_are_group_committed(make_writer):
+    writer, engine, path = make_writer()
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(1))
+    running, gate = threading.Event(), threading.Event()
+    first = writer.submit(lambda conn: running.set() or gate.wait(5))
+    running.wait(5)
+    futures = [writer.submit(_insert, f"v{i}") for i in range(10)]
+    gate.set()
+    ids = [f.result(timeout=5) for f in futures]
+    assert first.result(timeout=5) is True
+    assert len(set(ids)) == 10
+    # the blocking job commits alone; everything queued behind it shares one commit
+    assert len(commits) == 2
+    assert _values(path) == sorted(f"v{i}" for i in range(10))
+
+
+def test_failing_job_rolls_back_alone(make_writer):
+    writer, _, path = make_writer()
+    running, gate = threading.Event(), threading.Event()
+    writer.submit(lambda conn: running.set() or gate.wait(5))
+    running.wait(5)
+
+    def _fails(conn):
+        _insert(conn, "lost")
+        raise ValueError("boom")
+
+    ok_before, failing, ok_after = writer.submit(_insert, "a"), writer.submit(_fails), writer.submit(_insert, "b")
+    before = metrics.WRITE_FAILURES.value("job")
+    gate.set()
+    assert ok_before.result(timeout=5) and ok_after.result(timeout=5)
+    with pytest.raises(ValueError, match="boom"):
+        failing.result(timeout=5)
+    assert _values(path) == ["a", "b"]
+    assert metrics.WRITE_FAILURES.value("job") == before + 1
+
+
+def test_nested_write_runs_inline(make_writer):
+    writer, _, path = make_writer()
+
+    def _outer(conn):
+        _insert(conn, "outer")
+        return writer.run(_insert, "inner")
+
+    assert writer.run(_outer) == 2
+    assert _values(path) == ["inner", "outer"]
+
+
+def test_lock_held_elsewhere_is_retried_then_reported(make_writer):
+    writer, _, path = make_writer(lock_retries=5)
+    holder = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    holder.execute("BEGIN IMMEDIATE")
+    release = threading.Timer(0.2, holder.execute, ("COMMIT",))
+    release.start()
+    retries = metrics.WRITE_LOCK_RETRIES.value()
+    assert writer.run(_insert, "after lock") == 1
+    release.join()
+    holder.close()
+    assert metrics.WRITE_LOCK_RETRIES.value() > retries
+
+    impatient, _, other_path = make_writer(lock_retries=0)
+    holder = sqlite3.connect(other_path, isolation_level=None)
+    holder.execute("BEGIN IMMEDIATE")
+    locked = metrics.WRITE_FAILURES.value("locked")
+    try:
+        with pytest.raises(OperationalError, match="database is locked"):
+            impatient.run(_insert, "never")
+    finally:
+        holder.execute("ROLLBACK")
+        holder.close()
+    assert metrics.WRITE_FAILURES.value("locked") == locked + 1
+    assert impatient.run(_insert, "later") == 1